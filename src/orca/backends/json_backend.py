@@ -27,9 +27,23 @@ __date__      = "$Date$"
 __copyright__ = "Copyright (c) 2010-2011 Consorcio Fernando de los Rios."
 __license__   = "LGPL"
 
-from json import load, dump
+from gi.repository import GLib
+from json import loads, dumps
 import os
-from orca import settings, acss
+from orca import debug, settings, acss
+
+# Milliseconds to wait for further changes before writing a settings file.
+WRITE_DELAY = 500
+
+def _copyPrefs(value):
+    """Returns a copy of value, which was read from JSON, that shares no
+    dictionaries or lists with it."""
+
+    if isinstance(value, dict):
+        return {key: _copyPrefs(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copyPrefs(item) for item in value]
+    return value
 
 class Backend:
 
@@ -43,6 +57,95 @@ class Backend:
         self.settingsFile = os.path.join(prefsDir, "user-settings.conf")
         self.appPrefsDir = os.path.join(prefsDir, "app-settings")
 
+        # The settings read from each file, with the modification time and
+        # size of the file when they were read, and the settings waiting to
+        # be written to each file.
+        self._files = {}
+        self._pendingWrites = {}
+        self._writeCount = 0
+        self._writeId = 0
+
+        # The settings general, pronunciations, keybindings and profiles
+        # were last loaded from.
+        self._loadedPrefs = None
+
+    def _readFile(self, fileName, copy=True):
+        """Returns the settings in fileName, or None if it does not exist.
+        A file is only parsed again if it has changed since it was last
+        read. Unless copy is False, the returned settings are a copy the
+        caller may modify; otherwise they are the same object for as long
+        as the file is unchanged, and must not be modified."""
+
+        if fileName in self._pendingWrites:
+            prefs = self._pendingWrites[fileName]
+            return _copyPrefs(prefs) if copy else prefs
+
+        try:
+            stat = os.stat(fileName)
+        except OSError:
+            self._files.pop(fileName, None)
+            return None
+
+        version = stat.st_mtime_ns, stat.st_size
+        cached = self._files.get(fileName)
+        if not cached or cached[0] != version:
+            with open(fileName, 'r') as settingsFile:
+                prefs = loads(settingsFile.read())
+            cached = version, prefs
+            self._files[fileName] = cached
+
+        return _copyPrefs(cached[1]) if copy else cached[1]
+
+    def _writeFile(self, fileName, prefs):
+        """Saves prefs to fileName. While a main loop is running, the file
+        is written once no more changes have come for WRITE_DELAY
+        milliseconds; reads see the new settings at once."""
+
+        self._pendingWrites[fileName] = _copyPrefs(prefs)
+        self._writeCount += 1
+        if not GLib.main_depth():
+            self.flush()
+            return
+
+        if self._writeId:
+            GLib.source_remove(self._writeId)
+        self._writeId = GLib.timeout_add(WRITE_DELAY, self._onWriteTimeout)
+
+    def _onWriteTimeout(self):
+        self._writeId = 0
+        self.flush()
+        return False
+
+    def flush(self):
+        """Writes the settings waiting to be written. Each file is written
+        to a temporary file which then replaces it, so that a crash never
+        leaves a partly-written settings file. The settings of a file which
+        cannot be written are kept waiting, and written with the next
+        change or flush."""
+
+        if self._writeId:
+            GLib.source_remove(self._writeId)
+            self._writeId = 0
+
+        for fileName, prefs in list(self._pendingWrites.items()):
+            tempName = "%s.tmp" % fileName
+            try:
+                text = dumps(prefs, indent=4)
+                with open(tempName, 'w') as settingsFile:
+                    settingsFile.write(text)
+                    settingsFile.flush()
+                    os.fsync(settingsFile.fileno())
+                os.replace(tempName, fileName)
+                stat = os.stat(fileName)
+            except OSError as error:
+                debug.println(debug.LEVEL_SEVERE,
+                              "JSON BACKEND: Could not write %s: %s",
+                              fileName, error)
+                continue
+
+            del self._pendingWrites[fileName]
+            self._files[fileName] = (stat.st_mtime_ns, stat.st_size), prefs
+
     def saveDefaultSettings(self, general, pronunciations, keybindings):
         """ Save default settings for all the properties from
             orca.settings. """
@@ -61,20 +164,11 @@ class Backend:
         self.pronunciations = pronunciations
         self.keybindings = keybindings
 
-        settingsFile = open(self.settingsFile, 'w')
-        dump(prefs, settingsFile, indent=4)
-        settingsFile.close()
+        self._writeFile(self.settingsFile, prefs)
 
     def getAppSettings(self, appName):
         fileName = os.path.join(self.appPrefsDir, "%s.conf" % appName)
-        if os.path.exists(fileName):
-            settingsFile = open(fileName, 'r')
-            prefs = load(settingsFile)
-            settingsFile.close()
-        else:
-            prefs = {}
-
-        return prefs
+        return self._readFile(fileName) or {}
 
     def saveAppSettings(self, appName, profile, general, pronunciations, keybindings):
         prefs = self.getAppSettings(appName)
@@ -85,9 +179,7 @@ class Backend:
         prefs['profiles'] = profiles
 
         fileName = os.path.join(self.appPrefsDir, "%s.conf" % appName)
-        settingsFile = open(fileName, 'w')
-        dump(prefs, settingsFile, indent=4)
-        settingsFile.close()
+        self._writeFile(fileName, prefs)
 
     def saveProfileSettings(self, profile, general,
                                   pronunciations, keybindings):
@@ -99,20 +191,19 @@ class Backend:
         general['pronunciations'] = pronunciations
         general['keybindings'] = keybindings
 
-        with open(self.settingsFile, 'r+') as settingsFile:
-            prefs = load(settingsFile)
-            prefs['profiles'][profile] = general
-            settingsFile.seek(0)
-            settingsFile.truncate()
-            dump(prefs, settingsFile, indent=4)
+        prefs = self._readFile(self.settingsFile)
+        prefs['profiles'][profile] = general
+        self._writeFile(self.settingsFile, prefs)
 
     def _getSettings(self):
         """ Load from config file all settings """
-        settingsFile = open(self.settingsFile)
         try:
-            prefs = load(settingsFile)
+            prefs = self._readFile(self.settingsFile, copy=False)
         except ValueError:
             return
+        if prefs is None or prefs is self._loadedPrefs:
+            return
+        self._loadedPrefs = prefs
         self.general = prefs['general'].copy()
         self.pronunciations = prefs['pronunciations']
         self.keybindings = prefs['keybindings']
@@ -122,8 +213,8 @@ class Backend:
         """ Get general settings from default settings and
             override with profile values. """
         self._getSettings()
-        generalSettings = self.general.copy()
-        profileSettings = self.profiles[profile].copy()
+        generalSettings = _copyPrefs(self.general)
+        profileSettings = _copyPrefs(self.profiles[profile])
         for key, value in list(profileSettings.items()):
             if key == 'voices':
                 for voiceType, voiceDef in list(value.items()):
@@ -140,36 +231,56 @@ class Backend:
         """ Get pronunciation settings from default settings and
             override with profile values. """
         self._getSettings()
-        pronunciations = self.pronunciations.copy()
-        profileSettings = self.profiles[profile].copy()
+        pronunciations = self.pronunciations
+        profileSettings = self.profiles[profile]
         if 'pronunciations' in profileSettings:
             pronunciations = profileSettings['pronunciations']
-        return pronunciations
+        return _copyPrefs(pronunciations)
 
     def getKeybindings(self, profile='default'):
         """ Get keybindings settings from default settings and
             override with profile values. """
         self._getSettings()
-        keybindings = self.keybindings.copy()
-        profileSettings = self.profiles[profile].copy()
+        keybindings = self.keybindings
+        profileSettings = self.profiles[profile]
         if 'keybindings' in profileSettings:
             keybindings = profileSettings['keybindings']
-        return keybindings
+        return _copyPrefs(keybindings)
+
+    def _getFileVersion(self, fileName):
+        if fileName in self._pendingWrites:
+            return self._writeCount
+
+        try:
+            stat = os.stat(fileName)
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def getVersion(self, appName=None):
+        """Returns a value which changes whenever the settings, or the
+        settings of appName, are changed."""
+
+        version = self._getFileVersion(self.settingsFile)
+        if not appName:
+            return version
+
+        fileName = os.path.join(self.appPrefsDir, "%s.conf" % appName)
+        return version, self._getFileVersion(fileName)
 
     def isFirstStart(self):
         """ Check if we're in first start. """
  
-        return not os.path.exists(self.settingsFile)
+        return self.settingsFile not in self._pendingWrites \
+            and not os.path.exists(self.settingsFile)
 
     def _setProfileKey(self, key, value):
         self.general[key] = value
 
-        with open(self.settingsFile, 'r+') as settingsFile:
-            prefs = load(settingsFile)
-            prefs['general'][key] = value
-            settingsFile.seek(0)
-            settingsFile.truncate()
-            dump(prefs, settingsFile, indent=4)
+        prefs = self._readFile(self.settingsFile)
+        prefs['general'][key] = value
+        self._writeFile(self.settingsFile, prefs)
 
     def setFirstStart(self, value=False):
         """Set firstStart. This user-configurable settting is primarily
@@ -184,7 +295,7 @@ class Backend:
         profiles = []
 
         for profileName in list(self.profiles.keys()):
-            profileDict = self.profiles[profileName].copy()
-            profiles.append(profileDict.get('profile'))
+            profileDict = self.profiles[profileName]
+            profiles.append(_copyPrefs(profileDict.get('profile')))
 
         return profiles
@@ -31,6 +31,7 @@ __date__      = "$Date$"
 __copyright__ = "Copyright (c) 2005-2009 Sun Microsystems Inc."
 __license__   = "LGPL"
 
+import collections
 import signal
 import os
 
@@ -155,6 +156,12 @@ _regionWithFocus = None
 #
 _lastTextInfo = (None, 0, 0, 0)
 
+# Changed whenever the text attributes, selections or links of the text
+# objects being displayed may have changed without their regions being
+# replaced, so that the attribute masks of Text regions are computed again.
+#
+_maskGeneration = 0
+
 # The viewport is a rectangular region of size _displaySize whose upper left
 # corner is defined by the point (x, line number).  As such, the viewport is
 # identified solely by its upper left point.
@@ -248,6 +255,70 @@ def getDefaultTable():
 if louis:
     _defaultContractionTable = getDefaultTable()
 
+# The most recent contractions, keyed by (table, line, mode, span), where
+# span is the word the cursor is in when the word under the cursor is
+# expanded, and None otherwise. Each value is [contracted, inPos, outPos,
+# cursorPositions], where cursorPositions maps the cursor offsets asked for
+# to the cursor positions liblouis gave back.
+#
+CONTRACTION_CACHE_SIZE = 500
+_contractionCache = collections.OrderedDict()
+
+def _getCursorWordSpan(line, cursorOffset):
+    """Returns the (start, end) offsets of the word containing
+    cursorOffset in line. If the cursor is not in a word, the span is
+    just the cursor offset, so that the contraction is only reused for
+    that very offset."""
+
+    if not 0 <= cursorOffset < len(line) or line[cursorOffset].isspace():
+        return cursorOffset, cursorOffset
+
+    start = cursorOffset
+    while start > 0 and not line[start - 1].isspace():
+        start -= 1
+    end = cursorOffset + 1
+    while end < len(line) and not line[end].isspace():
+        end += 1
+    return start, end
+
+def _translate(table, line, cursorOffset, mode):
+    """Returns what louis.translate returns for the arguments, reusing the
+    contraction of line when only the cursor has moved. Without expansion
+    at the cursor the contraction does not depend on the cursor; with it,
+    it depends only on the word the cursor is in. For a cursor offset not
+    asked for before, the cursor position is that of the character under
+    the cursor in the contracted line."""
+
+    if mode == 0:
+        span = None
+    else:
+        span = _getCursorWordSpan(line, cursorOffset)
+    key = table, line, mode, span
+
+    entry = _contractionCache.get(key)
+    if entry:
+        _contractionCache.move_to_end(key)
+        contracted, inPos, outPos, cursorPositions = entry
+        cursorPos = cursorPositions.get(cursorOffset)
+        if cursorPos is None and 0 <= cursorOffset < len(outPos):
+            cursorPos = outPos[cursorOffset]
+            cursorPositions[cursorOffset] = cursorPos
+        if cursorPos is not None:
+            return contracted, inPos, outPos, cursorPos
+
+    contracted, inPos, outPos, cursorPos = \
+        louis.translate([table], line, cursorPos=cursorOffset, mode=mode)
+
+    if entry:
+        entry[3][cursorOffset] = cursorPos
+    else:
+        _contractionCache[key] = \
+            [contracted, inPos, outPos, {cursorOffset: cursorPos}]
+        if len(_contractionCache) > CONTRACTION_CACHE_SIZE:
+            _contractionCache.popitem(last=False)
+
+    return contracted, inPos, outPos, cursorPos
+
 def _printBrailleEvent(level, command):
     """Prints out a Braille event.  The given level may be overridden
     if the eventDebugLevel (see debug.setEventDebugLevel) is greater in
@@ -266,6 +337,10 @@ class Region:
     each region is determined by its string.
     """
 
+    # The key, string and attribute mask last returned by getRendering.
+    #
+    _rendering = None
+
     def __init__(self, string, cursorOffset=0, expandOnCursor=False):
         """Creates a new Region containing the given string.
 
@@ -330,6 +405,36 @@ class Region:
         mask = ['\x00'] * maskSize
         return "".join(mask)
 
+    def _getRenderingKey(self, getLinkMask):
+        """Returns the values the string and attribute mask of this region
+        depend on."""
+
+        return self.string
+
+    def getRendering(self, getLinkMask=True):
+        """Returns the string to show on the display for this region and
+        its attribute mask. They are only computed again if something they
+        depend on has changed since they were last computed, so that
+        repainting the display, such as when panning, does not ask the
+        application for the text attributes again.
+
+        Arguments:
+        - getLinkMask: Whether or not we should take the time to get
+          the attributeMask for links.
+        """
+
+        key = self._getRenderingKey(getLinkMask)
+        if self._rendering is None or self._rendering[0] != key:
+            # [[[TODO: WDW - HACK: Replace ellipses with "..."
+            # The ultimate solution is to get i18n support into
+            # BrlTTY.]]]
+            #
+            string = self.string.replace('\u2026', "...")
+            mask = self.getAttributeMask(getLinkMask)
+            self._rendering = key, string, mask
+
+        return self._rendering[1], self._rendering[2]
+
     def repositionCursor(self):
         """Reposition the cursor offset for contracted mode.
         """
@@ -360,10 +465,7 @@ class Region:
             mode = louis.compbrlAtCursor
 
         contracted, inPos, outPos, cursorPos = \
-            louis.translate([self.contractionTable],
-                            line,
-                            cursorPos=cursorOffset,
-                            mode=mode)
+            _translate(self.contractionTable, line, cursorOffset, mode)
 
         # Make sure the cursor is at a realistic spot.
         #
@@ -508,6 +610,9 @@ class Link(Component):
         #
         return chr(settings.brailleLinkIndicator) * len(self.string)
 
+    def _getRenderingKey(self, getLinkMask):
+        return self.string, settings.brailleLinkIndicator
+
 class Text(Region):
     """A subclass of Region backed by a Text object.  This Region will
     react to any cursor routing key events by positioning the caret in
@@ -737,6 +842,15 @@ class Text(Region):
 
         return ''.join(map(chr, regionMask))
 
+    def _getRenderingKey(self, getLinkMask):
+        return (self.string, getLinkMask, self.rawLine, self.label, self.eol,
+                self.lineOffset, self.caretOffset, self.cursorOffset,
+                self.contracted, _maskGeneration,
+                settings.brailleLinkIndicator,
+                settings.textAttributesBrailleIndicator,
+                settings.brailleSelectorIndicator,
+                settings.enabledBrailledTextAttributes)
+
     def contractLine(self, line, cursorOffset=0, expandOnCursor=True):
         contracted, inPos, outPos, cursorPos = Region.contractLine(
             self, line, cursorOffset, expandOnCursor)
@@ -848,22 +962,19 @@ class Line:
         Returns [string, offsetIndex, attributeMask]
         """
 
-        string = ""
+        strings = []
+        masks = []
+        length = 0
         focusOffset = -1
-        attributeMask = ""
         for region in self.regions:
             if region == _regionWithFocus:
-                focusOffset = len(string)
-            if region.string:
-                # [[[TODO: WDW - HACK: Replace ellipses with "..."
-                # The ultimate solution is to get i18n support into
-                # BrlTTY.]]]
-                #
-                string += region.string.replace('\u2026', "...")
-            mask = region.getAttributeMask(getLinkMask)
-            attributeMask += mask
+                focusOffset = length
+            string, mask = region.getRendering(getLinkMask)
+            strings.append(string)
+            masks.append(mask)
+            length += len(string)
 
-        return [string, focusOffset, attributeMask]
+        return ["".join(strings), focusOffset, "".join(masks)]
 
     def getRegionAtOffset(self, offset):
         """Finds the Region at the given 0-based offset in this line.
@@ -943,6 +1054,15 @@ def getCaretContext(event):
 
     return [accessible, caretOffset]
 
+def invalidateAttributeMasks():
+    """Makes the attribute masks of the Text regions being displayed be
+    computed again when they are next painted. To be called when text
+    attributes, selections or links may have changed in an object without
+    its regions being replaced."""
+
+    global _maskGeneration
+    _maskGeneration += 1
+
 def clear():
     """Clears the logical structure, but keeps the Braille display as is
     (until a refresh operation).
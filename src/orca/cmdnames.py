@@ -462,6 +462,11 @@ CYCLE_KEY_ECHO = _("Cycles to the next key echo level.")
 # information that Orca generates at run time.
 CYCLE_DEBUG_LEVEL = _("Cycles the debug level at run time.")
 
+# Translators: this is a debug message that Orca users will not normally see. It
+# describes a debug routine that saves statistics about how long Orca takes to
+# process events and generate output to a file, so that slow parts can be found.
+SAVE_LATENCY_STATS = _("Saves latency statistics to a file.")
+
 # Translators: this command announces information regarding the relationship of
 # the given bookmark to the current position. Note that in this context, the
 # "bookmark" is storing the location of an accessible object, typically on a web
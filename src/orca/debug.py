@@ -193,18 +193,30 @@ def printStack(level):
         traceback.print_stack(None, 100, debugFile)
         println(level)
 
-def println(level, text = ""):
+def println(level, text = "", *args):
     """Prints the text to stderr unless debug is enabled.
 
     If debug is enabled the text will be redirected to the
     file debugFile.
 
+    The text is only rendered if the level is accepted, so callers
+    on hot paths should pass the values to format as args rather
+    than formatting the text themselves (e.g. converting an accessible
+    to a string can require round trips to the application).
+
     Arguments:
     - level: the accepted debug level
-    - text: the text to print (default is a blank line)
+    - text: the text to print (default is a blank line), or a
+      callable returning the text to print
+    - args: if given, the values to format text with using the
+      '%' operator
     """
 
     if level >= debugLevel:
+        if callable(text):
+            text = text()
+        if args:
+            text = text % args
         text = text.replace("\ufffc", "[OBJ]")
         if debugFile:
             try:
@@ -29,17 +29,16 @@ __date__      = "$Date$"
 __license__   = "LGPL"
 
 from gi.repository import GLib
-import re
 import time
 
 from . import chnames
 from . import debug
 from . import guilabels
 from . import messages
+from . import speech_normalizer
 from . import speechserver
 from . import settings
 from . import orca_state
-from . import punctuation_settings
 from .acss import ACSS
 
 try:
@@ -49,8 +48,6 @@ except:
 else:    
     _espeak_available = True
 
-PUNCTUATION = re.compile('[^\w\s]', re.UNICODE)
-ELLIPSIS = re.compile('(\342\200\246|\.\.\.\s*)')
 
 #Parameter bounds
 minRate=80
@@ -114,6 +111,7 @@ class SpeechServer(speechserver.SpeechServer):
         self._id = serverId
         self._client = None
         self._current_voice_properties = {}
+        self._say_all_pipeline = None
         self._acss_manipulators = (
             (ACSS.RATE, self._set_rate),
             (ACSS.AVERAGE_PITCH, self._set_pitch),
@@ -236,50 +234,10 @@ class SpeechServer(speechserver.SpeechServer):
                 method({})
                 current[acss_property] = {}
 
-    def __addVerbalizedPunctuation(self, oldText):
-        """Depending upon the users verbalized punctuation setting,
-        adjust punctuation symbols in the given text to their pronounced
-        equivalents. The pronounced text will either replace the
-        punctuation symbol or be inserted before it. In the latter case,
-        this is to retain spoken prosity.
-
-        Arguments:
-        - oldText: text to be parsed for punctuation.
-
-        Returns a text string with the punctuation symbols adjusted accordingly.
-        """
-
-        spokenEllipsis = messages.SPOKEN_ELLIPSIS + " "
-        newText = re.sub(ELLIPSIS, spokenEllipsis, oldText)
-        symbols = set(re.findall(PUNCTUATION, newText))
-        for symbol in symbols:
-            try:
-                level, action = punctuation_settings.getPunctuationInfo(symbol)
-            except:
-                continue
-
-            if level != punctuation_settings.LEVEL_NONE:
-                # eSpeak should handle it.
-                #
-                continue
-
-            charName = " %s " % chnames.getCharacterName(symbol)
-            if action == punctuation_settings.PUNCTUATION_INSERT:
-                charName += symbol
-            newText = re.sub(symbol, charName, newText)
-
-        if orca_state.activeScript:
-            newText = orca_state.activeScript.utilities.adjustForDigits(newText)
-
-        return newText
-
     def _speak(self, text, acss, callback=None):
         if isinstance(text, ACSS):
             text = ''
-        text = self.__addVerbalizedPunctuation(text)
-        if orca_state.activeScript:
-            text = orca_state.activeScript.\
-                utilities.adjustForPronunciation(text)
+        text = speech_normalizer.getNormalizer().normalize(text)
 
         # We need to make several replacements.
         text = text.translate({
@@ -292,32 +250,44 @@ class SpeechServer(speechserver.SpeechServer):
         espeak.synth(text)
 
     def _say_all(self, iterator, orca_callback):
-        """Process another sayAll chunk.
+        """Start speaking the sayAll chunks, keeping settings.sayAllLookahead
+        of them queued after the one being spoken.
 
         Called by the gidle thread.
 
         """
-        try:
-            context, acss = next(iterator)
-        except StopIteration:
-            pass
-        else:
-            def callback(event, pos, len):
-                t = self._CALLBACK_TYPE_MAP[event]
-                if t == speechserver.SayAllContext.PROGRESS:
-                    if pos >1:
-                        context.currentOffset = (context.startOffset +pos -1)
-                    else:
-                        context.currentOffset = context.startOffset
-                elif t == speechserver.SayAllContext.COMPLETED:
-                    context.currentOffset = context.endOffset
-                GLib.idle_add(orca_callback, context, t)
-                if t == speechserver.SayAllContext.COMPLETED:
-                    GLib.idle_add(self._say_all, iterator, orca_callback)
-            self._speak(context.utterance, acss, callback=callback)
+        if self._say_all_pipeline:
+            self._say_all_pipeline.stop()
+        pipeline = speechserver.SayAllPipeline(
+            iterator, orca_callback,
+            lambda context, acss: self._queue_say_all(pipeline, context, acss),
+            settings.sayAllLookahead)
+        self._say_all_pipeline = pipeline
+        pipeline.start()
         return False # to indicate, that we don't want to be called again.
 
+    def _queue_say_all(self, pipeline, context, acss):
+        # eSpeak has a single callback for everything it synthesizes and
+        # speaks the queued chunks in order, so its events are about the
+        # oldest chunk which has not been completed.
+        def callback(event, pos, len):
+            t = self._CALLBACK_TYPE_MAP.get(event)
+            if t is not None:
+                GLib.idle_add(self._on_say_all_event, pipeline, t, pos)
+        self._speak(context.utterance, acss, callback=callback)
+
+    def _on_say_all_event(self, pipeline, t, pos):
+        context = pipeline.current()
+        if not context:
+            return False
+        offset = None
+        if t == speechserver.SayAllContext.PROGRESS and pos > 1:
+            offset = context.startOffset + pos - 1
+        return pipeline.progress(context, t, offset)
+
     def _cancel(self):
+        if self._say_all_pipeline:
+            self._say_all_pipeline.stop()
         espeak.cancel()
 
     def _change_default_speech_rate(self, step, decrease=False):
@@ -25,6 +25,7 @@ __copyright__ = "Copyright (c) 2011. Orca Team."
 __license__   = "LGPL"
 
 from gi.repository import GLib
+import collections
 import pyatspi
 import queue
 import threading
@@ -32,13 +33,122 @@ import time
 
 from . import debug
 from . import input_event
+from . import latency
 from . import messages
 from . import orca_state
 from . import script_manager
 from . import settings
+from . import source_snapshot
 
 _scriptManager = script_manager.getManager()
 
+class _EventScheduler:
+    """Holds the events waiting to be processed in separate lanes, ordered
+    by how urgently the user needs feedback for them. Events are taken from
+    the most urgent lane which is not empty, first in first out within each
+    lane. Once more than maxDepth events are waiting, the oldest events from
+    background applications are dropped to make room for new ones."""
+
+    INPUT      = 0
+    FOCUS      = 1
+    ACTIVE     = 2
+    BACKGROUND = 3
+
+    LANE_NAMES = ['input', 'focus', 'active', 'background']
+
+    def __init__(self, maxDepth=500):
+        self._lock = threading.Lock()
+        self._lanes = [collections.deque() for name in self.LANE_NAMES]
+        self._maxDepth = maxDepth
+        self._depth = 0
+        self._deepest = 0
+        self._shed = 0
+
+        # For each lane: number of events, total and longest wait time.
+        self._waits = [[0, 0.0, 0.0] for name in self.LANE_NAMES]
+
+    def put(self, event, lane):
+        """Adds event to the end of the given lane."""
+
+        with self._lock:
+            if self._depth >= self._maxDepth and self._lanes[self.BACKGROUND]:
+                self._lanes[self.BACKGROUND].popleft()
+                self._depth -= 1
+                self._shed += 1
+            self._lanes[lane].append((event, time.time()))
+            self._depth += 1
+            self._deepest = max(self._deepest, self._depth)
+
+    def get(self):
+        """Removes and returns the next event to process. Raises queue.Empty
+        if no event is waiting."""
+
+        with self._lock:
+            for lane, events in enumerate(self._lanes):
+                if events:
+                    event, queuedTime = events.popleft()
+                    self._depth -= 1
+                    wait = time.time() - queuedTime
+                    stats = self._waits[lane]
+                    stats[0] += 1
+                    stats[1] += wait
+                    stats[2] = max(stats[2], wait)
+                    latency.record(latency.QUEUE_WAIT, str(event.type), wait)
+                    return event
+
+        raise queue.Empty
+
+    def remove(self, event, lane):
+        """Removes event from the given lane, searching from the most
+        recently added event. Returns True if event was found."""
+
+        with self._lock:
+            events = self._lanes[lane]
+            for i in range(len(events) - 1, -1, -1):
+                if events[i][0] is event:
+                    del events[i]
+                    self._depth -= 1
+                    return True
+
+        return False
+
+    def empty(self):
+        return self._depth == 0
+
+    def qsize(self):
+        return self._depth
+
+    def getStats(self):
+        """Returns a dictionary describing the current depth of each lane
+        and how long events have waited in each lane before processing."""
+
+        with self._lock:
+            lanes = {}
+            for lane, name in enumerate(self.LANE_NAMES):
+                count, total, longest = self._waits[lane]
+                lanes[name] = {'depth': len(self._lanes[lane]),
+                               'processed': count,
+                               'averageWait': count and total / count,
+                               'longestWait': longest}
+
+            return {'depth': self._depth,
+                    'deepest': self._deepest,
+                    'shed': self._shed,
+                    'lanes': lanes}
+
+class _EventPolicy:
+    """The checks EventManager._ignore() makes for an event type."""
+
+    IGNORE         = 1 << 0  # One of the ignored event types
+    ACCEPT         = 1 << 1  # Never ignored
+    MARK_DEFUNCT   = 1 << 2  # Says whether the source is defunct
+    CHECK_SOURCE   = 1 << 3  # Ignored if the source is defunct
+    CHECK_DESKTOP  = 1 << 4  # Ignored unless the source is the desktop
+    CHECK_EMBEDDED = 1 << 5  # Ignored if the text is an embedded object
+    CHECK_ROLE     = 1 << 6  # Ignored for some roles of the source
+    CHECK_CHILD    = 1 << 7  # Ignored if the child is missing, defunct
+                             # or an image
+
 class EventManager:
 
     EMBEDDED_OBJECT_CHARACTER = '\ufffc'
@@ -52,14 +162,23 @@ class EventManager:
         self._active = False
         self._enqueueCount = 0
         self._dequeueCount = 0
-        self._eventQueue     = queue.Queue(0)
+        self._eventQueue     = _EventScheduler()
+        self._lastQueuedEvents = {}
+        self._coalescedEvents = {}
         self._gidleId        = 0
         self._gidleLock      = threading.Lock()
         self._gilSleepTime = 0.00001
+        self._dequeueTimeBudget = 0.05
+        latency.registerStatsProvider('eventQueue', self.getQueueStats)
+        latency.registerStatsProvider('coalescedEvents',
+                                      self.getCoalescedEventCounts)
         self._synchronousToolkits = ['VCL']
         self._ignoredEvents = ['object:bounds-changed',
                                'object:state-changed:defunct',
                                'object:property-change:accessible-parent']
+        self._eventPolicies = {}
+        self._defunctProbes = {}
+        self._defunctProbeTime = 0.5
         debug.println(debug.LEVEL_FINEST, 'INFO: Event manager initialized')
 
     def activate(self):
@@ -87,11 +206,76 @@ class EventManager:
         for eventType in eventTypeList:
             if not eventType in self._ignoredEvents:
                 self._ignoredEvents.append(eventType)
+        self._eventPolicies = {}
 
     def unignoreEventTypes(self, eventTypeList):
         for eventType in eventTypeList:
             if eventType in self._ignoredEvents:
                 self._ignoredEvents.remove(eventType)
+        self._eventPolicies = {}
+
+    def _getEventPolicy(self, eventType):
+        """Returns the checks _ignore() has to make for events of eventType,
+        as a combination of the _EventPolicy flags. The policy of each event
+        type is worked out the first time it is seen."""
+
+        policy = self._eventPolicies.get(eventType)
+        if policy is not None:
+            return policy
+
+        policy = 0
+        if eventType.startswith('object:state-changed:defunct'):
+            policy |= _EventPolicy.MARK_DEFUNCT
+
+        if eventType.startswith(tuple(self._ignoredEvents)):
+            policy |= _EventPolicy.IGNORE
+        elif eventType.startswith('window'):
+            policy |= _EventPolicy.ACCEPT
+        else:
+            policy |= _EventPolicy.CHECK_SOURCE
+            if eventType.startswith('object:children-changed:remove'):
+                policy |= _EventPolicy.CHECK_DESKTOP
+            if eventType.startswith('object:text-changed') \
+               and eventType.endswith('system'):
+                policy |= _EventPolicy.CHECK_EMBEDDED
+            if eventType.startswith('object:state-changed:showing'):
+                policy |= _EventPolicy.CHECK_ROLE
+            if eventType.startswith('object:children-changed:add'):
+                policy |= _EventPolicy.CHECK_CHILD
+
+        self._eventPolicies[str(eventType)] = policy
+        return policy
+
+    def _isDefunct(self, event):
+        """Returns True if the source of event is defunct, or if asking for
+        its state fails. The answer is remembered for _defunctProbeTime
+        seconds, so a flood of events from one object only costs one round
+        trip."""
+
+        obj = event.source
+        now = time.time()
+        probe = self._defunctProbes.get(obj)
+        if probe and probe[0] > now:
+            return probe[1]
+
+        try:
+            # TODO - JD: For now we won't ask for the name. Simply asking for the name should
+            # not break anything, and should be a reliable way to quickly identify defunct
+            # objects. But apparently the mere act of asking for the name causes Orca to stop
+            # presenting Eclipse (and possibly other) applications. This might be an AT-SPI2
+            # issue, but until we know for certain....
+            #name = obj.name
+            snapshot = source_snapshot.getSnapshot(event)
+            defunct = snapshot.getState().contains(pyatspi.STATE_DEFUNCT)
+        except:
+            defunct = True
+
+        if len(self._defunctProbes) >= 500:
+            self._defunctProbes = {key: value for key, value
+                                   in self._defunctProbes.items()
+                                   if value[0] > now}
+        self._defunctProbes[obj] = now + self._defunctProbeTime, defunct
+        return defunct
 
     def _ignore(self, event):
         """Returns True if this event should be ignored."""
@@ -99,19 +283,24 @@ class EventManager:
         if not self._active:
             return True
 
-        if list(filter(event.type.startswith, self._ignoredEvents)):
+        policy = self._getEventPolicy(event.type)
+        if policy & _EventPolicy.MARK_DEFUNCT and event.detail1:
+            self._defunctProbes[event.source] = \
+                time.time() + self._defunctProbeTime, True
+
+        if policy & _EventPolicy.IGNORE:
             return True
 
-        if event.type.startswith('window'):
+        if policy & _EventPolicy.ACCEPT:
             return False
 
         # This should ultimately be changed as there are valid reasons
         # to handle these events at the application level.
-        if event.type.startswith('object:children-changed:remove') \
+        if policy & _EventPolicy.CHECK_DESKTOP \
            and event.source != self.registry.getDesktop(0):
             return True
 
-        if event.type.startswith('object:text-changed') and event.type.endswith('system'):
+        if policy & _EventPolicy.CHECK_EMBEDDED:
             # We should also get children-changed events telling us the same thing.
             # Getting a bunch of both can result in a flood that grinds us to a halt.
             if event.any_data == self.EMBEDDED_OBJECT_CHARACTER:
@@ -119,56 +308,42 @@ class EventManager:
                 debug.println(debug.LEVEL_INFO, msg)
                 return True
 
-        try:
-            # TODO - JD: For now we won't ask for the name. Simply asking for the name should
-            # not break anything, and should be a reliable way to quickly identify defunct
-            # objects. But apparently the mere act of asking for the name causes Orca to stop
-            # presenting Eclipse (and possibly other) applications. This might be an AT-SPI2
-            # issue, but until we know for certain....
-            #name = event.source.name
-            state = event.source.getState()
-        except:
-            msg = 'ERROR: %s from potentially-defunct source %s in app %s (%s, %s, %s)' % \
-                  (event.type, event.source, event.host_application, event.detail1,
-                   event.detail2, event.any_data)
-            debug.println(debug.LEVEL_INFO, msg)
-            return True
-        if state.contains(pyatspi.STATE_DEFUNCT):
-            msg = 'ERROR: %s from defunct source %s in app %s (%s, %s, %s)' % \
-                  (event.type, event.source, event.host_application, event.detail1,
-                   event.detail2, event.any_data)
-            debug.println(debug.LEVEL_INFO, msg)
+        if policy & _EventPolicy.CHECK_SOURCE and self._isDefunct(event):
+            msg = 'ERROR: %s from defunct source %s in app %s (%s, %s, %s)'
+            debug.println(debug.LEVEL_INFO, msg, event.type, event.source,
+                          event.host_application, event.detail1, event.detail2,
+                          event.any_data)
             return True
 
-        if event.type.startswith('object:state-changed:showing'):
+        if policy & _EventPolicy.CHECK_ROLE:
             try:
-                role = event.source.getRole()
+                role = source_snapshot.getSnapshot(event).getRole()
             except:
                 role = None
             if role in [pyatspi.ROLE_IMAGE, pyatspi.ROLE_MENU_ITEM, pyatspi.ROLE_PARAGRAPH]:
-                msg = 'INFO: %s for %s in app %s. Who cares?' % \
-                      (event.type, event.source, event.host_application)
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = 'INFO: %s for %s in app %s. Who cares?'
+                debug.println(debug.LEVEL_INFO, msg, event.type, event.source,
+                              event.host_application)
                 return True
 
-        if event.type.startswith('object:children-changed:add'):
+        if policy & _EventPolicy.CHECK_CHILD:
             if not event.any_data:
-                msg = 'ERROR: %s without child from source %s in app %s' % \
-                      (event.type, event.source, event.host_application)
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = 'ERROR: %s without child from source %s in app %s'
+                debug.println(debug.LEVEL_INFO, msg, event.type, event.source,
+                              event.host_application)
                 return True
             try:
                 state = event.any_data.getState()
                 role = event.any_data.getRole()
             except:
-                msg = 'ERROR: %s with potentially-defunct child %s from source %s in app %s' % \
-                      (event.type, event.any_data, event.source, event.host_application)
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = 'ERROR: %s with potentially-defunct child %s from source %s in app %s'
+                debug.println(debug.LEVEL_INFO, msg, event.type, event.any_data,
+                              event.source, event.host_application)
                 return True
             if state.contains(pyatspi.STATE_DEFUNCT):
-                msg = 'ERROR: %s with defunct child %s from source %s in app %s' % \
-                      (event.type, event.any_data, event.source, event.host_application)
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = 'ERROR: %s with defunct child %s from source %s in app %s'
+                debug.println(debug.LEVEL_INFO, msg, event.type, event.any_data,
+                              event.source, event.host_application)
                 return True
 
             # This should be safe. We do not have a reason to present a newly-added,
@@ -177,26 +352,93 @@ class EventManager:
             # reason for ignoring it here rather than quickly processing it is the
             # potential for event floods like we're seeing from matrix.org.
             if role == pyatspi.ROLE_IMAGE:
-                msg = 'INFO: %s for child image %s from source %s in app %s. Who cares?' % \
-                      (event.type, event.any_data, event.source, event.host_application)
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = 'INFO: %s for child image %s from source %s in app %s. Who cares?'
+                debug.println(debug.LEVEL_INFO, msg, event.type, event.any_data,
+                              event.source, event.host_application)
                 return True
 
         return False
 
-    def _addToQueue(self, event, asyncMode):
+    def _getLane(self, event, script):
+        """Returns the _EventScheduler lane event should be queued in."""
+
+        if script is None or event.type.startswith('mouse:'):
+            return _EventScheduler.INPUT
+
+        if event.type.startswith(('window:', 'focus:',
+                                  'object:state-changed:focused',
+                                  'object:state-changed:active')):
+            return _EventScheduler.FOCUS
+
+        if script == orca_state.activeScript:
+            return _EventScheduler.ACTIVE
+
+        return _EventScheduler.BACKGROUND
+
+    def _coalesce(self, event, script, lane):
+        """Removes the most recently queued event of the same type as event
+        from the queue if script says event makes it obsolete. Must be called
+        with self._gidleLock held.
+
+        Arguments:
+        - event: the at-spi event about to be queued
+        - script: the script associated with event
+        - lane: the lane event is about to be queued in
+
+        Returns True if a queued event was removed.
+        """
+
+        eType = event.type
+        queuedEvent, queuedLane = self._lastQueuedEvents.get(eType, (None, 0))
+        self._lastQueuedEvents[eType] = event, lane
+        if queuedEvent is None:
+            return False
+
+        try:
+            coalescable = script.isCoalescableEvent(queuedEvent, event)
+        except:
+            coalescable = False
+        if not coalescable:
+            return False
+
+        if not self._eventQueue.remove(queuedEvent, queuedLane):
+            return False
+
+        self._coalescedEvents[eType] = self._coalescedEvents.get(eType, 0) + 1
+        debug.println(debug.LEVEL_FINEST,
+                      "EVENT MANAGER: Coalesced %s from %s", eType, event.source)
+        return True
+
+    def getCoalescedEventCounts(self):
+        """Returns a dictionary of event type to the number of events of
+        that type which were dropped from the queue because a newer event
+        made them obsolete."""
+
+        return self._coalescedEvents.copy()
+
+    def getQueueStats(self):
+        """Returns a dictionary describing the depth of the event queue and
+        how long events have waited in it, for each lane."""
+
+        return self._eventQueue.getStats()
+
+    def _addToQueue(self, event, asyncMode, script=None):
         debugging = debug.debugEventQueue
         if debugging:
             debug.println(debug.LEVEL_ALL, "           acquiring lock...")
         self._gidleLock.acquire()
 
+        lane = self._getLane(event, script)
+        if script:
+            self._coalesce(event, script, lane)
+
         if debugging:
             debug.println(debug.LEVEL_ALL, "           ...acquired")
             debug.println(debug.LEVEL_ALL, "           calling queue.put...")
-            debug.println(debug.LEVEL_ALL, "           (full=%s)" \
-                          % self._eventQueue.full())
+            debug.println(debug.LEVEL_ALL, "           (size=%d)" \
+                          % self._eventQueue.qsize())
 
-        self._eventQueue.put(event)
+        self._eventQueue.put(event, lane)
         if debugging:
             debug.println(debug.LEVEL_ALL, "           ...put complete")
 
@@ -257,26 +499,59 @@ class EventManager:
 
         asyncMode = self._asyncMode
         if isObjectEvent:
-            app = e.source.getApplication()
+            snapshot = source_snapshot.getSnapshot(e)
+            app = snapshot.getApplication()
             try:
-                toolkitName = app.toolkitName
+                toolkitName = snapshot.getToolkitName()
             except:
                 toolkitName = None
             if toolkitName in self._synchronousToolkits:
                 asyncMode = False
             script = _scriptManager.getScript(app, e.source)
             script.eventCache[e.type] = (e, time.time())
+        else:
+            script = None
 
-        self._addToQueue(e, asyncMode)
+        self._addToQueue(e, asyncMode, script)
         if not asyncMode:
             self._dequeue()
 
         if debug.debugEventQueue:
             self._enqueueCount -= 1
 
+    def _processEvent(self, event):
+        """Processes a single event taken from the event queue."""
+
+        self._queuePrintln(event, isEnqueue=False)
+        inputEvents = (input_event.KeyboardEvent, input_event.BrailleEvent)
+        if isinstance(event, inputEvents):
+            self._processInputEvent(event)
+            return
+
+        if self._lastQueuedEvents.get(event.type, (None, 0))[0] is event:
+            self._lastQueuedEvents.pop(event.type, None)
+        debug.objEvent = event
+        debugging = not debug.eventDebugFilter \
+                    or debug.eventDebugFilter.match(event.type)
+        if debugging:
+            startTime = time.time()
+            debug.println(debug.eventDebugLevel,
+                          "\nvvvvv PROCESS OBJECT EVENT %s vvvvv" \
+                          % event.type)
+        self._processObjectEvent(event)
+        if debugging:
+            debug.println(debug.eventDebugLevel,
+                          "TOTAL PROCESSING TIME: %.4f" \
+                          % (time.time() - startTime))
+            debug.println(debug.eventDebugLevel,
+                          "^^^^^ PROCESS OBJECT EVENT %s ^^^^^\n" \
+                          % event.type)
+        debug.objEvent = None
+
     def _dequeue(self):
         """Handles all events destined for scripts. Called by the GTK
-        idle thread."""
+        idle thread. Events are processed until the queue is empty or
+        self._dequeueTimeBudget has been used up."""
 
         rerun = True
 
@@ -286,29 +561,12 @@ class EventManager:
             self._dequeueCount += 1
 
         try:
-            event = self._eventQueue.get_nowait()
-            self._queuePrintln(event, isEnqueue=False)
-            inputEvents = (input_event.KeyboardEvent, input_event.BrailleEvent)
-            if isinstance(event, inputEvents):
-                self._processInputEvent(event)
-            else:
-                debug.objEvent = event
-                debugging = not debug.eventDebugFilter \
-                            or debug.eventDebugFilter.match(event.type)
-                if debugging:
-                    startTime = time.time()
-                    debug.println(debug.eventDebugLevel,
-                                  "\nvvvvv PROCESS OBJECT EVENT %s vvvvv" \
-                                  % event.type)
-                self._processObjectEvent(event)
-                if debugging:
-                    debug.println(debug.eventDebugLevel,
-                                  "TOTAL PROCESSING TIME: %.4f" \
-                                  % (time.time() - startTime))
-                    debug.println(debug.eventDebugLevel,
-                                  "^^^^^ PROCESS OBJECT EVENT %s ^^^^^\n" \
-                                  % event.type)
-                debug.objEvent = None
+            tickStartTime = time.time()
+            while True:
+                self._processEvent(self._eventQueue.get())
+                if self._eventQueue.empty() \
+                   or time.time() - tickStartTime >= self._dequeueTimeBudget:
+                    break
 
             # [[[TODO: HACK - it would seem logical to only do this if we
             # discover the queue is empty, but this inroduces a hang for
@@ -478,6 +736,7 @@ class EventManager:
             return
 
         eType = str(event.type).upper()
+        scriptName = orca_state.activeScript.name
         startTime = time.time()
         debug.println(debug.eventDebugLevel,
                       "\nvvvvv PROCESS %s %s vvvvv" % (eType, data))
@@ -486,9 +745,10 @@ class EventManager:
         except:
             debug.printException(debug.LEVEL_WARNING)
             debug.printStack(debug.LEVEL_WARNING)
+        duration = time.time() - startTime
+        latency.record(latency.EVENT, "%s | %s" % (eType, scriptName), duration)
         debug.println(debug.eventDebugLevel,
-                      "TOTAL PROCESSING TIME: %.4f" \
-                      % (time.time() - startTime))
+                      "TOTAL PROCESSING TIME: %.4f" % duration)
         debug.println(debug.eventDebugLevel,
                       "^^^^^ PROCESS %s %s ^^^^^\n" % (eType, data))
 
@@ -501,7 +761,8 @@ class EventManager:
 
         script = None
         try:
-            app = event.host_application or event.source.getApplication()
+            app = event.host_application \
+                or source_snapshot.getSnapshot(event).getApplication()
             if app and app.getState().contains(pyatspi.STATE_DEFUNCT):
                 msg = 'WARNING: App is defunct. Cannot get script for event.'
                 debug.println(debug.LEVEL_WARNING, msg)
@@ -526,13 +787,14 @@ class EventManager:
         if not event.source:
             return False, "event.source? What event.source??"
 
+        snapshot = source_snapshot.getSnapshot(event)
         role = state = None
         try:
-            role = event.source.getRole()
+            role = snapshot.getRole()
         except (LookupError, RuntimeError):
             return False, "Error getting event.source's role"
         try:
-            state = event.source.getState()
+            state = snapshot.getState()
         except (LookupError, RuntimeError):
             return False, "Error getting event.source's state"
         
@@ -598,8 +860,14 @@ class EventManager:
            and orca_state.activeScript.app == event.host_application:
             orca_state.activeScript.flatReviewContext = None
 
+        # The state the snapshot has is the one from when the event was
+        # queued, so fetch it again: the object may have since become
+        # defunct or been iconified.
+        #
+        snapshot = source_snapshot.getSnapshot(event)
+        snapshot.forgetState()
         try:
-            state = event.source.getState()
+            state = snapshot.getState()
         except (LookupError, RuntimeError):
             debug.println(debug.LEVEL_WARNING,
                           "Error while processing event: %s" % eType)
@@ -633,7 +901,7 @@ class EventManager:
         setNewActiveScript, reason = self._isActivatableEvent(event, script)
         if setNewActiveScript:
             try:
-                app = event.host_application or event.source.getApplication()
+                app = event.host_application or snapshot.getApplication()
             except:
                 msg = 'ERROR: Could not get application for %s' % event.source
                 debug.println(debug.LEVEL_INFO, msg)
@@ -645,11 +913,14 @@ class EventManager:
                 debug.println(debug.LEVEL_INFO, msg)
                 return
 
+        startTime = time.time()
         try:
             script.processObjectEvent(event)
         except:
             msg = 'ERROR: Could not process %s' % event.type
             debug.println(debug.LEVEL_INFO, msg)
+        latency.record(latency.EVENT, "%s | %s" % (eType, script.name),
+                       time.time() - startTime)
 
     def processKeyboardEvent(self, keyboardEvent):
         """Processes the given keyboard event based on the keybinding from the
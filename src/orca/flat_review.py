@@ -25,16 +25,24 @@ __date__      = "$Date$"
 __copyright__ = "Copyright (c) 2005-2008 Sun Microsystems Inc."
 __license__   = "LGPL"
 
+import bisect
+import collections
+import heapq
 import pyatspi
 import re
+import time
+
+from gi.repository import GLib
 
 from . import braille
 from . import debug
+from . import event_manager
 from . import eventsynthesizer
 from . import messages
 from . import object_properties
 from . import orca_state
 from . import settings
+from . import snapshot_cache
 
 from .braille_generator import BrailleGenerator
 
@@ -564,6 +572,269 @@ class Line:
 
         return self.brailleRegions
 
+class ZoneCache:
+    """Remembers the Zones found in each subtree of a window, so that
+    returning to flat review in a window which has not changed does not
+    require traversing it again, and returning to one which has changed
+    only requires traversing the subtrees which changed.
+    """
+
+    def __init__(self, root):
+        """Creates a new, empty ZoneCache.
+
+        Arguments:
+        - root: the top-level Accessible whose Zones are cached
+        """
+
+        self.root = root
+        try:
+            self.app = root.getApplication()
+        except:
+            self.app = None
+
+        # Incremented whenever cached Zones are discarded, so that a
+        # Context can tell its lines are out of date.
+        #
+        self.generation = 0
+
+        # When the Zones were last asked for, so that the caches of windows
+        # which are not returned to can be dropped.
+        #
+        self.lastUsed = time.time()
+
+        self._zones = {}
+        self._parents = {}
+        self._children = {}
+
+    def get(self, obj):
+        """Returns the cached list of Zones for the subtree rooted at obj,
+        or None if there is none."""
+
+        return self._zones.get(obj)
+
+    def set(self, obj, parent, zones):
+        """Caches the list of Zones for the subtree rooted at obj, whose
+        parent in the traversal was parent."""
+
+        self._zones[obj] = zones
+        if parent is not None and self._parents.get(obj) != parent:
+            self._parents[obj] = parent
+            self._children.setdefault(parent, []).append(obj)
+
+    def knows(self, obj):
+        return obj in self._zones or obj in self._parents
+
+    def clear(self):
+        self._zones = {}
+        self._parents = {}
+        self._children = {}
+        self.generation += 1
+
+    def invalidate(self, obj, includeDescendants=False):
+        """Discards the cached Zones of obj and of its ancestors, whose
+        Zones include those of obj. If includeDescendants is True, the
+        Zones of the descendants of obj, whose extents may have changed
+        along with those of obj, are discarded too.
+
+        Returns True if any cached Zones were discarded.
+        """
+
+        changed = False
+        if includeDescendants:
+            pending = list(self._children.get(obj, []))
+            while pending:
+                child = pending.pop()
+                if self._zones.pop(child, None) is not None:
+                    changed = True
+                pending.extend(self._children.get(child, []))
+
+        while obj is not None:
+            if self._zones.pop(obj, None) is not None:
+                changed = True
+            obj = self._parents.get(obj)
+
+        if changed:
+            self.generation += 1
+
+        return changed
+
+# The maximum number of windows whose Zones are remembered.
+#
+MAX_CACHED_WINDOWS = 5
+
+# Seconds after which the Zones of a window which has not been reviewed
+# are forgotten, and how often to check for such windows.
+#
+MAX_CACHE_AGE = 600
+CACHE_CHECK_INTERVAL = 60
+
+# Top-level Accessible -> ZoneCache, least recently used first.
+#
+_zoneCaches = collections.OrderedDict()
+
+def _getChangedObject(event):
+    """Returns a tuple of the Accessible whose Zones are affected by the
+    event and whether the Zones of its descendants are affected too."""
+
+    eventType = event.type
+    obj = event.source
+    if eventType.startswith("object:bounds-changed") \
+       or eventType.startswith("object:visible-data-changed") \
+       or eventType.startswith("object:state-changed:showing") \
+       or eventType.startswith("object:state-changed:visible"):
+        return obj, True
+
+    if eventType.startswith("object:value-changed"):
+        # Scrolling moves everything in the scroll pane, but is seldom
+        # announced by anything other than the scroll bar.
+        #
+        cache = snapshot_cache.getCache()
+        try:
+            if cache.getRole(obj) == pyatspi.ROLE_SCROLL_BAR:
+                return cache.getParent(obj), True
+        except:
+            pass
+
+    return obj, False
+
+def _onObjectChanged(event):
+    if event.type.startswith("object:children-changed:remove") \
+       and event.source == event_manager.getManager().registry.getDesktop(0):
+        # An application has gone away.
+        #
+        _dropZoneCaches(lambda c: c.app is None or c.app == event.any_data)
+        return
+
+    caches = [c for c in _zoneCaches.values() \
+              if c.app is None or c.app == event.host_application]
+    if not caches:
+        return
+
+    obj, includeDescendants = _getChangedObject(event)
+    if obj is None:
+        return
+
+    for cache in caches:
+        if obj == cache.root \
+           and event.type.startswith("object:state-changed:defunct"):
+            _dropZoneCaches(lambda c: c is cache)
+            continue
+
+        if cache.knows(obj):
+            cache.invalidate(obj, includeDescendants)
+            continue
+
+        # The object is unknown to us, e.g. because it is new or is
+        # presented as part of an ancestor's Zones. Whatever changed,
+        # the Zones of its nearest known ancestor include it.
+        #
+        try:
+            ancestors = snapshot_cache.getCache().getAncestors(obj)
+        except:
+            continue
+        for ancestor in ancestors:
+            if cache.knows(ancestor):
+                cache.invalidate(ancestor, includeDescendants)
+                break
+
+    debug.println(debug.LEVEL_ALL, "FLAT REVIEW: %s for %s",
+                  event.type, event.source)
+
+_listeners = {
+    "object:children-changed": _onObjectChanged,
+    "object:text-changed": _onObjectChanged,
+    "object:bounds-changed": _onObjectChanged,
+    "object:visible-data-changed": _onObjectChanged,
+    "object:state-changed": _onObjectChanged,
+    "object:value-changed": _onObjectChanged,
+    "object:property-change:accessible-name": _onObjectChanged,
+}
+
+_listening = False
+
+def _setListening(listen):
+    global _listening
+    if listen == _listening:
+        return
+
+    manager = event_manager.getManager()
+    if listen:
+        manager.registerModuleListeners(_listeners)
+    else:
+        manager.deregisterModuleListeners(_listeners)
+    _listening = listen
+
+def getZoneCache(root):
+    """Returns the ZoneCache for the top-level Accessible root, creating
+    one if necessary. Only the most recently used MAX_CACHED_WINDOWS
+    are kept, for at most MAX_CACHE_AGE seconds after they were last
+    used. The events which keep them up to date are listened for while
+    there are any, and only the events of their applications are looked
+    at."""
+
+    global _checkId
+
+    cache = _zoneCaches.get(root)
+    if cache is not None:
+        _zoneCaches.move_to_end(root)
+        cache.lastUsed = time.time()
+        return cache
+
+    cache = _zoneCaches[root] = ZoneCache(root)
+    while len(_zoneCaches) > MAX_CACHED_WINDOWS:
+        oldRoot, oldCache = _zoneCaches.popitem(last=False)
+        oldCache.clear()
+
+    _setListening(True)
+    if not _checkId:
+        _checkId = GLib.timeout_add(CACHE_CHECK_INTERVAL * 1000,
+                                    _checkZoneCaches)
+    return cache
+
+_checkId = 0
+
+def _isDead(cache):
+    try:
+        return cache.root.getState().contains(pyatspi.STATE_DEFUNCT)
+    except:
+        return True
+
+def _checkZoneCaches():
+    """Drops the caches of the windows which have not been reviewed for
+    MAX_CACHE_AGE seconds or which no longer exist."""
+
+    global _checkId
+
+    oldest = time.time() - MAX_CACHE_AGE
+    _dropZoneCaches(lambda c: c.lastUsed < oldest or _isDead(c))
+    if _zoneCaches:
+        return True
+
+    _checkId = 0
+    return False
+
+def _dropZoneCaches(predicate):
+    """Drops the caches for which predicate is True, and stops listening
+    for changes when none are left."""
+
+    for root, cache in list(_zoneCaches.items()):
+        if predicate(cache):
+            del _zoneCaches[root]
+            cache.clear()
+
+    if not _zoneCaches:
+        _setListening(False)
+
+def clearZoneCaches():
+    """Forgets the Zones of all windows."""
+
+    global _checkId
+
+    _dropZoneCaches(lambda c: True)
+    if _checkId:
+        GLib.source_remove(_checkId)
+        _checkId = 0
+
 class Context:
     """Information regarding where a user happens to be exploring
     right now.
@@ -585,6 +856,10 @@ class Context:
         review mode.
         """
         self.script    = script
+        self.zoneCache = None
+        self.generation = 0
+        self.timedOut = False
+        self._deadline = None
 
         if (not orca_state.locusOfFocus) \
             or (orca_state.locusOfFocus.getApplication() \
@@ -595,7 +870,9 @@ class Context:
             #
             obj = script.utilities.topLevelObject(orca_state.locusOfFocus)
             if obj:
-                self.lines = self.clusterZonesByLine(self.getShowingZones(obj))
+                self.zoneCache = getZoneCache(obj)
+                self.generation = self.zoneCache.generation
+                self.lines = self.clusterZonesByLine(self.getWindowZones(obj))
             else:
                 self.lines = []
 
@@ -708,6 +985,67 @@ class Context:
         #
         self.targetCharInfo = None
 
+    def isStale(self):
+        """Returns True if Zones of the window have changed since the
+        lines were built."""
+
+        return self.zoneCache is not None \
+            and self.generation != self.zoneCache.generation
+
+    def refresh(self):
+        """Rebuilds the lines, traversing only the subtrees of the window
+        which have changed, and keeps the review position on the same Zone
+        if it still exists."""
+
+        if self.zoneCache is None:
+            return
+
+        try:
+            current = self.lines[self.lineIndex].zones[self.zoneIndex]
+        except:
+            current = None
+
+        root = self.zoneCache.root
+        self.zoneCache = getZoneCache(root)
+        self.generation = self.zoneCache.generation
+        self.lines = self.clusterZonesByLine(self.getWindowZones(root))
+
+        def isCurrent(zone):
+            if zone is current:
+                return True
+            if zone.__class__ != current.__class__ \
+               or zone.accessible != current.accessible:
+                return False
+            if isinstance(zone, TextZone):
+                return zone.startOffset == current.startOffset
+            return True
+
+        found = None
+        if current:
+            for line in self.lines:
+                for zone in line.zones:
+                    if isCurrent(zone):
+                        found = zone
+                        break
+                if found:
+                    break
+
+        if not found:
+            self.lineIndex = max(0, min(self.lineIndex, len(self.lines) - 1))
+            self.zoneIndex = 0
+            self.wordIndex = 0
+            self.charIndex = 0
+            return
+
+        self.lineIndex = found.line.index
+        self.zoneIndex = found.index
+        if self.wordIndex >= len(found.words):
+            self.wordIndex = max(0, len(found.words) - 1)
+            self.charIndex = 0
+        else:
+            word = found.words[self.wordIndex]
+            self.charIndex = min(self.charIndex, max(0, word.length - 1))
+
     def clip(self,
              ax, ay, awidth, aheight,
              bx, by, bwidth, bheight):
@@ -1061,8 +1399,8 @@ class Context:
 
         debug.println(
             debug.LEVEL_FINEST,
-            "flat_review.getZonesFromAccessible (name=%s role=%s)" \
-            % (accessible.name, accessible.getRoleName()))
+            lambda: "flat_review.getZonesFromAccessible (name=%s role=%s)"
+                    % (accessible.name, accessible.getRoleName()))
 
         # Now see if there is any accessible text.  If so, find new zones,
         # where each zone represents a line of this text object.  When
@@ -1188,16 +1526,48 @@ class Context:
 
         return zones
 
-    def getShowingZones(self, root):
+    def getWindowZones(self, root):
+        """Returns the Zones of the window root, in the same order as
+        getShowingZones.  If settings.flatReviewTimeout is set, the
+        traversal gives up after that many seconds, and the Zones found
+        so far are returned, with timedOut set to True.
+
+        Arguments:
+        - root: the top-level Accessible object
+
+        Returns: a list of Zones in the window
+        """
+
+        self.timedOut = False
+        self._deadline = None
+        if settings.flatReviewTimeout:
+            self._deadline = time.time() + settings.flatReviewTimeout
+
+        try:
+            zones = self.getShowingZones(root)
+        finally:
+            self._deadline = None
+
+        if self.timedOut:
+            msg = "FLAT REVIEW: Gave up traversing %s after %s seconds"
+            debug.println(debug.LEVEL_INFO, msg, root,
+                          settings.flatReviewTimeout)
+
+        return zones
+
+    def getShowingZones(self, root, parent=None):
         """Returns a list of all interesting, non-intersecting, regions
         that are drawn on the screen.  Each element of the list is the
         Accessible object associated with a given region.  The term
         'zone' here is inherited from OCR algorithms and techniques.
 
-        The Zones are returned in no particular order.
+        The Zones are returned in no particular order.  The Zones of each
+        subtree are remembered in the zoneCache, and reused until an event
+        says the subtree has changed.
 
         Arguments:
         - root: the Accessible object to traverse
+        - parent: the Accessible object whose traversal led to root
 
         Returns: a list of Zones under the specified object
         """
@@ -1205,6 +1575,32 @@ class Context:
         if not root:
             return []
 
+        if self._deadline is not None and time.time() > self._deadline:
+            self.timedOut = True
+        if self.timedOut:
+            return []
+
+        if self.zoneCache is None:
+            return self._getShowingZones(root)
+
+        zones = self.zoneCache.get(root)
+        if zones is None:
+            zones = self._getShowingZones(root)
+
+            # If we gave up on the traversal, these might not be all of
+            # the Zones under root.
+            #
+            if not self.timedOut:
+                self.zoneCache.set(root, parent, list(zones))
+        else:
+            zones = list(zones)
+
+        return zones
+
+    def _getShowingZones(self, root):
+        """Returns the Zones under root, traversing its children with
+        getShowingZones."""
+
         zones = []
         try:
             rootexts = root.queryComponent().getExtents(0)
@@ -1279,7 +1675,7 @@ class Context:
             self.script.utilities.showingDescendants(root)
         if len(showingDescendants):
             for child in showingDescendants:
-                zones.extend(self.getShowingZones(child))
+                zones.extend(self.getShowingZones(child, root))
         else:
             for i in range(0, root.childCount):
                 child = root.getChildAtIndex(i)
@@ -1299,7 +1695,7 @@ class Context:
                                   "WARNING CHILD.PARENT != PARENT!!!")
                                   
                 if self.script.utilities.pursueForFlatReview(child):
-                    zones.extend(self.getShowingZones(child))
+                    zones.extend(self.getShowingZones(child, root))
 
         return zones
 
@@ -1316,46 +1712,78 @@ class Context:
         # Sort the zones and also find the top most zone - we'll bias
         # the clustering to the top of the window.  That is, if an
         # object can be part of multiple clusters, for now it will
-        # become a part of the top most cluster.
+        # become a part of the top most cluster.  The sort is stable,
+        # so zones at the same y keep their original order.
         #
-        numZones = len(zones)
-        for i in range(0, numZones):
-            for j in range(0, numZones - 1 - i):
-                a = zones[j]
-                b = zones[j + 1]
-                if b.y < a.y:
-                    zones[j] = b
-                    zones[j + 1] = a
+        zones.sort(key=lambda zone: zone.y)
 
         # Now we cluster the zones.  We create the clusters on the
         # fly, adding a zone to an existing cluster only if it's
         # rectangle horizontally overlaps all other zones in the
         # cluster.
         #
+        # Because the candidates come in order of y, a candidate can
+        # only overlap a zone which ends below its top.  So once a
+        # candidate starts at or below the highest bottom of a cluster,
+        # no later candidate can join that cluster, and we stop looking
+        # at it.  The clusters which remain active are few (usually one
+        # or two) regardless of the number of zones.
+        #
         lineClusters = []
+        clusterXs = []
+        clusterBottoms = []
+        activeClusters = []
+        bottomsHeap = []
         for clusterCandidate in zones:
+            top = clusterCandidate.y
+            retired = False
+            while bottomsHeap and bottomsHeap[0][0] <= top:
+                bottom, index = heapq.heappop(bottomsHeap)
+                if clusterBottoms[index] is not None \
+                   and clusterBottoms[index] <= top:
+                    clusterBottoms[index] = None
+                    retired = True
+            if retired:
+                activeClusters = [i for i in activeClusters
+                                  if clusterBottoms[i] is not None]
+
+            # If the candidate's top is far enough above the highest
+            # bottom in a cluster, it overlaps every zone in the cluster
+            # by more than the 25% onSameLine requires, and we needn't
+            # check them one by one.
+            #
+            height = clusterCandidate.height
             addedToCluster = False
-            for lineCluster in lineClusters:
+            for index in activeClusters:
+                lineCluster = lineClusters[index]
                 inCluster = True
-                for zone in lineCluster:
-                    if not zone.onSameLine(clusterCandidate):
-                        inCluster = False
-                        break
+                if height <= 0 or clusterBottoms[index] - top <= 0.25 * height:
+                    for zone in lineCluster:
+                        if not zone.onSameLine(clusterCandidate):
+                            inCluster = False
+                            break
                 if inCluster:
-                    # Add to cluster based on the x position.
+                    # Add to cluster based on the x position, after any
+                    # zones with the same x.
                     #
-                    i = 0
-                    while i < len(lineCluster):
-                        zone = lineCluster[i]
-                        if clusterCandidate.x < zone.x:
-                            break
-                        else:
-                            i += 1
+                    xs = clusterXs[index]
+                    i = bisect.bisect_right(xs, clusterCandidate.x)
+                    xs.insert(i, clusterCandidate.x)
                     lineCluster.insert(i, clusterCandidate)
+                    bottom = top + height
+                    if bottom < clusterBottoms[index]:
+                        clusterBottoms[index] = bottom
+                        heapq.heappush(bottomsHeap, (bottom, index))
                     addedToCluster = True
                     break
             if not addedToCluster:
+                index = len(lineClusters)
+                bottom = top + height
                 lineClusters.append([clusterCandidate])
+                clusterXs.append([clusterCandidate.x])
+                clusterBottoms.append(bottom)
+                activeClusters.append(index)
+                heapq.heappush(bottomsHeap, (bottom, index))
 
         # Now, adjust all the indeces.
         #
@@ -25,6 +25,7 @@ __date__      = "$Date:$"
 __copyright__ = "Copyright (c) 2009 Sun Microsystems Inc."
 __license__   = "LGPL"
 
+import dis
 import sys
 import time
 import traceback
@@ -33,9 +34,11 @@ import pyatspi
 
 from . import braille
 from . import debug
+from . import latency
 from . import messages
 from . import object_properties
 from . import settings
+from . import snapshot_cache
 
 import collections
 
@@ -58,6 +61,55 @@ def _formatExceptionInfo(maxTBlevel=5):
 #
 METHOD_PREFIX = "_generate"
 
+# Formatting strings compiled into code objects, keyed by the string.
+# Each entry is a (code, names) tuple, where names is the set of names
+# the expression looks up when it is evaluated.
+#
+_compiledFormatting = {}
+
+def _compileFormatting(formatting):
+    """Returns a (code, names) tuple for the given formatting string,
+    compiling it the first time it is seen."""
+
+    try:
+        return _compiledFormatting[formatting]
+    except KeyError:
+        pass
+
+    code = compile(formatting, '<formatting>', 'eval')
+    names = frozenset([x.argval for x in dis.get_instructions(code) \
+                       if x.opname == 'LOAD_NAME'])
+    _compiledFormatting[formatting] = code, names
+    return code, names
+
+class _GeneratedResults(dict):
+    """The namespace a compiled formatting string is evaluated in. The
+    result of a generator method is only computed the first time the
+    expression looks up its name, so short-circuited parts of the format
+    (e.g. 'displayedText or name') never call the methods they skip."""
+
+    def __init__(self, methods, names, obj, args):
+        dict.__init__(self)
+        self._methods = methods
+        self._names = names
+        self._obj = obj
+        self._args = args
+
+    def __missing__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+
+        method = self._methods[name]
+        currentTime = time.time()
+        value = method(self._obj, **self._args)
+        self[name] = value
+        duration = time.time() - currentTime
+        latency.record(latency.GENERATOR, method.__qualname__, duration)
+        debug.println(debug.LEVEL_ALL,
+                      "GENERATION  TIME: %.4f  ---->  %s=%r",
+                      duration, name, value)
+        return value
+
 class Generator:
     """Takes accessible objects and generates a presentation for those
     objects.  See the generate method, which is the primary entry
@@ -77,8 +129,33 @@ class Generator:
             name = method.__name__[len(METHOD_PREFIX):]
             name = name[0].lower() + name[1:]
             self._methodsDict[name] = method
+
+        # The names _addGlobals provides take precedence over generator
+        # methods of the same name, as they always have.
+        #
+        globalsDict = {}
+        self._addGlobals(globalsDict)
+        self._globalNames = frozenset(globalsDict.keys())
+        self._generatorNames = {}
+
         self._verifyFormatting()
 
+    def _getCompiledFormatting(self, formatting):
+        """Returns a (code, generatorNames) tuple for the given formatting
+        string, where generatorNames are the names in the string that
+        are satisfied by calling one of our generator methods."""
+
+        code, names = _compileFormatting(formatting)
+        try:
+            generatorNames = self._generatorNames[formatting]
+        except KeyError:
+            generatorNames = frozenset([x for x in names \
+                                        if x in self._methodsDict \
+                                        and x not in self._globalNames])
+            self._generatorNames[formatting] = generatorNames
+
+        return code, generatorNames
+
     def _addGlobals(self, globalsDict):
         """Other things to make available from the formatting string.
         """
@@ -186,10 +263,13 @@ class Generator:
         self._addGlobals(globalsDict)
         globalsDict['obj'] = obj
         try:
-            globalsDict['role'] = args.get('role', obj.getRole())
+            if 'role' in args:
+                globalsDict['role'] = args['role']
+            else:
+                globalsDict['role'] = snapshot_cache.getCache().getRole(obj)
         except:
-            msg = 'Cannot generate presentation for: %s. Aborting' % obj
-            debug.println(debug.LEVEL_FINEST, msg)
+            msg = 'Cannot generate presentation for: %s. Aborting'
+            debug.println(debug.LEVEL_FINEST, msg, obj)
             return result
         try:
             # We sometimes want to override the role.  We'll keep the
@@ -197,13 +277,6 @@ class Generator:
             #
             args['role'] = globalsDict['role']
 
-            # We loop through the format string, catching each error
-            # as we go.  Each error should always be a NameError,
-            # where the name is the name of one of our generator
-            # functions.  When we encounter this, we call the function
-            # and get its results, placing them in the globals for the
-            # the call to eval.
-            #
             args['mode'] = self._mode
             if not args.get('formatType', None):
                 if args.get('alreadyFocused', False):
@@ -226,50 +299,44 @@ class Generator:
             else:
                 firstTimeCalled = False
 
-            details = debug.getAccessibleDetails(debug.LEVEL_ALL, obj)
-            duration = "%.4f" % (time.time() - startTime)
-            debug.println(debug.LEVEL_ALL, "\nPREPARATION TIME: %s" % duration)
+            debug.println(debug.LEVEL_ALL, "\nPREPARATION TIME: %.4f",
+                          time.time() - startTime)
             debug.println(
                 debug.LEVEL_ALL,
-                "generate %s for %s %s (args=%s) using '%s'" \
+                lambda: "generate %s for %s %s (args=%r) using '%s'" \
                 % (self._mode,
-                   args['formatType'], 
-                   details,
-                   repr(args),
+                   args['formatType'],
+                   debug.getAccessibleDetails(debug.LEVEL_ALL, obj),
+                   args,
                    formatting))
 
             assert(formatting)
-            while True:
-                currentTime = time.time()
-                try:
-                    result = eval(formatting, globalsDict)
-                    break
-                except NameError:
-                    result = []
-                    info = _formatExceptionInfo()
-                    arg = info[1][0]
-                    arg = arg.replace("name '", "")
-                    arg = arg.replace("' is not defined", "")
-                    if arg not in self._methodsDict:
-                        debug.printException(debug.LEVEL_SEVERE)
-                        debug.println(
-                            debug.LEVEL_SEVERE,
-                            "Unable to find function for '%s'\n" % arg)
-                        break
-                    globalsDict[arg] = self._methodsDict[arg](obj, **args)
-                    duration = "%.4f" % (time.time() - currentTime)
-                    debug.println(debug.LEVEL_ALL,
-                                  "GENERATION  TIME: %s  ---->  %s=%s" \
-                                  % (duration, arg, repr(globalsDict[arg])))
+
+            # The formatting string is compiled once. Each generator
+            # function it refers to is called the first time evaluation
+            # needs its value, so the string is only evaluated once.
+            #
+            code, generatorNames = self._getCompiledFormatting(formatting)
+            generated = _GeneratedResults(
+                self._methodsDict, generatorNames, obj, args)
+            try:
+                result = eval(code, globalsDict, generated)
+            except NameError:
+                result = []
+                debug.printException(debug.LEVEL_SEVERE)
+                debug.println(
+                    debug.LEVEL_SEVERE,
+                    "Unable to find function in '%s'\n" % formatting)
         except:
             debug.printException(debug.LEVEL_SEVERE)
             result = []
 
-        duration = "%.4f" % (time.time() - startTime)
-        debug.println(debug.LEVEL_ALL, "COMPLETION  TIME: %s" % duration)
-        debug.println(debug.LEVEL_ALL, "generate %s results:" % self._mode)
-        for element in result:
-            debug.println(debug.LEVEL_ALL, "  %s" % element)
+        if debug.LEVEL_ALL >= debug.debugLevel:
+            debug.println(debug.LEVEL_ALL, "COMPLETION  TIME: %.4f",
+                          time.time() - startTime)
+            debug.println(debug.LEVEL_ALL, "generate %s results:", self._mode)
+            for element in result:
+                debug.println(debug.LEVEL_ALL, "  %s", element)
 
         return result
 
@@ -303,8 +370,9 @@ class Generator:
         needed a _generateDescription for whereAmI. :-) See below.
         """
         result = []
+        cache = snapshot_cache.getCache()
         name = self._script.utilities.displayedText(obj)
-        if obj.getRole() == pyatspi.ROLE_COMBO_BOX:
+        if cache.getRole(obj) == pyatspi.ROLE_COMBO_BOX:
             children = self._script.utilities.selectedChildren(obj)
             if not children and obj.childCount:
                 children = self._script.utilities.selectedChildren(obj[0])
@@ -328,22 +396,23 @@ class Generator:
                 result.append(description)
             else:
                 link = None
-                if obj.getRole() == pyatspi.ROLE_LINK:
+                parent = cache.getParent(obj)
+                if cache.getRole(obj) == pyatspi.ROLE_LINK:
                     link = obj
-                elif obj.parent.getRole() == pyatspi.ROLE_LINK:
-                    link = obj.parent
+                elif cache.getRole(parent) == pyatspi.ROLE_LINK:
+                    link = parent
                 if link:
                     basename = self._script.utilities.linkBasename(link)
                     if basename:
                         result.append(basename)
         # To make the unlabeled icons in gnome-panel more accessible.
         try:
-            role = args.get('role', obj.getRole())
+            role = args.get('role') or cache.getRole(obj)
         except (LookupError, RuntimeError):
             return result
-        if not result and obj.getRole() == pyatspi.ROLE_ICON \
-           and obj.parent.getRole() == pyatspi.ROLE_PANEL:
-            return self._generateName(obj.parent)
+        if not result and cache.getRole(obj) == pyatspi.ROLE_ICON \
+           and cache.getRole(cache.getParent(obj)) == pyatspi.ROLE_PANEL:
+            return self._generateName(cache.getParent(obj))
 
         return result
 
@@ -1035,14 +1104,13 @@ class Generator:
         represents the nearest ancestor of an object which is a named panel.
         """
         result = []
-        parent = obj.parent
-        while parent and (parent.parent != parent):
-            if parent.getRole() == pyatspi.ROLE_PANEL:
+        cache = snapshot_cache.getCache()
+        for parent in cache.getAncestors(obj):
+            if cache.getRole(parent) == pyatspi.ROLE_PANEL:
                 label = self._generateLabelAndName(parent)
                 if label:
                     result.extend(label)
                     break
-            parent = parent.parent
         return result
 
     def _generatePageSummary(self, obj, **args):
@@ -28,7 +28,6 @@ __license__   = "LGPL"
 
 from gi.repository import Gdk
 
-import functools
 import pyatspi
 
 from . import debug
@@ -271,6 +270,23 @@ class KeyBindings:
 
     def __init__(self):
         self.keyBindings = []
+        self._changed()
+
+    def _changed(self):
+        """Discards the indexes of the key bindings, so that they are
+        rebuilt from self.keyBindings the next time they are needed."""
+
+        # Keycode to the key bindings for that keycode, in the order they
+        # were added.
+        self._keycodeIndex = None
+
+        # (keycode, modifiers, click count, keypad with num lock) to the
+        # handler getInputHandler() found for them.
+        self._handlers = {}
+
+        # For each hasKeyBinding() search type, the set of keys for that
+        # type of the key bindings.
+        self._searchIndexes = {}
 
     def __str__(self):
         result = "[\n"
@@ -289,23 +305,45 @@ class KeyBindings:
         """
 
         self.keyBindings.append(keyBinding)
+        self._changed()
 
     def remove(self, keyBinding):
         """Removes the given KeyBinding instance from this set of keybindings.
         """
 
-        for i in range(0, len(self.keyBindings)):
-            if keyBinding == self.keyBindings[i]:
-                del self.keyBindings[i]
+        self.keyBindings = [kb for kb in self.keyBindings if kb != keyBinding]
+        self._changed()
 
     def removeByHandler(self, handler):
         """Removes the given KeyBinding instance from this set of keybindings.
         """
-        i = len(self.keyBindings)
-        while i > 0:
-            if self.keyBindings[i - 1].handler == handler:
-                del self.keyBindings[i - 1]
-            i = i - 1
+
+        self.keyBindings = \
+            [kb for kb in self.keyBindings if kb.handler != handler]
+        self._changed()
+
+    @staticmethod
+    def _getSearchKey(keyBinding, typeOfSearch):
+        """Returns what hasKeyBinding() compares for typeOfSearch."""
+
+        if typeOfSearch == "strict":
+            return (keyBinding.handler.description,
+                    keyBinding.keysymstring,
+                    keyBinding.modifier_mask,
+                    keyBinding.modifiers,
+                    keyBinding.click_count)
+        if typeOfSearch == "description":
+            return keyBinding.handler.description
+        if typeOfSearch == "keys":
+            return (keyBinding.keysymstring,
+                    keyBinding.modifier_mask,
+                    keyBinding.modifiers,
+                    keyBinding.click_count)
+        if typeOfSearch == "keysNoMask":
+            return (keyBinding.keysymstring,
+                    keyBinding.modifiers,
+                    keyBinding.click_count)
+        return None
 
     def hasKeyBinding (self, newKeyBinding, typeOfSearch="strict"):
         """Return True if keyBinding is already in self.keyBindings.
@@ -319,45 +357,16 @@ class KeyBindings:
               "keysNoMask":  matches the modifiers, key, and click count
         """
 
-        hasIt = False
+        if self._getSearchKey(newKeyBinding, typeOfSearch) is None:
+            return False
 
-        for keyBinding in self.keyBindings:
-            if typeOfSearch == "strict":
-                if (keyBinding.handler.description \
-                    == newKeyBinding.handler.description) \
-                    and (keyBinding.keysymstring \
-                         == newKeyBinding.keysymstring) \
-                    and (keyBinding.modifier_mask \
-                         == newKeyBinding.modifier_mask) \
-                    and (keyBinding.modifiers \
-                         == newKeyBinding.modifiers) \
-                    and (keyBinding.click_count \
-                         == newKeyBinding.click_count):
-                    hasIt = True
-            elif typeOfSearch == "description":
-                if keyBinding.handler.description \
-                    == newKeyBinding.handler.description:
-                    hasIt = True
-            elif typeOfSearch == "keys":
-                if (keyBinding.keysymstring \
-                    == newKeyBinding.keysymstring) \
-                    and (keyBinding.modifier_mask \
-                         == newKeyBinding.modifier_mask) \
-                    and (keyBinding.modifiers \
-                         == newKeyBinding.modifiers) \
-                    and (keyBinding.click_count \
-                         == newKeyBinding.click_count):
-                    hasIt = True
-            elif typeOfSearch == "keysNoMask":
-                if (keyBinding.keysymstring \
-                    == newKeyBinding.keysymstring) \
-                    and (keyBinding.modifiers \
-                         == newKeyBinding.modifiers) \
-                    and (keyBinding.click_count \
-                         == newKeyBinding.click_count):
-                    hasIt = True
-
-        return hasIt
+        keys = self._searchIndexes.get(typeOfSearch)
+        if keys is None:
+            keys = set(self._getSearchKey(kb, typeOfSearch)
+                       for kb in self.keyBindings)
+            self._searchIndexes[typeOfSearch] = keys
+
+        return self._getSearchKey(newKeyBinding, typeOfSearch) in keys
 
     def getBoundBindings(self, uniqueOnly=False):
         """Returns the KeyBinding instances which are bound to a keystroke.
@@ -379,35 +388,66 @@ class KeyBindings:
 
         return [kb for kb in self.keyBindings if kb.handler == handler]
 
+    def _getKeycodeIndex(self):
+        """Returns a dictionary of keycode to the key bindings for that
+        keycode, in the order they were added."""
+
+        if self._keycodeIndex is None:
+            index = {}
+            for keyBinding in self.keyBindings:
+                # We lazily bind the keycode, as KeyBinding.matches() does.
+                #
+                if not keyBinding.keycode:
+                    keyBinding.keycode = getKeycode(keyBinding.keysymstring)
+                index.setdefault(keyBinding.keycode, []).append(keyBinding)
+            self._keycodeIndex = index
+
+        return self._keycodeIndex
+
     def getInputHandler(self, keyboardEvent):
         """Returns the input handler of the key binding that matches the
         given keycode and modifiers, or None if no match exists.
         """
 
-        candidates = []
+        keycode = keyboardEvent.hw_code
+        modifiers = keyboardEvent.modifiers
         clickCount = keyboardEvent.getClickCount()
-        for keyBinding in self.keyBindings:
-            if keyBinding.matches(keyboardEvent.hw_code,
-                                  keyboardEvent.modifiers):
-                if keyBinding.modifier_mask == keyboardEvent.modifiers and \
-                   keyBinding.click_count == clickCount:
-                    return keyBinding.handler
-                # If there's no keysymstring, it's unbound and cannot be
-                # a match.
-                #
-                if keyBinding.keysymstring:
-                    candidates.append(keyBinding)
+        isKeypad = bool(modifiers & (1 << pyatspi.MODIFIER_NUMLOCK)) \
+            and keyboardEvent.keyval_name.startswith("KP")
+        key = keycode, modifiers, clickCount, isKeypad
+        try:
+            return self._handlers[key]
+        except KeyError:
+            pass
 
-        if keyboardEvent.modifiers & (1 << pyatspi.MODIFIER_NUMLOCK) \
-            and keyboardEvent.keyval_name.startswith("KP"):
+        handler = self._findInputHandler(keycode, modifiers, clickCount,
+                                         isKeypad)
+        self._handlers[key] = handler
+        return handler
+
+    def _findInputHandler(self, keycode, modifiers, clickCount, isKeypad):
+        candidates = []
+        for keyBinding in self._getKeycodeIndex().get(keycode, []):
+            if modifiers & keyBinding.modifier_mask != keyBinding.modifiers:
+                continue
+
+            if keyBinding.modifier_mask == modifiers and \
+               keyBinding.click_count == clickCount:
+                return keyBinding.handler
+            # If there's no keysymstring, it's unbound and cannot be
+            # a match.
+            #
+            if keyBinding.keysymstring:
+                candidates.append(keyBinding)
+
+        if isKeypad:
             return None
 
         # If we're still here, we don't have an exact match. Prefer
         # the one whose click count is closest to, but does not exceed,
         # the actual click count.
         #
-        comparison = lambda x, y: y.click_count - x.click_count
-        candidates.sort(key=functools.cmp_to_key(comparison))
+        candidates.sort(key=lambda x: x.click_count, reverse=True)
         for candidate in candidates:
             if candidate.click_count <= clickCount:
                 return candidate.handler
@@ -0,0 +1,150 @@
+# Orca
+#
+# Copyright 2016 The Orca Team
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., Franklin Street, Fifth Floor,
+# Boston MA  02110-1301 USA.
+
+"""Keeps rolling latency statistics for the event pipeline.  Unlike the
+timing information printed by the debug module, the statistics are always
+collected and do not depend upon the debug level, so they can be saved as
+JSON at any time (e.g. via a key binding or a signal) without changing the
+timing of what is being measured."""
+
+__id__        = "$Id$"
+__version__   = "$Revision$"
+__date__      = "$Date$"
+__copyright__ = "Copyright (c) 2016 The Orca Team"
+__license__   = "LGPL"
+
+import collections
+import json
+import os
+import time
+
+# Categories of measurements.
+#
+EVENT = "event"
+QUEUE_WAIT = "queueWait"
+GENERATOR = "generator"
+
+# If False, nothing is recorded.
+#
+enabled = True
+
+# The number of most recent measurements kept for each key.
+#
+SAMPLE_SIZE = 500
+
+# The upper bounds, in seconds, of the histogram buckets.
+#
+BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0]
+
+# Category -> key -> [total count, deque of recent durations]
+#
+_measurements = {}
+
+# Name -> function returning additional statistics to include when saving.
+#
+_providers = {}
+
+def record(category, key, duration):
+    """Adds a measurement.
+
+    Arguments:
+    - category: the kind of measurement, such as EVENT
+    - key: what was measured, such as the event type
+    - duration: the time it took, in seconds
+    """
+
+    if not enabled:
+        return
+
+    keys = _measurements.get(category)
+    if keys is None:
+        keys = _measurements[category] = {}
+
+    measurement = keys.get(key)
+    if measurement is None:
+        measurement = keys[key] = [0, collections.deque(maxlen=SAMPLE_SIZE)]
+
+    measurement[0] += 1
+    measurement[1].append(duration)
+
+def registerStatsProvider(name, function):
+    """Includes the dictionary returned by function in the saved statistics
+    under the given name."""
+
+    _providers[name] = function
+
+def reset():
+    """Discards all measurements."""
+
+    _measurements.clear()
+
+def _summarize(count, samples):
+    samples = sorted(samples)
+    size = len(samples)
+    histogram = collections.OrderedDict()
+    index = 0
+    for bound in BUCKETS:
+        start = index
+        while index < size and samples[index] <= bound:
+            index += 1
+        histogram["<=%s" % bound] = index - start
+    histogram[">%s" % BUCKETS[-1]] = size - index
+
+    return {'count': count,
+            'recent': size,
+            'mean': sum(samples) / size,
+            'max': samples[-1],
+            'p50': samples[int(size * 0.5)],
+            'p90': samples[int(size * 0.9)],
+            'p99': samples[int(size * 0.99)],
+            'histogram': histogram}
+
+def getStats():
+    """Returns a dictionary of category -> key -> summary of the recent
+    measurements, along with the statistics from the registered providers."""
+
+    stats = {}
+    for category, keys in list(_measurements.items()):
+        stats[category] = {}
+        for key, (count, samples) in list(keys.items()):
+            if samples:
+                stats[category][key] = _summarize(count, samples)
+
+    for name, function in list(_providers.items()):
+        try:
+            stats[name] = function()
+        except:
+            pass
+
+    return stats
+
+def dump(fileName=None, directory=None):
+    """Saves the statistics as JSON, returning the name of the file. If
+    fileName is not given, a time-stamped file is created in directory,
+    or in the current directory if that is not given either."""
+
+    if not fileName:
+        fileName = time.strftime('orca-latency-%Y-%m-%d-%H:%M:%S.json')
+        if directory:
+            fileName = os.path.join(directory, fileName)
+
+    with open(fileName, 'w') as f:
+        json.dump(getStats(), f, indent=2, sort_keys=True)
+
+    return fileName
@@ -0,0 +1,64 @@
+# Orca
+#
+# Copyright 2016 The Orca Team
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., Franklin Street, Fifth Floor,
+# Boston MA  02110-1301 USA.
+
+"""Defers importing the modules of features which are not needed to start
+presenting, such as mouse review, the dialogs and sound, until they are
+first used. A module is imported the first time one of its attributes is
+looked up through its LazyModule; an error importing it is raised there
+rather than when Orca starts."""
+
+__id__        = "$Id$"
+__version__   = "$Revision$"
+__date__      = "$Date$"
+__copyright__ = "Copyright (c) 2016 The Orca Team"
+__license__   = "LGPL"
+
+import importlib
+import sys
+
+class LazyModule:
+    """Stands in for the module name, importing it when it is first
+    used. Looking up or setting an attribute of the LazyModule looks up or
+    sets it in the module."""
+
+    def __init__(self, name):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, '_module', module)
+        return module
+
+    def isLoaded(self):
+        """Returns True if the module has been imported, by this LazyModule
+        or by an ordinary import."""
+
+        return self._module is not None or self._name in sys.modules
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        return "<lazy module '%s'>" % self._name
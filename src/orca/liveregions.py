@@ -1,6 +1,8 @@
-import bisect
+import collections
 import copy
+import heapq
 import pyatspi
+import threading
 import time
 from gi.repository import GLib
 
@@ -24,49 +26,170 @@ LIVE_RUDE      = 3
 # Seconds a message is held in the queue before it is discarded
 MSG_KEEPALIVE_TIME = 45  # in seconds
 
+# Minimum seconds between two messages from the same live region, unless
+# overridden with LiveRegionManager.setRateLimit(). Updates which arrive
+# in between are combined into the next message.
+MSG_RATE_LIMIT = 0  # in seconds
+
+# The most updates of a live region which are combined into one message.
+# Older updates are dropped, so that a region which keeps changing does
+# not build up an ever longer message.
+MSG_COMBINE_LIMIT = 10
+
 # The number of messages that are cached and can later be reviewed via 
 # LiveRegionManager.reviewLiveAnnouncement.
 CACHE_SIZE = 9  # corresponds to one of nine key bindings
 
-class PriorityQueue:
-    """ This class represents a thread **UNSAFE** priority queue where priority
-    is determined by the given integer priority.  The entries are also   
-    maintained in chronological order. 
+class _Entry:
+    """A message in the PriorityQueue."""
+
+    def __init__(self, priority, sequence, timestamp, data, obj):
+        self.priority = priority
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.data = data
+        self.obj = obj
+        self.valid = True
 
-    TODO: experiment with Queue.Queue to make thread safe
+    def __lt__(self, other):
+        return (-self.priority, self.sequence) \
+            < (-other.priority, other.sequence)
+
+class PriorityQueue:
+    """ A thread-safe priority queue of live region messages. The highest
+    priority message comes out first and messages of the same priority in
+    chronological order. A message replaces the queued message of the
+    same priority from the same object: if combine is True, the queued
+    message instead gets the new content after its own, keeping its place
+    in the queue and its age, and at most MSG_COMBINE_LIMIT updates. Entries
+    which are replaced, purged or expired are dropped from the heap lazily,
+    so no operation needs to rebuild it.
     """
     def __init__(self):
-        self.queue = []
+        self._lock = threading.RLock()
+        self._rateLimits = {}
+        self._nextAllowed = {}
+        self.clear()
 
-    def enqueue(self, data, priority, obj):
+    def enqueue(self, data, priority, obj, combine=False):
         """ Add a new element to the queue according to 1) priority and
         2) timestamp. """
-        bisect.insort_left(self.queue, (priority, time.time(), data, obj))
-       
+        with self._lock:
+            queued = self._queued.setdefault(priority, {})
+            old = queued.get(obj)
+            if old and combine:
+                content = old.data['content'] + data['content']
+                old.data = {'content': content[-MSG_COMBINE_LIMIT:],
+                            'labels': data['labels']}
+                return
+
+            if old:
+                old.valid = False
+                self._count -= 1
+
+            self._sequence += 1
+            entry = _Entry(priority, self._sequence, time.time(), data, obj)
+            queued[obj] = entry
+            heapq.heappush(self._heap, entry)
+            self._arrivals.append(entry)
+            self._count += 1
+
     def dequeue(self):
-        """get the highest priority element from the queue.  """
-        return self.queue.pop(0)
+        """Get the highest priority element from the queue as a tuple of
+        (priority, timestamp, data, obj), or None if there is none which
+        the rate limit of its object allows to be presented yet."""
+        with self._lock:
+            now = time.time()
+            held = []
+            result = None
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                if not entry.valid:
+                    continue
+                if self._nextAllowed.get(entry.obj, 0) > now:
+                    held.append(entry)
+                    continue
+
+                self._remove(entry)
+                interval = self._rateLimits.get(entry.obj, MSG_RATE_LIMIT)
+                if interval > 0:
+                    self._nextAllowed[entry.obj] = now + interval
+                result = entry.priority, entry.timestamp, entry.data, entry.obj
+                break
+
+            for entry in held:
+                heapq.heappush(self._heap, entry)
+
+            self._compact()
+            return result
+
+    def _remove(self, entry):
+        entry.valid = False
+        self._count -= 1
+        queued = self._queued.get(entry.priority)
+        if queued and queued.get(entry.obj) is entry:
+            del queued[entry.obj]
+
+    def _compact(self):
+        # Dropped entries stay in the heap and the arrivals until popped;
+        # when nothing is left there is no need to pop them one by one.
+        if not self._count:
+            self._heap = []
+            self._arrivals.clear()
+            self._queued = {}
 
     def clear(self):
         """ Clear the queue """
-        self.queue = []
+        with self._lock:
+            self._heap = []
+            self._arrivals = collections.deque()
+            self._queued = {}
+            self._count = 0
+            self._sequence = 0
+
+    def setRateLimit(self, obj, interval):
+        """ Sets the minimum number of seconds between two messages from
+        obj. An interval of None restores MSG_RATE_LIMIT. """
+        with self._lock:
+            if interval is None:
+                self._rateLimits.pop(obj, None)
+            else:
+                self._rateLimits[obj] = interval
+            self._nextAllowed.pop(obj, None)
 
     def purgeByKeepAlive(self):
         """ Purge items from the queue that are older than the keepalive 
         time """
-        currenttime = time.time()
-        myfilter = lambda item: item[1] + MSG_KEEPALIVE_TIME > currenttime
-        self.queue = list(filter(myfilter, self.queue))
+        with self._lock:
+            oldest = time.time() - MSG_KEEPALIVE_TIME
+            while self._arrivals and self._arrivals[0].timestamp <= oldest:
+                entry = self._arrivals.popleft()
+                if entry.valid:
+                    self._remove(entry)
+
+            now = time.time()
+            for obj, nextAllowed in list(self._nextAllowed.items()):
+                if nextAllowed <= now:
+                    del self._nextAllowed[obj]
+
+            self._compact()
 
     def purgeByPriority(self, priority):
         """ Purge items from the queue that have a lower than or equal priority
         than the given argument """
-        myfilter = lambda item: item[0] > priority
-        self.queue = list(filter(myfilter, self.queue))
+        with self._lock:
+            for queuedPriority in list(self._queued.keys()):
+                if queuedPriority > priority:
+                    continue
+                for entry in self._queued.pop(queuedPriority).values():
+                    entry.valid = False
+                    self._count -= 1
+
+            self._compact()
 
     def __len__(self):
         """ Return the length of the queue """
-        return len(self.queue)
+        return self._count
 
 
 class LiveRegionManager:
@@ -216,7 +339,18 @@ class LiveRegionManager:
         if message:
             if len(self.msg_queue) == 0:
                 GLib.timeout_add(100, self.pumpMessages)
-            self.msg_queue.enqueue(message, politeness, event.source)
+            # An update to an atomic region presents the whole region, so it
+            # supersedes any queued message from it. Other updates are added
+            # to the queued message, so the user hears them all at once.
+            attrs = self._getAttrDictionary(event.source)
+            combine = attrs.get('container-atomic') != 'true'
+            self.msg_queue.enqueue(message, politeness, event.source, combine)
+
+    def setRateLimit(self, obj, interval):
+        """Sets the minimum number of seconds between two messages from the
+        live region obj. Updates in between are combined into the next
+        message. An interval of None restores the default."""
+        self.msg_queue.setRateLimit(obj, interval)
 
     def pumpMessages(self):
         """ Main gobject callback for live region support.  Handles both 
@@ -224,9 +358,10 @@ class LiveRegionManager:
         were queued up in the handleEvent() method.
         """
 
-        if len(self.msg_queue) > 0:
-            self.msg_queue.purgeByKeepAlive()
-            politeness, timestamp, message, obj = self.msg_queue.dequeue()
+        self.msg_queue.purgeByKeepAlive()
+        queued = self.msg_queue.dequeue()
+        if queued:
+            politeness, timestamp, message, obj = queued
             # Form output message.  No need to repeat labels and content.
             # TODO: really needs to be tested in real life cases.  Perhaps
             # a verbosity setting?
@@ -242,10 +377,6 @@ class LiveRegionManager:
             # cache our message
             self._cacheMessage(utts)
 
-        # We still want to maintain our queue if we are not monitoring
-        if not self.monitoring:
-            self.msg_queue.purgeByKeepAlive()
-
         # See you again soon, stay in event loop if we still have messages.
         if len(self.msg_queue) > 0:
             return True 
@@ -2218,22 +2218,48 @@ _all.update(_arrows)
 _all.update(_operators)
 _all.update(_shapes)
 _RE = None
-_RE_COMBINING = None
+
+def _getCharacterClass(chars):
+    """Returns a regular expression character class matching any of chars,
+    with runs of consecutive characters given as ranges: most of the math
+    symbols are outside the Basic Multilingual Plane, where each character
+    listed on its own would have to be compared in turn."""
+
+    ranges = []
+    for o in sorted(map(ord, chars)):
+        if ranges and ranges[-1][1] == o - 1:
+            ranges[-1][1] = o
+        else:
+            ranges.append([o, o])
+
+    members = []
+    for first, last in ranges:
+        if first == last:
+            members.append(re.escape(chr(first)))
+        else:
+            members.append("%s-%s" % (re.escape(chr(first)),
+                                      re.escape(chr(last))))
+
+    return "[%s]" % "".join(members)
 
 def __compileRE():
+    """Compiles the pattern which matches either a character followed by a
+    combining character, or a single math symbol."""
+
     global _RE
-    try:
-        _RE = re.compile('[%s]' % ''.join(list(_all.keys())), re.UNICODE)
-    except:
-        _RE = None
+    alternatives = []
+    if _combining:
+        alternatives.append('(?P<base>.)(?P<combining>%s)'
+                            % _getCharacterClass(_combining))
+    if _all:
+        alternatives.append('(?P<symbol>%s)' % _getCharacterClass(_all))
+    if not alternatives:
+        return
 
-def __compileRE_COMBINING():
-    global _RE_COMBINING
     try:
-        _RE_COMBINING = re.compile('.[%s]' % ''.join(list(_combining.keys())),
-                                   re.UNICODE)
+        _RE = re.compile('|'.join(alternatives), re.UNICODE)
     except:
-        _RE_COMBINING = None
+        _RE = None
 
 def _getStyleString(symbol):
     o = ord(symbol)
@@ -2294,22 +2320,22 @@ def adjustForSpeech(string):
     if _RE is None:
         __compileRE()
 
-    if _RE_COMBINING is None:
-        __compileRE_COMBINING()
-
-    if _RE_COMBINING is not None:
-        combiningPairs = set(re.findall(_RE_COMBINING, string))
-        for pair in combiningPairs:
-            name = _combining.get(pair[1])
-            if name:
-                string = re.sub(pair, " %s " % (name % pair[0]), string)
-
-    if _RE is not None:
-        chars = set(re.findall(_RE, string))
-        includeStyle = speakStyle == SPEAK_ALWAYS
-        for char in chars:
-            name = _getSpokenName(char, includeStyle)
-            if name:
-                string = re.sub(char, " %s " % name, string)
-
-    return string
+    if _RE is None:
+        return string
+
+    includeStyle = speakStyle == SPEAK_ALWAYS
+
+    def _adjustSymbol(symbol):
+        name = _getSpokenName(symbol, includeStyle)
+        if name:
+            return " %s " % name
+        return symbol
+
+    def _adjust(match):
+        if match.lastgroup == 'symbol':
+            return _adjustSymbol(match.group('symbol'))
+
+        name = _combining.get(match.group('combining'))
+        return " %s " % (name % _adjustSymbol(match.group('base')))
+
+    return _RE.sub(_adjust, string)
@@ -66,7 +66,10 @@ except:
 from . import braille
 from . import debug
 from . import event_manager
+from . import flat_review
 from . import keybindings
+from . import latency
+from . import lazy_import
 from . import logger
 from . import messages
 from . import notification_messages
@@ -75,6 +78,7 @@ from . import orca_platform
 from . import script_manager
 from . import settings
 from . import settings_manager
+from . import snapshot_cache
 from . import speech
 from .input_event import BrailleEvent
 from .input_event import KeyboardEvent
@@ -82,13 +86,12 @@ from .input_event import KeyboardEvent
 _eventManager = event_manager.getManager()
 _scriptManager = script_manager.getManager()
 _settingsManager = settings_manager.getManager()
+_snapshotCache = snapshot_cache.getCache()
 _logger = logger.getLogger()
 
-try:
-    # If we don't have an active desktop, we will get a RuntimeError.
-    from . import mouse_review
-except RuntimeError:
-    pass
+# Imported when mouse review is first turned on. If we don't have an
+# active desktop, we will get a RuntimeError then.
+mouse_review = lazy_import.LazyModule('orca.mouse_review')
 
 def onEnabledChanged(gsetting, key):
     try:
@@ -478,10 +481,11 @@ def loadUserSettings(script=None, inputEvent=None, skipReloadMessage=False):
 
     # I'm not sure where else this should go. But it doesn't really look
     # right here.
-    try:
-        mouse_review.mouse_reviewer.toggle(on=settings.enableMouseReview)
-    except NameError:
-        pass
+    if settings.enableMouseReview or mouse_review.isLoaded():
+        try:
+            mouse_review.mouse_reviewer.toggle(on=settings.enableMouseReview)
+        except RuntimeError:
+            pass
 
     global _orcaModifiers
     custom = [k for k in settings.orcaModifierKeys if k not in _orcaModifiers]
@@ -496,6 +500,7 @@ def loadUserSettings(script=None, inputEvent=None, skipReloadMessage=False):
 
     _scriptManager.activate()
     _eventManager.activate()
+    _snapshotCache.activate()
 
     debug.println(debug.LEVEL_FINEST, 'INFO: User Settings Loaded')
 
@@ -695,6 +700,9 @@ def shutdown(script=None, inputEvent=None):
 
     orca_state.activeScript.presentMessage(messages.STOP_ORCA)
 
+    flat_review.clearZoneCaches()
+    _settingsManager.flushSettings()
+    _snapshotCache.deactivate()
     _scriptManager.deactivate()
     _eventManager.deactivate()
 
@@ -768,6 +776,22 @@ def abortOnSignal(signum, frame):
                   % signum)
     die(signum)
 
+def saveLatencyStatsOnSignal(signum, frame):
+    # The current directory of an autostarted Orca is often one it cannot
+    # write to, so the statistics are saved with the user's settings.
+    #
+    try:
+        fileName = latency.dump(directory=_settingsManager.getPrefsDir())
+    except:
+        debug.println(debug.LEVEL_SEVERE,
+                      "Could not save latency statistics due to signal = %d" \
+                      % signum)
+        debug.printException(debug.LEVEL_SEVERE)
+    else:
+        debug.println(debug.LEVEL_SEVERE,
+                      "Latency statistics saved to %s due to signal = %d" \
+                      % (os.path.abspath(fileName), signum))
+
 def main(cacheValues=True):
     """The main entry point for Orca.  The exit codes for Orca will
     loosely be based on signals, where the exit code will be the
@@ -786,6 +810,7 @@ def main(cacheValues=True):
     signal.signal(signal.SIGTERM, shutdownOnSignal)
     signal.signal(signal.SIGQUIT, shutdownOnSignal)
     signal.signal(signal.SIGSEGV, abortOnSignal)
+    signal.signal(signal.SIGUSR1, saveLatencyStatsOnSignal)
 
     if not _settingsManager.isAccessibilityEnabled():
         _settingsManager.setAccessibility(True)
@@ -60,14 +60,41 @@ def setPronunciation(word, replacementString, pronunciations=None):
       into.
     """
 
+    global _generation
+
     key = word.lower()
     if pronunciations != None:
         pronunciations[key] = [ word, replacementString ]
     else:
         pronunciation_dict[key] = [ word, replacementString ]
+        _generation += 1
+
+def setDictionary(dictionary):
+    """Makes dictionary the pronunciation dictionary.
+
+    Arguments:
+    - dictionary: a dictionary where the keys are lowercase words and the
+      values are [word, replacementString] lists.
+    """
+
+    global pronunciation_dict, _generation
+
+    if dictionary is not pronunciation_dict:
+        pronunciation_dict = dictionary
+        _generation += 1
+
+def getGeneration():
+    """Returns a number which changes whenever pronunciation_dict is
+    replaced with setDictionary or an entry is set in it with
+    setPronunciation, so that text adjusted with the previous
+    pronunciations can be recognized."""
+
+    return _generation
 
 # pronunciation_dict is a dictionary where the keys are words and the
 # values represent word the pronunciation of that word (in other words,
 # what the word sounds like).
 #
 pronunciation_dict = {}
+
+_generation = 0
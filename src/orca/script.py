@@ -53,6 +53,7 @@ from . import script_manager
 from . import script_utilities
 from . import settings
 from . import settings_manager
+from . import source_snapshot
 from . import speech_generator
 from . import structural_navigation
 from . import where_am_I
@@ -331,7 +332,7 @@ class Script:
         """
 
         try:
-            role = event.source.getRole()
+            role = source_snapshot.getSnapshot(event).getRole()
         except (LookupError, RuntimeError):
             msg = 'script.processObjectEvent: Error getting role'
             debug.println(debug.LEVEL_FINE, msg)
@@ -405,13 +406,50 @@ class Script:
 
         if skip:
             debug.println(debug.LEVEL_FINE,
-                          "script.skipObjectEvent: skipped due to %s:" \
-                          % reason)
+                          "script.skipObjectEvent: skipped due to %s:", reason)
             debug.println(debug.LEVEL_FINE,
-                          "\tType: %s\n\tSource: %s\n\tDetail1: %s"
-                          % (cachedEvent.type, cachedEvent.source, cachedEvent.detail1))
+                          "\tType: %s\n\tSource: %s\n\tDetail1: %s",
+                          cachedEvent.type, cachedEvent.source, cachedEvent.detail1)
         return skip
 
+    def isCoalescableEvent(self, event, newerEvent):
+        """Gives us, and scripts, the ability to decide an event still
+        waiting in the event queue has been made obsolete by a newer one
+        and can be dropped before it is ever processed.
+
+        Arguments:
+        - event: the Event still waiting in the queue
+        - newerEvent: the Event about to be queued
+
+        Returns True if event can be replaced by newerEvent.
+        """
+
+        if event.type != newerEvent.type or event.source != newerEvent.source:
+            return False
+
+        # These are the events skipObjectEvent would skip anyway when a
+        # more recent one from the same object is waiting.
+        typing   = ["object:text-changed:insert", "object:text-changed:delete"]
+        arrowing = ["object:text-caret-moved", "object:text-selection-changed",
+                    "object:selection-changed", "object:active-descendant-changed"]
+
+        eType = event.type
+        if eType in typing or eType in arrowing or eType.endswith("system"):
+            return True
+
+        # Each state change is a transition which scripts may present, e.g.
+        # checked and then unchecked. Only repeats of the same one are
+        # redundant.
+        if eType.startswith("object:state-changed:"):
+            return event.detail1 == newerEvent.detail1
+
+        # Each children-changed event tells us about a different child.
+        # Only identical ones are redundant.
+        if eType.startswith("object:children-changed:"):
+            return event.any_data == newerEvent.any_data
+
+        return False
+
     def checkKeyboardEventData(self, keyboardEvent):
         """Checks the data on the keyboard event.
 
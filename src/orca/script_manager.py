@@ -24,10 +24,13 @@ __date__      = "$Date$"
 __copyright__ = "Copyright (c) 2011. Orca Team."
 __license__   = "LGPL"
 
+import collections
 import importlib
+from gi.repository import GLib
 
 from . import debug
 from . import orca_state
+from . import settings
 from .scripts import apps, toolkits
 
 class ScriptManager:
@@ -64,6 +67,24 @@ class ScriptManager:
              'vte':              'gnome-terminal',
              'gnome-terminal-server': 'gnome-terminal'}
 
+        # The module name for each lowercased application name. An
+        # alternative name takes precedence over an app module of the
+        # same name, and an app module over a toolkit module.
+        self._moduleNames = {}
+        for nameList in (self._toolkitModules, self._appModules):
+            for name in reversed(nameList):
+                self._moduleNames[name.lower()] = name
+        for name in reversed(list(self._appNames.keys())):
+            self._moduleNames[name.lower()] = self._appNames[name]
+
+        # The script to use for each (app, toolkit of object) pair, and the
+        # toolkit of recently seen objects. The toolkit of an object does
+        # not change, but asking for it is a round trip to the application.
+        self._resolvedScripts = {}
+        self._objectToolkits = collections.OrderedDict()
+        self._maxObjectToolkits = 1000
+        self._preloadId = 0
+
         self.setActiveScript(None, "__init__")
         debug.println(debug.LEVEL_FINEST, 'INFO: Script manager initialized')
 
@@ -74,6 +95,8 @@ class ScriptManager:
         self._defaultScript = self.getScript(None)
         self._defaultScript.registerEventListeners()
         self.setActiveScript(self._defaultScript, "activate")
+        if settings.preloadScripts and not self._preloadId:
+            self.preloadScripts()
         debug.println(debug.LEVEL_FINEST, 'INFO: Script manager activated')
 
     def deactivate(self):
@@ -86,6 +109,11 @@ class ScriptManager:
         self.setActiveScript(None, "deactivate")
         self.appScripts = {}
         self.toolkitScripts = {}
+        self._resolvedScripts = {}
+        self._objectToolkits.clear()
+        if self._preloadId:
+            GLib.source_remove(self._preloadId)
+            self._preloadId = 0
         debug.println(debug.LEVEL_FINEST, 'INFO: Script manager deactivated')
 
     def getModuleName(self, app):
@@ -104,17 +132,7 @@ class ScriptManager:
         # Many python apps have an accessible name which ends in '.py'.
         # Sometimes OOo has 'soffice.bin' as its name.
         name = app.name.split('.')[0]
-        altNames = list(self._appNames.keys())
-
-        names = [n for n in altNames if n.lower() == name.lower()]
-        if names:
-            name = self._appNames.get(names[0])
-        else:
-            for nameList in (self._appModules, self._toolkitModules):
-                names = [n for n in nameList if n.lower() == name.lower()]
-                if names:
-                    name = names[0]
-                    break
+        name = self._moduleNames.get(name.lower(), name)
 
         debug.println(debug.LEVEL_FINEST, "mapped %s to %s" % (app.name, name))
 
@@ -125,14 +143,26 @@ class ScriptManager:
 
         name = ''
         if obj:
+            try:
+                name = self._objectToolkits[obj]
+            except KeyError:
+                pass
+            else:
+                self._objectToolkits.move_to_end(obj)
+                return name
+
             try:
                 attributes = obj.getAttributes()
             except (LookupError, RuntimeError):
                 debug.println(debug.LEVEL_FINEST,
                               "_toolkitForObject: %s no longer exists" % obj)
-            else:
-                attrs = dict([attr.split(':', 1) for attr in attributes])
-                name = attrs.get('toolkit', '')
+                return name
+
+            attrs = dict([attr.split(':', 1) for attr in attributes])
+            name = attrs.get('toolkit', '')
+            self._objectToolkits[obj] = name
+            if len(self._objectToolkits) > self._maxObjectToolkits:
+                self._objectToolkits.popitem(last=False)
 
         return name
 
@@ -221,10 +251,24 @@ class ScriptManager:
         Returns an instance of a Script.
         """
 
+        objToolkit = self._toolkitForObject(obj)
+        script = self._resolvedScripts.get((app, objToolkit))
+        if script:
+            return script
+
+        script = self._resolveScript(app, obj, objToolkit)
+        if app in self.appScripts:
+            self._resolvedScripts[(app, objToolkit)] = script
+
+        return script
+
+    def _resolveScript(self, app, obj, objToolkit):
+        """Returns the script for objects of toolkit objToolkit in app,
+        creating the app script and the toolkit script if necessary."""
+
         appScript = None
         toolkitScript = None
 
-        objToolkit = self._toolkitForObject(obj)
         if objToolkit:
             toolkitScripts = self.toolkitScripts.get(app, {})
             toolkitScript = toolkitScripts.get(objToolkit)
@@ -255,6 +299,39 @@ class ScriptManager:
 
         return appScript
 
+    def preloadScripts(self):
+        """Creates the scripts for the applications which are already
+        running, one application at a time while Orca is idle, so that the
+        first event from each of them does not have to wait for its script
+        to be imported and created."""
+
+        from pyatspi import Registry
+
+        try:
+            apps = [app for app in Registry.getDesktop(0) if app]
+        except:
+            debug.printException(debug.LEVEL_FINEST)
+            return
+
+        def _preloadNext():
+            while apps:
+                app = apps.pop(0)
+                if app in self.appScripts:
+                    continue
+                try:
+                    self.getScript(app)
+                except:
+                    debug.printException(debug.LEVEL_FINEST)
+                else:
+                    debug.println(debug.LEVEL_FINE,
+                                  "Preloaded script for %s" % app)
+                return True
+
+            self._preloadId = 0
+            return False
+
+        self._preloadId = GLib.idle_add(_preloadNext)
+
     def setActiveScript(self, newScript, reason=None):
         """Set the new active script.
 
@@ -291,6 +368,12 @@ class ScriptManager:
 
         appList = list(self.appScripts.keys())
         appList = [a for a in appList if a != None and a not in desktop]
+        if appList:
+            self._resolvedScripts = \
+                {key: script for key, script in self._resolvedScripts.items()
+                 if key[0] not in appList}
+            self._objectToolkits.clear()
+
         for app in appList:
             appScript = self.appScripts.pop(app)
             del appScript
@@ -40,16 +40,20 @@ from . import debug
 from . import keynames
 from . import keybindings
 from . import input_event
+from . import lazy_import
 from . import mathsymbols
 from . import messages
-from . import mouse_review
 from . import orca
 from . import orca_state
 from . import object_properties
 from . import pronunciation_dict
+from . import punctuation_settings
 from . import settings
+from . import snapshot_cache
 from . import text_attribute_names
 
+mouse_review = lazy_import.LazyModule('orca.mouse_review')
+
 #############################################################################
 #                                                                           #
 # Utilities                                                                 #
@@ -70,6 +74,8 @@ class Utilities:
     WORDS_RE = re.compile("(\W+)", flags)
     SUPERSCRIPTS_RE = re.compile("[%s]+" % "".join(SUPERSCRIPT_DIGITS), flags)
     SUBSCRIPTS_RE = re.compile("[%s]+" % "".join(SUBSCRIPT_DIGITS), flags)
+    DIGITS_RE = re.compile("(%s)|(%s)" % (SUPERSCRIPTS_RE.pattern,
+                                          SUBSCRIPTS_RE.pattern), flags)
 
     # generatorCache
     #
@@ -137,23 +143,23 @@ class Utilities:
         if not isinstance(stopRoles, [].__class__):
             stopRoles = [stopRoles]
 
-        ancestor = None
+        cache = snapshot_cache.getCache()
+        try:
+            ancestors = cache.getAncestors(obj)
+        except:
+            return None
 
-        obj = obj.parent
-        while obj and (obj != obj.parent):
+        for ancestor in ancestors:
             try:
-                role = obj.getRole()
+                role = cache.getRole(ancestor)
             except:
                 break
             if role in ancestorRoles:
-                ancestor = obj
-                break
+                return ancestor
             elif role in stopRoles:
                 break
-            else:
-                obj = obj.parent
 
-        return ancestor
+        return None
 
     def cellIndex(self, obj):
         """Returns the index of the cell which should be used with the
@@ -261,25 +267,21 @@ class Utilities:
         if a == b:
             return a
 
+        cache = snapshot_cache.getCache()
+
         aParents = [a]
         try:
-            parent = a.parent
-            while parent and (parent.parent != parent):
-                aParents.append(parent)
-                parent = parent.parent
-            aParents.reverse()
+            aParents.extend(cache.getAncestors(a))
         except:
             debug.printException(debug.LEVEL_FINEST)
+        aParents.reverse()
 
         bParents = [b]
         try:
-            parent = b.parent
-            while parent and (parent.parent != parent):
-                bParents.append(parent)
-                parent = parent.parent
-            bParents.reverse()
+            bParents.extend(cache.getAncestors(b))
         except:
             debug.printException(debug.LEVEL_FINEST)
+        bParents.reverse()
 
         commonAncestor = None
 
@@ -1454,10 +1456,13 @@ class Utilities:
                        pyatspi.ROLE_FRAME,
                        pyatspi.ROLE_WINDOW]
 
-        while obj and obj.parent \
-              and not obj.getRole() in stopAtRoles \
-              and not obj.parent.getRole() == pyatspi.ROLE_APPLICATION:
-            obj = obj.parent
+        cache = snapshot_cache.getCache()
+        parent = cache.getParent(obj)
+        while obj and parent \
+              and not cache.getRole(obj) in stopAtRoles \
+              and not cache.getRole(parent) == pyatspi.ROLE_APPLICATION:
+            obj = parent
+            parent = cache.getParent(obj)
 
         return obj
 
@@ -2150,9 +2155,6 @@ class Utilities:
         adjusting for repeat character counts and punctuation.
         """
 
-        from . import punctuation_settings
-        from . import chnames
-
         style = settings.verbalizePunctuationStyle
         isPunctChar = True
         try:
@@ -2282,21 +2284,25 @@ class Utilities:
         if (len(line) < 4) or (settings.repeatCharacterLimit < 4):
             return line
 
-        newLine = ''
-        segment = lastChar = line[0]
-
-        multipleChars = False
-        for i in range(1, len(line)):
-            if line[i] == lastChar:
-                segment += line[i]
-            else:
-                multipleChars = True
-                newLine = self._addRepeatSegment(segment, newLine)
-                segment = line[i]
-
-            lastChar = line[i]
+        # Only runs at least as long as the limit can be replaced; the text
+        # between them is copied as is.
+        #
+        pattern = r"(.)\1{%d,}" % (settings.repeatCharacterLimit - 1)
+        segments = []
+        end = 0
+        for match in re.finditer(pattern, line, re.DOTALL):
+            segments.append(line[end:match.start()])
+            end = match.end()
+
+            # The punctuation level is ignored when the line consists of
+            # nothing but the repeated character.
+            #
+            multipleChars = match.start() > 0 or end < len(line)
+            segments.append(
+                self._addRepeatSegment(match.group(0), '', multipleChars))
+        segments.append(line[end:])
 
-        return self._addRepeatSegment(segment, newLine, multipleChars)
+        return ''.join(segments)
 
     def adjustForDigits(self, string):
         """Adjusts the string to convert digit-like text, such as subscript
@@ -2308,20 +2314,17 @@ class Utilities:
         Returns: a new string which contains actual digits.
         """
 
-        subscripted = set(re.findall(self.SUBSCRIPTS_RE, string))
-        superscripted = set(re.findall(self.SUPERSCRIPTS_RE, string))
+        def _convert(match):
+            superscripted, subscripted = match.groups()
+            if superscripted:
+                new = [str(self.SUPERSCRIPT_DIGITS.index(d))
+                       for d in superscripted]
+                return messages.DIGITS_SUPERSCRIPT % "".join(new)
 
-        for number in superscripted:
-            new = [str(self.SUPERSCRIPT_DIGITS.index(d)) for d in number]
-            newString = messages.DIGITS_SUPERSCRIPT % "".join(new)
-            string = re.sub(number, newString, string)
+            new = [str(self.SUBSCRIPT_DIGITS.index(d)) for d in subscripted]
+            return messages.DIGITS_SUBSCRIPT % "".join(new)
 
-        for number in subscripted:
-            new = [str(self.SUBSCRIPT_DIGITS.index(d)) for d in number]
-            newString = messages.DIGITS_SUBSCRIPT % "".join(new)
-            string = re.sub(number, newString, string)
-
-        return string
+        return self.DIGITS_RE.sub(_convert, string)
 
     @staticmethod
     def absoluteMouseCoordinates():
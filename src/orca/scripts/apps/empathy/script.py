@@ -103,6 +103,14 @@ class Script(gtk.Script):
 
         return gtk.Script.skipObjectEvent(self, event)
 
+    def isCoalescableEvent(self, event, newerEvent):
+        """Returns True if event can be replaced by newerEvent."""
+
+        if self.chat.isChatRoomMsg(newerEvent.source):
+            return False
+
+        return gtk.Script.isCoalescableEvent(self, event, newerEvent)
+
     def onTextInserted(self, event):
         """Called whenever text is added to an object."""
 
@@ -40,25 +40,29 @@ import orca.chnames as chnames
 import orca.cmdnames as cmdnames
 import orca.debug as debug
 import orca.eventsynthesizer as eventsynthesizer
-import orca.find as find
 import orca.flat_review as flat_review
 import orca.guilabels as guilabels
 import orca.input_event as input_event
 import orca.keybindings as keybindings
+import orca.latency as latency
+import orca.lazy_import as lazy_import
 import orca.messages as messages
 import orca.orca as orca
-import orca.orca_gui_commandlist as commandlist
 import orca.orca_state as orca_state
-import orca.phonnames as phonnames
-import orca.sound_utils as sound_utils
 import orca.script as script
 import orca.settings as settings
 import orca.settings_manager as settings_manager
+import orca.source_snapshot as source_snapshot
 import orca.speech as speech
 import orca.speechserver as speechserver
-import orca.mouse_review as mouse_review
 import orca.notification_messages as notification_messages
 
+commandlist = lazy_import.LazyModule('orca.orca_gui_commandlist')
+find = lazy_import.LazyModule('orca.find')
+mouse_review = lazy_import.LazyModule('orca.mouse_review')
+phonnames = lazy_import.LazyModule('orca.phonnames')
+sound_utils = lazy_import.LazyModule('orca.sound_utils')
+
 _settingsManager = settings_manager.getManager()
 
 ########################################################################
@@ -93,8 +97,7 @@ class Script(script.Script):
         self.windowActivateTime = None
         self.targetCursorCell = None
         
-        self.sound = sound_utils.SoundUtils()
-        self.sound.createSimpePipeline()
+        self._sound = None
 
         self.justEnteredFlatReviewMode = False
 
@@ -139,6 +142,8 @@ class Script(script.Script):
         self._inSayAll = False
         self._sayAllIsInterrupted = False
         self._sayAllContexts = []
+        self._sayAllIsGenerated = False
+        self._lastCompletedSayAllContext = None
 
         if app:
             app.setCacheMask(
@@ -466,6 +471,11 @@ class Script(script.Script):
                 Script.cycleDebugLevel,
                 cmdnames.CYCLE_DEBUG_LEVEL)
 
+        self.inputEventHandlers["saveLatencyStatsHandler"] = \
+            input_event.InputEventHandler(
+                Script.saveLatencyStats,
+                cmdnames.SAVE_LATENCY_STATS)
+
         self.inputEventHandlers["goToPrevBookmark"] = \
             input_event.InputEventHandler(
                 Script.goToPrevBookmark,
@@ -493,7 +503,7 @@ class Script(script.Script):
 
         self.inputEventHandlers["toggleMouseReviewHandler"] = \
             input_event.InputEventHandler(
-                mouse_review.toggle,
+                Script.toggleMouseReview,
                 cmdnames.MOUSE_REVIEW_TOGGLE)
 
         self.inputEventHandlers["presentTimeHandler"] = \
@@ -2040,6 +2050,20 @@ class Script(script.Script):
 
         return True
 
+    def saveLatencyStats(self, inputEvent=None):
+        try:
+            fileName = latency.dump(directory=_settingsManager.getPrefsDir())
+        except:
+            debug.printException(debug.LEVEL_WARNING)
+            self.presentMessage("Could not save latency statistics.")
+        else:
+            debug.println(debug.LEVEL_INFO,
+                          "Latency statistics saved to %s" % fileName)
+            self.presentMessage("Latency statistics saved to %s." % fileName,
+                                "Latency statistics saved.")
+
+        return True
+
     ########################################################################
     #                                                                      #
     # AT-SPI OBJECT EVENT HANDLERS                                         #
@@ -2067,7 +2091,8 @@ class Script(script.Script):
         if not event.any_data:
             return
 
-        if not event.source.getState().contains(pyatspi.STATE_FOCUSED) \
+        snapshot = source_snapshot.getSnapshot(event)
+        if not snapshot.getState().contains(pyatspi.STATE_FOCUSED) \
            and not event.any_data.getState().contains(pyatspi.STATE_FOCUSED):
             return
 
@@ -2139,9 +2164,10 @@ class Script(script.Script):
             role = None
         if role in [pyatspi.ROLE_FRAME, pyatspi.ROLE_DIALOG]:
             frameApp = orca_state.locusOfFocus.getApplication()
-            eventApp = event.source.getApplication()
+            snapshot = source_snapshot.getSnapshot(event)
+            eventApp = snapshot.getApplication()
             if frameApp == eventApp \
-               and event.source.getState().contains(pyatspi.STATE_FOCUSED):
+               and snapshot.getState().contains(pyatspi.STATE_FOCUSED):
                 orca.setLocusOfFocus(event, event.source, False)
 
         # Ignore caret movements from non-focused objects, unless the
@@ -2446,6 +2472,8 @@ class Script(script.Script):
         - event: the Event
         """
 
+        braille.invalidateAttributeMasks()
+
         verbosity = _settingsManager.getSetting('speechVerbosityLevel')
         if verbosity == settings.VERBOSITY_LEVEL_VERBOSE \
            and self.utilities.isSameObject(
@@ -2487,7 +2515,7 @@ class Script(script.Script):
         # We'll also ignore sliders because we get their output via
         # their values changing.
         #
-        if event.source.getRole() == pyatspi.ROLE_SLIDER:
+        if source_snapshot.getSnapshot(event).getRole() == pyatspi.ROLE_SLIDER:
             return
 
         # [[[NOTE: WDW - if we handle events synchronously, we'll
@@ -2568,11 +2596,12 @@ class Script(script.Script):
                        pyatspi.ROLE_MENU_ITEM,
                        pyatspi.ROLE_SLIDER,
                        pyatspi.ROLE_SPIN_BUTTON]
-        role = event.source.getRole()
+        snapshot = source_snapshot.getSnapshot(event)
+        role = snapshot.getRole()
         if role in ignoreRoles:
             return
 
-        state = event.source.getState()            
+        state = snapshot.getState()
         if role == pyatspi.ROLE_TABLE_CELL \
            and not state.contains(pyatspi.STATE_FOCUSED) \
            and not state.contains(pyatspi.STATE_SELECTED):
@@ -2856,7 +2885,7 @@ class Script(script.Script):
         #
         if orca_state.locusOfFocus and \
           (orca_state.locusOfFocus.getApplication() == \
-             event.source.getApplication()):
+             source_snapshot.getSnapshot(event).getApplication()):
             speech.stop()
 
             # Clear the braille display just in case we are about to give
@@ -2954,6 +2983,40 @@ class Script(script.Script):
             else:
                 self.sayCharacter(obj)
 
+    def _resetSayAllContexts(self):
+        """Called by textLines when it starts. The contexts are kept when
+        the new say all is the result of rewinding or fast-forwarding the
+        last one, so that it is possible to rewind further. Otherwise they
+        are discarded here rather than when textLines runs out: utterances
+        may still be queued to the speech server at that point (see
+        settings.sayAllLookahead) and the user could rewind from them."""
+
+        if not self._sayAllIsInterrupted:
+            self._sayAllContexts = []
+        self._sayAllIsInterrupted = False
+        self._sayAllIsGenerated = False
+        self._lastCompletedSayAllContext = None
+
+    def _endSayAllGeneration(self):
+        """Called by textLines when it has produced its last context. The
+        say all is only over once that context has been spoken, which may
+        be after this (see settings.sayAllLookahead) or, if the speech
+        server asks for the next context as each one is completed, before."""
+
+        self._sayAllIsGenerated = True
+        if not self._sayAllContexts \
+           or self._sayAllContexts[-1] is self._lastCompletedSayAllContext:
+            self._inSayAll = False
+
+    def _sayAllContextCompleted(self, context):
+        """Called by the say all progress callbacks when context has been
+        spoken. Ends the say all if it was the last one."""
+
+        self._lastCompletedSayAllContext = context
+        if self._sayAllIsGenerated and self._sayAllContexts \
+           and self._sayAllContexts[-1] is context:
+            self._inSayAll = False
+
     def _rewindSayAll(self, context, minCharCount=10):
         if not _settingsManager.getSetting('rewindAndFastForwardInSayAll'):
             return False
@@ -2997,6 +3060,9 @@ class Script(script.Script):
         # the visual progress of what is being spoken as well as
         # positioning the cursor when speech has stopped.]]]
         #
+        if progressType == speechserver.SayAllContext.COMPLETED:
+            self._sayAllContextCompleted(context)
+
         try:
             text = context.obj.queryText()
             char = text.getText(context.currentOffset, context.currentOffset+1)
@@ -3547,7 +3613,11 @@ class Script(script.Script):
         return True
 
     def getFlatReviewContext(self):
-        """Returns the flat review context, creating one if necessary."""
+        """Returns the flat review context, creating one if necessary,
+        and bringing it up to date if the window has changed."""
+
+        if self.flatReviewContext and self.flatReviewContext.isStale():
+            self.flatReviewContext.refresh()
 
         if not self.flatReviewContext:
             self.flatReviewContext = self.flatReviewContextClass(self)
@@ -3725,7 +3795,7 @@ class Script(script.Script):
         spoken and acss is an ACSS instance for speaking the text.
         """
 
-        self._sayAllIsInterrupted = False
+        self._resetSayAllContexts()
         try:
             text = obj.queryText()
         except:
@@ -3823,8 +3893,7 @@ class Script(script.Script):
             if not moreLines:
                 done = True
 
-        self._inSayAll = False
-        self._sayAllContexts = []
+        self._endSayAllGeneration()
 
     def getTextLineAtCaret(self, obj, offset=None, startOffset=None, endOffset=None):
         """To-be-removed. Returns the string, caretOffset, startOffset."""
@@ -4564,6 +4633,21 @@ class Script(script.Script):
         speech.speak(messages.UNICODE % \
                          self.utilities.unicodeValueString(character))
 
+    @property
+    def sound(self):
+        """The sound utilities used to beep progress bar updates, created
+        the first time they are needed."""
+
+        if self._sound is None:
+            self._sound = sound_utils.SoundUtils()
+            self._sound.createSimpePipeline()
+        return self._sound
+
+    def toggleMouseReview(self, inputEvent=None):
+        """Toggles mouse review on or off."""
+
+        return mouse_review.toggle(self, inputEvent)
+
     def presentTime(self, inputEvent):
         """ Presents the current time. """
         timeFormat = _settingsManager.getSetting('presentTimeFormat')
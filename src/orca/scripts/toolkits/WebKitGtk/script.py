@@ -506,7 +506,7 @@ class Script(default.Script):
         spoken and acss is an ACSS instance for speaking the text.
         """
 
-        self._sayAllIsInterrupted = False
+        self._resetSayAllContexts()
         self._inSayAll = False
         if not obj:
             return
@@ -547,13 +547,15 @@ class Script(default.Script):
 
             offset = 0
 
-        self._inSayAll = False
-        self._sayAllContexts = []
+        self._endSayAllGeneration()
 
     def __sayAllProgressCallback(self, context, progressType):
         if progressType == speechserver.SayAllContext.PROGRESS:
             return
 
+        if progressType == speechserver.SayAllContext.COMPLETED:
+            self._sayAllContextCompleted(context)
+
         obj = context.obj
         orca.setLocusOfFocus(None, obj, notifyScript=False)
 
@@ -65,7 +65,7 @@ class Script(default.Script):
     def __init__(self, app):
         super().__init__(app)
 
-        self._sayAllContents = []
+        self._sayAllContents = {}
         self._inSayAll = False
         self._sayAllIsInterrupted = False
         self._loadingDocumentContent = False
@@ -100,10 +100,17 @@ class Script(default.Script):
         self._autoFocusModeCaretNavCheckButton = None
         self._layoutModeCheckButton = None
 
+    def activate(self):
+        """Called when this script is activated."""
+
+        default.Script.activate(self)
+        self.utilities.registerCaretOrderListeners()
+
     def deactivate(self):
         """Called when this script is deactivated."""
 
-        self._sayAllContents = []
+        self.utilities.deregisterCaretOrderListeners()
+        self._sayAllContents = {}
         self._inSayAll = False
         self._sayAllIsInterrupted = False
         self._loadingDocumentContent = False
@@ -502,7 +509,8 @@ class Script(default.Script):
             super().textLines(obj, offset)
             return
 
-        self._sayAllIsInterrupted = False
+        self._resetSayAllContexts()
+        self._sayAllContents = {}
 
         sayAllStyle = _settingsManager.getSetting('sayAllStyle')
         sayAllBySentence = sayAllStyle == settings.SAYALL_STYLE_SENTENCE
@@ -518,7 +526,6 @@ class Script(default.Script):
                 contents = self.utilities.getSentenceContentsAtOffset(obj, characterOffset)
             else:
                 contents = self.utilities.getLineContentsAtOffset(obj, characterOffset)
-            self._sayAllContents = contents
             for content in contents:
                 obj, startOffset, endOffset, text = content
                 utterances = self.speechGenerator.generateContents([content], eliminatePauses=True)
@@ -536,6 +543,7 @@ class Script(default.Script):
                     context = speechserver.SayAllContext(
                         obj, element, startOffset, endOffset)
                     self._sayAllContexts.append(context)
+                    self._sayAllContents[context] = contents
                     yield [context, voices[i]]
 
             lastObj, lastOffset = contents[-1][0], contents[-1][2]
@@ -545,9 +553,7 @@ class Script(default.Script):
 
             done = (obj == None)
 
-        self._inSayAll = False
-        self._sayAllContents = []
-        self._sayAllContexts = []
+        self._endSayAllGeneration()
 
     def presentFindResults(self, obj, offset):
         """Updates the context and presents the find results if appropriate."""
@@ -601,7 +607,7 @@ class Script(default.Script):
         if not _settingsManager.getSetting('rewindAndFastForwardInSayAll'):
             return False
 
-        obj, start, end, string = self._sayAllContents[0]
+        obj, start, end, string = self._sayAllContents[context][0]
         orca.setLocusOfFocus(None, obj, notifyScript=False)
         self.utilities.setCaretContext(obj, start)
 
@@ -616,7 +622,7 @@ class Script(default.Script):
         if not _settingsManager.getSetting('rewindAndFastForwardInSayAll'):
             return False
 
-        obj, start, end, string = self._sayAllContents[-1]
+        obj, start, end, string = self._sayAllContents[context][-1]
         orca.setLocusOfFocus(None, obj, notifyScript=False)
         self.utilities.setCaretContext(obj, end)
 
@@ -642,10 +648,13 @@ class Script(default.Script):
                     self.updateBraille(context.obj)
 
             self._inSayAll = False
-            self._sayAllContents = []
+            self._sayAllContents = {}
             self._sayAllContexts = []
             return
 
+        if progressType == speechserver.SayAllContext.COMPLETED:
+            self._sayAllContextCompleted(context)
+
         orca.setLocusOfFocus(None, context.obj, notifyScript=False)
         self.utilities.setCaretContext(context.obj, context.currentOffset)
 
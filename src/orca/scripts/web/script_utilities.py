@@ -25,20 +25,29 @@ __copyright__ = "Copyright (c) 2010 Joanmarie Diggs." \
                 "Copyright (c) 2014-2015 Igalia, S.L."
 __license__   = "LGPL"
 
+from gi.repository import GLib
 import pyatspi
 import re
 import urllib
 
 from orca import debug
+from orca import event_manager
 from orca import input_event
 from orca import orca
 from orca import orca_state
 from orca import script_utilities
 from orca import settings
 from orca import settings_manager
+from orca import snapshot_cache
 
+_eventManager = event_manager.getManager()
 _settingsManager = settings_manager.getManager()
 
+# The number of lines before and after the caret kept in the line cache.
+# That many lines are prefetched in the direction the user is moving.
+#
+LINE_CACHE_RADIUS = 5
+
 
 class Utilities(script_utilities.Utilities):
 
@@ -68,11 +77,20 @@ class Utilities(script_utilities.Utilities):
         self._text = {}
         self._tag = {}
         self._treatAsDiv = {}
+        self._caretOrderInfo = {}
+        self._caretOrderListening = False
+        self._caretOrderListeners = {
+            "object:text-changed": self._onCaretOrderChanged,
+            "object:children-changed": self._onCaretOrderChanged,
+        }
         self._currentObjectContents = None
         self._currentSentenceContents = None
         self._currentLineContents = None
         self._currentWordContents = None
         self._currentCharacterContents = None
+        self._lineCache = []
+        self._linePrefetch = None
+        self._linePrefetchId = None
 
     def _cleanupContexts(self):
         toRemove = []
@@ -105,8 +123,80 @@ class Utilities(script_utilities.Utilities):
         self._inferredLabels = {}
         self._tag = {}
         self._treatAsDiv = {}
+        self._caretOrderInfo = {}
         self._cleanupContexts()
 
+    def registerCaretOrderListeners(self):
+        """Starts listening for the events which change the caret order
+        information of objects. The listeners are registered directly with
+        the registry so that events the event manager ignores (e.g. for
+        embedded object characters and removed children) are not missed."""
+
+        if not self._caretOrderListening:
+            _eventManager.registerModuleListeners(self._caretOrderListeners)
+            self._caretOrderListening = True
+
+    def deregisterCaretOrderListeners(self):
+        if self._caretOrderListening:
+            _eventManager.deregisterModuleListeners(self._caretOrderListeners)
+            self._caretOrderListening = False
+        self._caretOrderInfo = {}
+
+        # Without the listeners, prefetched lines would not be kept current.
+        self._scheduleLinePrefetch(None, True)
+        self._lineCache = []
+
+    def _onCaretOrderChanged(self, event):
+        self._caretOrderInfo.pop(hash(event.source), None)
+
+        # Any change to the document might change how it is laid out.
+        if self._lineCache and event.host_application == self._script.app:
+            self._lineCache = []
+
+    def _getCaretOrderInfo(self, obj, text):
+        """Returns the text of obj and a dictionary of offset -> index of
+        the child at that offset, obtained once and kept until the text or
+        children of obj change."""
+
+        rv = self._caretOrderInfo.get(hash(obj))
+        if rv is not None:
+            return rv
+
+        allText = text.getText(0, -1)
+        children = {}
+        try:
+            hypertext = obj.queryHypertext()
+            for i in range(hypertext.getNLinks()):
+                link = hypertext.getLink(i)
+                for offset in range(link.startIndex, link.endIndex):
+                    children[offset] = i
+        except NotImplementedError:
+            msg = "WEB: %s does not implement the hypertext interface"
+            debug.println(debug.LEVEL_INFO, msg, obj)
+        except:
+            msg = "WEB: Exception getting hyperlinks of %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
+            return allText, None
+
+        rv = allText, children
+        self._caretOrderInfo[hash(obj)] = rv
+        return rv
+
+    def _getCaretOrderChild(self, obj, children, offset):
+        if children is None:
+            return self.getChildAtOffset(obj, offset)
+
+        index = children.get(offset, -1)
+        if index == -1:
+            return None
+
+        try:
+            child = obj[index]
+        except:
+            return None
+
+        return child
+
     def clearContentCache(self):
         self._currentObjectContents = None
         self._currentSentenceContents = None
@@ -115,6 +205,65 @@ class Utilities(script_utilities.Utilities):
         self._currentCharacterContents = None
         self._currentAttrs = {}
         self._text = {}
+        self._lineCache = []
+
+    def _getCachedLine(self, obj, offset, layoutMode):
+        for i, (lineLayoutMode, contents) in enumerate(self._lineCache):
+            if lineLayoutMode == layoutMode \
+               and self.findObjectInContents(obj, offset, contents) != -1:
+                self._lineCache.append(self._lineCache.pop(i))
+                return contents
+
+        return None
+
+    def _cacheLine(self, contents, layoutMode):
+        self._lineCache.append((layoutMode, contents))
+        while len(self._lineCache) > 2 * LINE_CACHE_RADIUS + 1:
+            self._lineCache.pop(0)
+
+    def _scheduleLinePrefetch(self, contents, isNext):
+        """Arranges for the LINE_CACHE_RADIUS lines after (or before) the
+        line contents to be put in the line cache when we are idle."""
+
+        if self._linePrefetchId:
+            GLib.source_remove(self._linePrefetchId)
+            self._linePrefetchId = None
+
+        if not contents:
+            return
+
+        self._linePrefetch = contents, isNext, LINE_CACHE_RADIUS
+        self._linePrefetchId = GLib.idle_add(
+            self._prefetchLine, priority=GLib.PRIORITY_LOW)
+
+    def _prefetchLine(self):
+        """Puts the next line to be prefetched in the line cache. Returns
+        True if there are more to prefetch."""
+
+        contents, isNext, remaining = self._linePrefetch
+        obj, offset = contents[0][0], contents[0][1]
+
+        # Prefetching should not change what the current line is.
+        currentLineContents = self._currentLineContents
+        try:
+            if isNext:
+                line = self.getNextLineContents(obj, offset, prefetch=False)
+            else:
+                line = self.getPreviousLineContents(obj, offset, prefetch=False)
+        except:
+            debug.printException(debug.LEVEL_INFO)
+            line = []
+        finally:
+            self._currentLineContents = currentLineContents
+
+        remaining -= 1
+        if not line or not remaining or line == contents:
+            self._linePrefetch = None
+            self._linePrefetchId = None
+            return False
+
+        self._linePrefetch = line, isNext, remaining
+        return True
 
     def inDocumentContent(self, obj=None):
         if not obj:
@@ -139,8 +288,8 @@ class Utilities(script_utilities.Utilities):
             try:
                 return x and x.getRole() in roles
             except:
-                msg = "WEB: Exception getting role for %s" % x
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: Exception getting role for %s"
+                debug.println(debug.LEVEL_INFO, msg, x)
                 return False
 
         if isDocument(obj):
@@ -169,8 +318,8 @@ class Utilities(script_utilities.Utilities):
         try:
             windows = [child for child in self._script.app]
         except:
-            msg = "WEB: Exception getting children for app %s" % self._script.app
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting children for app %s"
+            debug.println(debug.LEVEL_INFO, msg, self._script.app)
             windows = []
 
         if orca_state.activeWindow in windows:
@@ -204,8 +353,8 @@ class Utilities(script_utilities.Utilities):
         try:
             state = obj.getState()
         except:
-            msg = "WEB: Exception getting state for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting state for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return
 
         orca.setLocusOfFocus(None, obj, notifyScript=False)
@@ -213,12 +362,12 @@ class Utilities(script_utilities.Utilities):
             try:
                 obj.queryComponent().grabFocus()
             except NotImplementedError:
-                msg = "WEB: %s does not implement the component interface" % obj
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: %s does not implement the component interface"
+                debug.println(debug.LEVEL_INFO, msg, obj)
                 return
             except:
-                msg = "WEB: Exception grabbing focus on %s" % obj
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: Exception grabbing focus on %s"
+                debug.println(debug.LEVEL_INFO, msg, obj)
                 return
 
         text = self.queryNonEmptyText(obj)
@@ -474,8 +623,8 @@ class Utilities(script_utilities.Utilities):
         except NotImplementedError:
             pass
         except:
-            msg = "WEB: Exception getting range extents for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting range extents for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return [0, 0, 0, 0]
 
         role = obj.getRole()
@@ -485,23 +634,23 @@ class Utilities(script_utilities.Utilities):
             try:
                 ext = obj.parent.queryComponent().getExtents(0)
             except NotImplementedError:
-                msg = "WEB: %s does not implement the component interface" % obj.parent
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: %s does not implement the component interface"
+                debug.println(debug.LEVEL_INFO, msg, obj.parent)
                 return [0, 0, 0, 0]
             except:
-                msg = "WEB: Exception getting extents for %s" % obj.parent
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: Exception getting extents for %s"
+                debug.println(debug.LEVEL_INFO, msg, obj.parent)
                 return [0, 0, 0, 0]
         else:
             try:
                 ext = obj.queryComponent().getExtents(0)
             except NotImplementedError:
-                msg = "WEB: %s does not implement the component interface" % obj
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: %s does not implement the component interface"
+                debug.println(debug.LEVEL_INFO, msg, obj)
                 return [0, 0, 0, 0]
             except:
-                msg = "WEB: Exception getting extents for %s" % obj
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: Exception getting extents for %s"
+                debug.println(debug.LEVEL_INFO, msg, obj)
                 return [0, 0, 0, 0]
 
         return [ext.x, ext.y, ext.width, ext.height]
@@ -695,32 +844,31 @@ class Utilities(script_utilities.Utilities):
     def _getTextAtOffset(self, obj, offset, boundary):
         if not obj:
             msg = "WEB: Results for text at offset %i for %s using %s:\n" \
-                  "     String: '', Start: 0, End: 0. (obj is None)" % (offset, obj, boundary)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "     String: '', Start: 0, End: 0. (obj is None)"
+            debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary)
             return '', 0, 0
 
         text = self.queryNonEmptyText(obj)
         if not text:
             msg = "WEB: Results for text at offset %i for %s using %s:\n" \
-                  "     String: '', Start: 0, End: 1. (queryNonEmptyText() returned None)" \
-                  % (offset, obj, boundary)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "     String: '', Start: 0, End: 1. (queryNonEmptyText() returned None)"
+            debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary)
             return '', 0, 1
 
         if boundary == pyatspi.TEXT_BOUNDARY_CHAR:
             string, start, end = text.getText(offset, offset + 1), offset, offset + 1
             s = string.replace(self.EMBEDDED_OBJECT_CHARACTER, "[OBJ]").replace("\n", "\\n")
             msg = "WEB: Results for text at offset %i for %s using %s:\n" \
-                  "     String: '%s', Start: %i, End: %i." % (offset, obj, boundary, s, start, end)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "     String: '%s', Start: %i, End: %i."
+            debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary, s, start, end)
             return string, start, end
 
         if not boundary:
             string, start, end = text.getText(offset, -1), offset, text.characterCount
             s = string.replace(self.EMBEDDED_OBJECT_CHARACTER, "[OBJ]").replace("\n", "\\n")
             msg = "WEB: Results for text at offset %i for %s using %s:\n" \
-                  "     String: '%s', Start: %i, End: %i." % (offset, obj, boundary, s, start, end)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "     String: '%s', Start: %i, End: %i."
+            debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary, s, start, end)
             return string, start, end
 
         if boundary == pyatspi.TEXT_BOUNDARY_SENTENCE_START \
@@ -731,8 +879,8 @@ class Utilities(script_utilities.Utilities):
                 string, start, end = allText, 0, text.characterCount
                 s = string.replace(self.EMBEDDED_OBJECT_CHARACTER, "[OBJ]").replace("\n", "\\n")
                 msg = "WEB: Results for text at offset %i for %s using %s:\n" \
-                      "     String: '%s', Start: %i, End: %i." % (offset, obj, boundary, s, start, end)
-                debug.println(debug.LEVEL_INFO, msg)
+                      "     String: '%s', Start: %i, End: %i."
+                debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary, s, start, end)
                 return string, start, end
 
         offset = max(0, offset)
@@ -743,8 +891,8 @@ class Utilities(script_utilities.Utilities):
             s = string.replace(self.EMBEDDED_OBJECT_CHARACTER, "[OBJ]").replace("\n", "\\n")
             msg = "WEB: Results for text at offset %i for %s using %s:\n" \
                   "     String: '%s', Start: %i, End: %i.\n" \
-                  "     Not checking for broken text." % (offset, obj, boundary, s, start, end)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "     Not checking for broken text."
+            debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary, s, start, end)
             return string, start, end
 
         needSadHack = False
@@ -756,9 +904,9 @@ class Utilities(script_utilities.Utilities):
                   "      For offset %i - String: '%s', Start: %i, End: %i.\n" \
                   "      For offset %i - String: '%s', Start: %i, End: %i.\n" \
                   "      The bug is the above results should be the same.\n" \
-                  "      This very likely needs to be fixed by the toolkit." \
-                  % (obj, boundary, offset, s1, start, end, start, s2, testStart, testEnd)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "      This very likely needs to be fixed by the toolkit."
+            debug.println(debug.LEVEL_INFO, msg, obj, boundary, offset, s1, start, end,
+                          start, s2, testStart, testEnd)
             needSadHack = True
         elif not string and 0 <= offset < text.characterCount:
             s1 = string.replace(self.EMBEDDED_OBJECT_CHARACTER, "[OBJ]").replace("\n", "\\n")
@@ -767,32 +915,31 @@ class Utilities(script_utilities.Utilities):
                   "      String: '%s', Start: %i, End: %i.\n" \
                   "      The bug is no text reported for a valid offset.\n" \
                   "      Character count: %i, Full text: '%s'.\n" \
-                  "      This very likely needs to be fixed by the toolkit." \
-                  % (offset, obj, boundary, s1, start, end, text.characterCount, s2)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "      This very likely needs to be fixed by the toolkit."
+            debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary, s1, start, end,
+                          text.characterCount, s2)
             needSadHack = True
         elif not (start <= offset < end):
             s1 = string.replace(self.EMBEDDED_OBJECT_CHARACTER, "[OBJ]").replace("\n", "\\n")
             msg = "FAIL: Bad results for text at offset %i for %s using %s:\n" \
                   "      String: '%s', Start: %i, End: %i.\n" \
                   "      The bug is the range returned is outside of the offset.\n" \
-                  "      This very likely needs to be fixed by the toolkit." \
-                  % (offset, obj, boundary, s1, start, end)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "      This very likely needs to be fixed by the toolkit."
+            debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary, s1, start, end)
             needSadHack = True
 
         if needSadHack:
             sadString, sadStart, sadEnd = self.__findRange(text, offset, start, end, boundary)
             s = sadString.replace(self.EMBEDDED_OBJECT_CHARACTER, "[OBJ]").replace("\n", "\\n")
             msg = "HACK: Attempting to recover from above failure.\n" \
-                  "      String: '%s', Start: %i, End: %i." % (s, sadStart, sadEnd)
-            debug.println(debug.LEVEL_INFO, msg)
+                  "      String: '%s', Start: %i, End: %i."
+            debug.println(debug.LEVEL_INFO, msg, s, sadStart, sadEnd)
             return sadString, sadStart, sadEnd
 
         s = string.replace(self.EMBEDDED_OBJECT_CHARACTER, "[OBJ]").replace("\n", "\\n")
         msg = "WEB: Results for text at offset %i for %s using %s:\n" \
-              "     String: '%s', Start: %i, End: %i." % (offset, obj, boundary, s, start, end)
-        debug.println(debug.LEVEL_INFO, msg)
+              "     String: '%s', Start: %i, End: %i."
+        debug.println(debug.LEVEL_INFO, msg, offset, obj, boundary, s, start, end)
         return string, start, end
 
     def _getContentsForObj(self, obj, offset, boundary):
@@ -1067,6 +1214,12 @@ class Utilities(script_utilities.Utilities):
         if layoutMode == None:
             layoutMode = _settingsManager.getSetting('layoutMode')
 
+        if useCache:
+            objects = self._getCachedLine(obj, offset, layoutMode)
+            if objects:
+                self._currentLineContents = objects
+                return objects
+
         objects = []
         extents = self.getExtents(obj, offset, offset + 1)
 
@@ -1090,6 +1243,7 @@ class Utilities(script_utilities.Utilities):
         if not layoutMode:
             if useCache:
                 self._currentLineContents = objects
+                self._cacheLine(objects, layoutMode)
             return objects
 
         firstObj, firstStart, firstEnd, firstString = objects[0]
@@ -1135,63 +1289,69 @@ class Utilities(script_utilities.Utilities):
 
         if useCache:
             self._currentLineContents = objects
+            self._cacheLine(objects, layoutMode)
 
         return objects
 
-    def getPreviousLineContents(self, obj=None, offset=-1, layoutMode=None, useCache=True):
+    def getPreviousLineContents(self, obj=None, offset=-1, layoutMode=None, useCache=True,
+                                prefetch=True):
         if obj is None:
             obj, offset = self.getCaretContext()
 
-        msg = "WEB: Current context is: %s, %i" % (obj, offset)
-        debug.println(debug.LEVEL_INFO, msg)
+        msg = "WEB: Current context is: %s, %i"
+        debug.println(debug.LEVEL_INFO, msg, obj, offset)
 
         if obj and self.isZombie(obj):
-            msg = "WEB: Current context obj %s is zombie" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Current context obj %s is zombie"
+            debug.println(debug.LEVEL_INFO, msg, obj)
 
         line = self.getLineContentsAtOffset(obj, offset, layoutMode, useCache)
-        msg = "WEB: Line contents for %s, %i: %s" % (obj, offset, line)
-        debug.println(debug.LEVEL_INFO, msg)
+        msg = "WEB: Line contents for %s, %i: %s"
+        debug.println(debug.LEVEL_INFO, msg, obj, offset, line)
 
         if not (line and line[0]):
             return []
 
         firstObj, firstOffset = line[0][0], line[0][1]
-        msg = "WEB: First context on line is: %s, %i" % (firstObj, firstOffset)
-        debug.println(debug.LEVEL_INFO, msg)
+        msg = "WEB: First context on line is: %s, %i"
+        debug.println(debug.LEVEL_INFO, msg, firstObj, firstOffset)
 
         obj, offset = self.previousContext(firstObj, firstOffset, True)
         if not obj and firstObj:
-            msg = "WEB: Previous context is: %s, %i. Trying again." % (obj, offset)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Previous context is: %s, %i. Trying again."
+            debug.println(debug.LEVEL_INFO, msg, obj, offset)
             self.clearCachedObjects()
             obj, offset = self.previousContext(firstObj, firstOffset, True)
 
-        msg = "WEB: Previous context is: %s, %i" % (obj, offset)
-        debug.println(debug.LEVEL_INFO, msg)
+        msg = "WEB: Previous context is: %s, %i"
+        debug.println(debug.LEVEL_INFO, msg, obj, offset)
 
         contents = self.getLineContentsAtOffset(obj, offset, layoutMode, useCache)
         if not contents:
-            msg = "WEB: Could not get line contents for %s, %i" % (obj, offset)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Could not get line contents for %s, %i"
+            debug.println(debug.LEVEL_INFO, msg, obj, offset)
             return []
 
+        if useCache and prefetch:
+            self._scheduleLinePrefetch(contents, False)
+
         return contents
 
-    def getNextLineContents(self, obj=None, offset=-1, layoutMode=None, useCache=True):
+    def getNextLineContents(self, obj=None, offset=-1, layoutMode=None, useCache=True,
+                            prefetch=True):
         if obj is None:
             obj, offset = self.getCaretContext()
 
-        msg = "WEB: Current context is: %s, %i" % (obj, offset)
-        debug.println(debug.LEVEL_INFO, msg)
+        msg = "WEB: Current context is: %s, %i"
+        debug.println(debug.LEVEL_INFO, msg, obj, offset)
 
         if obj and self.isZombie(obj):
-            msg = "WEB: Current context obj %s is zombie" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Current context obj %s is zombie"
+            debug.println(debug.LEVEL_INFO, msg, obj)
 
         line = self.getLineContentsAtOffset(obj, offset, layoutMode, useCache)
-        msg = "WEB: Line contents for %s, %i: %s" % (obj, offset, line)
-        debug.println(debug.LEVEL_INFO, msg)
+        msg = "WEB: Line contents for %s, %i: %s"
+        debug.println(debug.LEVEL_INFO, msg, obj, offset, line)
 
         if not (line and line[0]):
             return []
@@ -1201,25 +1361,28 @@ class Utilities(script_utilities.Utilities):
             lastObj, lastOffset = self.lastContext(math)
         else:
             lastObj, lastOffset = line[-1][0], line[-1][2] - 1
-        msg = "WEB: Last context on line is: %s, %i" % (lastObj, lastOffset)
-        debug.println(debug.LEVEL_INFO, msg)
+        msg = "WEB: Last context on line is: %s, %i"
+        debug.println(debug.LEVEL_INFO, msg, lastObj, lastOffset)
 
         obj, offset = self.nextContext(lastObj, lastOffset, True)
         if not obj and lastObj:
-            msg = "WEB: Next context is: %s, %i. Trying again." % (obj, offset)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Next context is: %s, %i. Trying again."
+            debug.println(debug.LEVEL_INFO, msg, obj, offset)
             self.clearCachedObjects()
             obj, offset = self.nextContext(lastObj, lastOffset, True)
 
-        msg = "WEB: Next context is: %s, %i" % (obj, offset)
-        debug.println(debug.LEVEL_INFO, msg)
+        msg = "WEB: Next context is: %s, %i"
+        debug.println(debug.LEVEL_INFO, msg, obj, offset)
 
         contents = self.getLineContentsAtOffset(obj, offset, layoutMode, useCache)
         if not contents:
-            msg = "WEB: Could not get line contents for %s, %i" % (obj, offset)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Could not get line contents for %s, %i"
+            debug.println(debug.LEVEL_INFO, msg, obj, offset)
             return []
 
+        if useCache and prefetch:
+            self._scheduleLinePrefetch(contents, True)
+
         return contents
 
     def isFocusModeWidget(self, obj):
@@ -1227,8 +1390,8 @@ class Utilities(script_utilities.Utilities):
             role = obj.getRole()
             state = obj.getState()
         except:
-            msg = "WEB: Exception getting role and state for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting role and state for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return False
 
         if state.contains(pyatspi.STATE_EDITABLE) \
@@ -1276,8 +1439,8 @@ class Utilities(script_utilities.Utilities):
             role = obj.getRole()
             state = obj.getState()
         except:
-            msg = "WEB: Exception getting role and state for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting role and state for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return False
 
         textBlockElements = [pyatspi.ROLE_CAPTION,
@@ -1326,8 +1489,8 @@ class Utilities(script_utilities.Utilities):
             role = obj.getRole()
             childCount = obj.childCount
         except:
-            msg = "WEB: Exception getting role and childCount for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting role and childCount for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return False
 
         rv = False
@@ -1955,8 +2118,8 @@ class Utilities(script_utilities.Utilities):
         try:
             name = obj.name
         except:
-            msg = "WEB: Exception getting name for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting name for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
         else:
             if name:
                 return False
@@ -1970,8 +2133,8 @@ class Utilities(script_utilities.Utilities):
         try:
             role = obj.getRole()
         except:
-            msg = "WEB: Exception getting role for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting role for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return False
 
         # TODO - JD: This is private.
@@ -2104,12 +2267,12 @@ class Utilities(script_utilities.Utilities):
             hyperlink = obj.queryHyperlink()
             start, end = hyperlink.startIndex, hyperlink.endIndex
         except NotImplementedError:
-            msg = "WEB: %s does not implement the hyperlink interface" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: %s does not implement the hyperlink interface"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return -1, -1
         except:
-            msg = "WEB: Exception getting hyperlink indices for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting hyperlink indices for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return -1, -1
 
         return start, end
@@ -2134,12 +2297,12 @@ class Utilities(script_utilities.Utilities):
         try:
             hypertext = obj.queryHypertext()
         except NotImplementedError:
-            msg = "WEB: %s does not implement the hypertext interface" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: %s does not implement the hypertext interface"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return -1
         except:
-            msg = "WEB: Exception querying hypertext interface for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception querying hypertext interface for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return -1
 
         return hypertext.getLinkIndex(offset)
@@ -2181,8 +2344,8 @@ class Utilities(script_utilities.Utilities):
         try:
             childCount = obj.childCount
         except:
-            msg = "WEB: Exception getting childCount for %s" % obj
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting childCount for %s"
+            debug.println(debug.LEVEL_INFO, msg, obj)
             return True
         if not childCount:
             return True
@@ -2274,16 +2437,16 @@ class Utilities(script_utilities.Utilities):
         try:
             role = obj.getRole()
         except:
-            msg = "WEB: Exception getting first caret context for %s %i" % (obj, offset)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: Exception getting first caret context for %s %i"
+            debug.println(debug.LEVEL_INFO, msg, obj, offset)
             return None, -1
 
         lookInChild = [pyatspi.ROLE_LIST,
                        pyatspi.ROLE_TABLE,
                        pyatspi.ROLE_TABLE_ROW]
         if role in lookInChild and obj.childCount:
-            msg = "WEB: First caret context for %s, %i will look in child %s" % (obj, offset, obj[0])
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: First caret context for %s, %i will look in child %s"
+            debug.println(debug.LEVEL_INFO, msg, obj, offset, obj[0])
             return self.findFirstCaretContext(obj[0], 0)
 
         text = self.queryNonEmptyText(obj)
@@ -2291,30 +2454,30 @@ class Utilities(script_utilities.Utilities):
             if self.isTextBlockElement(obj) or self.isAnchor(obj):
                 nextObj, nextOffset = self.nextContext(obj, offset)
                 if nextObj:
-                    msg = "WEB: First caret context for %s, %i is %s, %i" % (obj, offset, nextObj, nextOffset)
-                    debug.println(debug.LEVEL_INFO, msg)
+                    msg = "WEB: First caret context for %s, %i is %s, %i"
+                    debug.println(debug.LEVEL_INFO, msg, obj, offset, nextObj, nextOffset)
                     return nextObj, nextOffset
 
-            msg = "WEB: First caret context for %s, %i is %s, %i" % (obj, offset, obj, 0)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: First caret context for %s, %i is %s, %i"
+            debug.println(debug.LEVEL_INFO, msg, obj, offset, obj, 0)
             return obj, 0
 
         if offset >= text.characterCount:
-            msg = "WEB: First caret context for %s, %i is %s, %i" % (obj, offset, obj, text.characterCount)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: First caret context for %s, %i is %s, %i"
+            debug.println(debug.LEVEL_INFO, msg, obj, offset, obj, text.characterCount)
             return obj, text.characterCount
 
         allText = text.getText(0, -1)
         offset = max (0, offset)
         if allText[offset] != self.EMBEDDED_OBJECT_CHARACTER:
-            msg = "WEB: First caret context for %s, %i is %s, %i" % (obj, offset, obj, offset)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: First caret context for %s, %i is %s, %i"
+            debug.println(debug.LEVEL_INFO, msg, obj, offset, obj, offset)
             return obj, offset
 
         child = self.getChildAtOffset(obj, offset)
         if not child:
-            msg = "WEB: First caret context for %s, %i is %s, %i" % (obj, offset, None, -1)
-            debug.println(debug.LEVEL_INFO, msg)
+            msg = "WEB: First caret context for %s, %i is %s, %i"
+            debug.println(debug.LEVEL_INFO, msg, obj, offset, None, -1)
             return None, -1
 
         return self.findFirstCaretContext(child, 0)
@@ -2329,9 +2492,9 @@ class Utilities(script_utilities.Utilities):
         if not (self.isHidden(obj) or self.isOffScreenLabel(obj) or self.isNonNavigablePopup(obj)):
             text = self.queryNonEmptyText(obj)
             if text:
-                allText = text.getText(0, -1)
+                allText, children = self._getCaretOrderInfo(obj, text)
                 for i in range(offset + 1, len(allText)):
-                    child = self.getChildAtOffset(obj, i)
+                    child = self._getCaretOrderChild(obj, children, i)
                     if child and not self.isZombie(child) and not self.isAnchor(child) \
                        and not self.isUselessImage(child):
                         return self.findNextCaretInOrder(child, -1)
@@ -2347,13 +2510,14 @@ class Utilities(script_utilities.Utilities):
         if self.isSameObject(obj, documentFrame):
             return None, -1
 
-        while obj.parent:
-            parent = obj.parent
+        cache = snapshot_cache.getCache()
+        while cache.getParent(obj):
+            parent = cache.getParent(obj)
             if self.isZombie(parent):
                 replicant = self.findReplicant(self.documentFrame(), parent)
                 if replicant and not self.isZombie(replicant):
                     parent = replicant
-                elif parent.parent:
+                elif cache.getParent(parent):
                     obj = parent
                     continue
                 else:
@@ -2363,12 +2527,12 @@ class Utilities(script_utilities.Utilities):
             if start + 1 == end and 0 <= start < end <= length:
                 return self.findNextCaretInOrder(parent, start)
 
-            index = obj.getIndexInParent() + 1
+            index = cache.get(obj, snapshot_cache.INDEX_IN_PARENT) + 1
             try:
                 parentChildCount = parent.childCount
             except:
-                msg = "WEB: Exception getting childCount for %s" % parent
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: Exception getting childCount for %s"
+                debug.println(debug.LEVEL_INFO, msg, parent)
             else:
                 if 0 <= index < parentChildCount:
                     return self.findNextCaretInOrder(parent[index], -1)
@@ -2386,11 +2550,11 @@ class Utilities(script_utilities.Utilities):
         if not (self.isHidden(obj) or self.isOffScreenLabel(obj) or self.isNonNavigablePopup(obj)):
             text = self.queryNonEmptyText(obj)
             if text:
-                allText = text.getText(0, -1)
+                allText, children = self._getCaretOrderInfo(obj, text)
                 if offset == -1 or offset > len(allText):
                     offset = len(allText)
                 for i in range(offset - 1, -1, -1):
-                    child = self.getChildAtOffset(obj, i)
+                    child = self._getCaretOrderChild(obj, children, i)
                     if child and not self.isZombie(child) and not self.isAnchor(child) \
                        and not self.isUselessImage(child):
                         return self.findPreviousCaretInOrder(child, -1)
@@ -2406,13 +2570,14 @@ class Utilities(script_utilities.Utilities):
         if self.isSameObject(obj, documentFrame):
             return None, -1
 
-        while obj.parent:
-            parent = obj.parent
+        cache = snapshot_cache.getCache()
+        while cache.getParent(obj):
+            parent = cache.getParent(obj)
             if self.isZombie(parent):
                 replicant = self.findReplicant(self.documentFrame(), parent)
                 if replicant and not self.isZombie(replicant):
                     parent = replicant
-                elif parent.parent:
+                elif cache.getParent(parent):
                     obj = parent
                     continue
                 else:
@@ -2422,12 +2587,12 @@ class Utilities(script_utilities.Utilities):
             if start + 1 == end and 0 <= start < end <= length:
                 return self.findPreviousCaretInOrder(parent, start)
 
-            index = obj.getIndexInParent() - 1
+            index = cache.get(obj, snapshot_cache.INDEX_IN_PARENT) - 1
             try:
                 parentChildCount = parent.childCount
             except:
-                msg = "WEB: Exception getting childCount for %s" % parent
-                debug.println(debug.LEVEL_INFO, msg)
+                msg = "WEB: Exception getting childCount for %s"
+                debug.println(debug.LEVEL_INFO, msg, parent)
             else:
                 if 0 <= index < parentChildCount:
                     return self.findPreviousCaretInOrder(parent[index], -1)
@@ -358,3 +358,21 @@ layoutMode = True
 # any time
 rewindAndFastForwardInSayAll = False
 structNavInSayAll = False
+
+# The number of say all utterances to generate and queue to the speech
+# server after the one being spoken (0 means the next utterance is only
+# generated when the current one has been spoken, which is heard as a
+# pause between them).
+#
+sayAllLookahead = 2
+
+# Whether to create the scripts for the applications which are already
+# running when Orca starts, while it is idle, rather than when the first
+# event from each application arrives.
+#
+preloadScripts = False
+
+# The number of seconds after which to give up traversing a window for flat
+# review and review what was found so far (0 means no limit).
+#
+flatReviewTimeout = 0
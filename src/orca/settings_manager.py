@@ -28,9 +28,11 @@ __date__      = "$Date$"
 __copyright__ = "Copyright (c) 2010 Consorcio Fernando de los Rios."
 __license__   = "LGPL"
 
+import copy
 import imp
 import importlib
 import os
+import weakref
 from gi.repository import Gio, GLib
 
 from . import debug
@@ -54,6 +56,53 @@ except:
 
 _scriptManager = script_manager.getManager()
 
+_MISSING = object()
+
+class _SettingsOverlay:
+    """The settings in effect while an application is active with a
+    profile: the general settings, pronunciations and key bindings of the
+    profile with those of the application on top. An overlay is built once
+    and must not be modified; the settings which are mutable, such as the
+    voices, are given out as copies. The runtime settings are the general
+    settings with the user's customizations on top."""
+
+    def __init__(self, version, general, runtime, pronunciations,
+                 keybindings, appGeneral, appPronunciations, appKeybindings):
+        self.version = version
+        self.general = general
+        self.runtime = runtime
+        self.pronunciations = pronunciations
+        self.keybindings = keybindings
+        self.appGeneral = appGeneral
+        self.appPronunciations = appPronunciations
+        self.appKeybindings = appKeybindings
+
+        self.pronunciationDict = {}
+        for key, value in pronunciations.values():
+            if key and value:
+                pronunciation_dict.setPronunciation(
+                    key, value, self.pronunciationDict)
+
+        self._mutableKeys = set(key for key, value in runtime.items()
+                                if isinstance(value, (dict, list)))
+        self.scriptKeyBindings = weakref.WeakKeyDictionary()
+
+    def getValue(self, key):
+        value = self.runtime[key]
+        if key in self._mutableKeys:
+            value = copy.deepcopy(value)
+        return value
+
+    def getStaleKeys(self):
+        """Returns the keys of the runtime settings which have to be set
+        for orca.settings to have those of this overlay: those whose
+        values in orca.settings differ, however they were set, and those
+        whose values are mutable."""
+
+        return [key for key, value in self.runtime.items()
+                if key in self._mutableKeys
+                or getattr(settings, key, _MISSING) != value]
+
 class SettingsManager(object):
     """Settings backend manager. This class manages orca user's settings
     using different backends"""
@@ -106,6 +155,11 @@ class SettingsManager(object):
         self._appPronunciations = {}
         self._appKeybindings = {}
 
+        # The overlay built for each (profile, application), and the
+        # settings set since one was last applied.
+        self._overlays = {}
+        self._runtimeKeys = set()
+
         if not self._loadBackend():
             raise Exception('SettingsManager._loadBackend failed.')
 
@@ -126,6 +180,7 @@ class SettingsManager(object):
 
         # Load the backend and the default values
         self._backend = self.backendModule.Backend(self._prefsDir)
+        self._overlays = {}
         self._setDefaultGeneral()
         self._setDefaultPronunciations()
         self._setDefaultKeybindings()
@@ -371,9 +426,11 @@ class SettingsManager(object):
         self._getCustomizedSettings()
         for key, value in list(self.customizedSettings.items()):
             setattr(settings, str(key), value)
+        self._runtimeKeys.update(settingsDict.keys())
+        self._runtimeKeys.update(self.customizedSettings.keys())
 
     def _setPronunciationsRuntime(self, pronunciationsDict):
-        pronunciation_dict.pronunciation_dict = {}
+        pronunciation_dict.setDictionary({})
         for key, value in pronunciationsDict.values():
             if key and value:
                 pronunciation_dict.setPronunciation(key, value)
@@ -447,6 +504,7 @@ class SettingsManager(object):
                                       appGeneral,
                                       appPronunciations,
                                       appKeybindings)
+        self._overlays = {}
 
     def saveSettings(self, script, general, pronunciations, keybindings):
         """Save the settings provided for the script provided."""
@@ -474,6 +532,7 @@ class SettingsManager(object):
                                           self.profileGeneral,
                                           self.profilePronunciations,
                                           self.profileKeybindings)
+        self._overlays = {}
         return self._enableAccessibility()
 
     def _adjustBindingTupleValues(self, bindingTuple):
@@ -503,6 +562,13 @@ class SettingsManager(object):
 
         return scriptKeyBindings
 
+    def flushSettings(self):
+        """Writes the settings which the backend has not saved yet."""
+
+        flush = getattr(self._backend, 'flush', None)
+        if flush:
+            flush()
+
     def isFirstStart(self):
         """Check if the firstStart key is True or false"""
         return self._backend.isFirstStart()
@@ -533,6 +599,41 @@ class SettingsManager(object):
 
         return appSetting
 
+    def _getOverlay(self, appName):
+        """Returns the overlay for appName with the current profile, building
+        it if the settings have changed since it was last built."""
+
+        getVersion = getattr(self._backend, 'getVersion', None)
+        version = getVersion(appName) if getVersion else None
+        overlay = self._overlays.get((self.profile, appName))
+        if overlay and version is not None and overlay.version == version:
+            return overlay
+
+        prefs = self._backend.getAppSettings(appName)
+        profiles = prefs.get('profiles', {})
+        profilePrefs = profiles.get(self.profile, {})
+        appGeneral = profilePrefs.get('general', {})
+        appKeybindings = profilePrefs.get('keybindings', {})
+        appPronunciations = profilePrefs.get('pronunciations', {})
+
+        general = self.defaultGeneral.copy()
+        general.update(self.getGeneralSettings(self.profile) or {})
+        general.update(appGeneral)
+        self._getCustomizedSettings()
+        runtime = general.copy()
+        runtime.update(self.customizedSettings)
+
+        pronunciations = self.getPronunciations(self.profile) or {}
+        pronunciations.update(appPronunciations)
+        keybindings = self.getKeybindings(self.profile) or {}
+        keybindings.update(appKeybindings)
+
+        overlay = _SettingsOverlay(version, general, runtime, pronunciations,
+                                   keybindings, appGeneral,
+                                   appPronunciations, appKeybindings)
+        self._overlays[(self.profile, appName)] = overlay
+        return overlay
+
     def loadAppSettings(self, script):
         """Load the users application specific settings for an app.
 
@@ -543,23 +644,39 @@ class SettingsManager(object):
         if not (script and script.app):
             return
 
-        for key in self._appPronunciations.keys():
-            self.pronunciations.pop(key)
-
-        prefs = self._backend.getAppSettings(script.app.name)
-        profiles = prefs.get('profiles', {})
-        profilePrefs = profiles.get(self.profile, {})
-
-        self._appGeneral = profilePrefs.get('general', {})
-        self._appKeybindings = profilePrefs.get('keybindings', {})
-        self._appPronunciations = profilePrefs.get('pronunciations', {})
+        overlay = self._getOverlay(script.app.name)
+        self._appGeneral = overlay.appGeneral
+        self._appKeybindings = overlay.appKeybindings
+        self._appPronunciations = overlay.appPronunciations
         self._activeApp = script.app.name
 
-        self._loadProfileSettings()
-        self._mergeSettings()
-        self._setSettingsRuntime(self.general)
-        self._setPronunciationsRuntime(self.pronunciations)
-        script.keyBindings = self.overrideKeyBindings(script, script.getKeyBindings())
+        self.profileGeneral = overlay.general.copy()
+        self.profilePronunciations = overlay.pronunciations.copy()
+        self.profileKeybindings = overlay.keybindings.copy()
+        self.general = overlay.general.copy()
+        self.pronunciations = overlay.pronunciations.copy()
+        self.keybindings = overlay.keybindings.copy()
+
+        # Only the settings which differ from those of the overlay have to
+        # be set. They are compared with orca.settings itself, because not
+        # everything which changes a setting goes through this manager.
+        for key in overlay.getStaleKeys():
+            setattr(settings, str(key), overlay.getValue(key))
+
+        pronunciation_dict.setDictionary(overlay.pronunciationDict)
+
+        # Key bindings may depend on settings, so they are only reused if
+        # the settings are those of the overlay.
+        keyBindings = None
+        if not self._runtimeKeys:
+            keyBindings = overlay.scriptKeyBindings.get(script)
+        if keyBindings is None:
+            keyBindings = self.overrideKeyBindings(script,
+                                                   script.getKeyBindings())
+            overlay.scriptKeyBindings[script] = keyBindings
+        script.keyBindings = keyBindings
+
+        self._runtimeKeys = set()
 
 _manager = SettingsManager()
 
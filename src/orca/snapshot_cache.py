@@ -0,0 +1,263 @@
+# Orca
+#
+# Copyright 2016 The Orca Team
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., Franklin Street, Fifth Floor,
+# Boston MA  02110-1301 USA.
+
+"""Caches snapshots of the basic properties of accessible objects (role,
+name, description, state set, attributes, child count, index in parent
+and parent) so that presenting an object and its ancestors does not
+require asking the application for the same properties over and over.
+Snapshots are kept up to date by the AT-SPI events which announce that
+one of those properties has changed, rather than being discarded for
+every event."""
+
+__id__        = "$Id$"
+__version__   = "$Revision$"
+__date__      = "$Date$"
+__copyright__ = "Copyright (c) 2016 The Orca Team"
+__license__   = "LGPL"
+
+import collections
+
+from . import debug
+from . import event_manager
+from . import latency
+
+_eventManager = event_manager.getManager()
+
+ROLE = 'role'
+NAME = 'name'
+DESCRIPTION = 'description'
+STATE = 'state'
+ATTRIBUTES = 'attributes'
+CHILD_COUNT = 'childCount'
+INDEX_IN_PARENT = 'indexInParent'
+PARENT = 'parent'
+
+# The properties fetched together the first time an object is seen.
+# Attributes are only fetched when asked for: they are rarely needed
+# and, unlike the others, usually require a round trip.
+#
+SNAPSHOT_PROPERTIES = [ROLE, NAME, DESCRIPTION, STATE, CHILD_COUNT,
+                       INDEX_IN_PARENT, PARENT]
+
+def _getAttributes(obj):
+    attributes = {}
+    for attribute in obj.getAttributes():
+        key, sep, value = attribute.partition(':')
+        attributes[key] = value
+    return attributes
+
+_getters = {
+    ROLE: lambda obj: obj.getRole(),
+    NAME: lambda obj: obj.name,
+    DESCRIPTION: lambda obj: obj.description,
+    STATE: lambda obj: obj.getState(),
+    ATTRIBUTES: _getAttributes,
+    CHILD_COUNT: lambda obj: obj.childCount,
+    INDEX_IN_PARENT: lambda obj: obj.getIndexInParent(),
+    PARENT: lambda obj: obj.parent,
+}
+
+class SnapshotCache:
+    """A least-recently-used cache of accessible object snapshots. Each
+    snapshot is a dictionary of property name to value, from which a
+    property is removed when an event says it has changed."""
+
+    def __init__(self, maxSize=1000):
+        self._snapshots = collections.OrderedDict()
+        self._children = {}
+        self._maxSize = maxSize
+        self._hits = 0
+        self._misses = 0
+        self._active = False
+        self._listeners = {
+            "object:property-change:accessible-name": self._onNameChanged,
+            "object:property-change:accessible-description":
+                self._onDescriptionChanged,
+            "object:property-change:accessible-role": self._onObjectChanged,
+            "object:property-change:accessible-parent":
+                self._onObjectChanged,
+            "object:state-changed": self._onStateChanged,
+            "object:children-changed": self._onChildrenChanged,
+            "object:attributes-changed": self._onAttributesChanged,
+        }
+
+    def activate(self):
+        """Starts listening for the events which keep snapshots current."""
+
+        if self._active:
+            return
+
+        _eventManager.registerModuleListeners(self._listeners)
+        latency.registerStatsProvider('snapshotCache', self.getStats)
+        self._active = True
+
+    def deactivate(self):
+        """Stops listening for events and discards all snapshots, which
+        could no longer be kept current."""
+
+        if not self._active:
+            return
+
+        _eventManager.deregisterModuleListeners(self._listeners)
+        self._active = False
+        self.clear()
+
+    def clear(self):
+        self._snapshots.clear()
+        self._children.clear()
+
+    def getStats(self):
+        """Returns a dictionary with the size of the cache and the number
+        of property lookups it could and could not answer."""
+
+        return {'size': len(self._snapshots),
+                'maxSize': self._maxSize,
+                'hits': self._hits,
+                'misses': self._misses}
+
+    def _getSnapshot(self, obj):
+        snapshot = self._snapshots.get(obj)
+        if snapshot is not None:
+            self._snapshots.move_to_end(obj)
+            return snapshot
+
+        snapshot = {}
+        for prop in SNAPSHOT_PROPERTIES:
+            try:
+                snapshot[prop] = _getters[prop](obj)
+            except:
+                # Leave it out. It will be fetched (and the error raised
+                # to the caller) if and when it is actually needed.
+                pass
+
+        self._snapshots[obj] = snapshot
+        parent = snapshot.get(PARENT)
+        if parent is not None:
+            self._children.setdefault(parent, set()).add(obj)
+
+        while len(self._snapshots) > self._maxSize:
+            self._remove(next(iter(self._snapshots)))
+
+        return snapshot
+
+    def _remove(self, obj):
+        snapshot = self._snapshots.pop(obj, None)
+        if snapshot is None:
+            return
+
+        siblings = self._children.get(snapshot.get(PARENT))
+        if siblings is not None:
+            siblings.discard(obj)
+            if not siblings:
+                del self._children[snapshot.get(PARENT)]
+
+    def get(self, obj, prop):
+        """Returns the value of the given property (e.g. ROLE) of obj,
+        raising the same exceptions as asking obj for it directly would."""
+
+        if not self._active:
+            return _getters[prop](obj)
+
+        snapshot = self._getSnapshot(obj)
+        try:
+            value = snapshot[prop]
+        except KeyError:
+            self._misses += 1
+            value = snapshot[prop] = _getters[prop](obj)
+        else:
+            self._hits += 1
+
+        return value
+
+    def getRole(self, obj):
+        return self.get(obj, ROLE)
+
+    def getName(self, obj):
+        return self.get(obj, NAME)
+
+    def getState(self, obj):
+        return self.get(obj, STATE)
+
+    def getParent(self, obj):
+        return self.get(obj, PARENT)
+
+    def getAncestors(self, obj):
+        """Returns the list of ancestors of obj, starting with its parent,
+        stopping at the first object which is its own parent."""
+
+        ancestors = []
+        parent = self.getParent(obj)
+        while parent and parent not in ancestors:
+            grandparent = self.getParent(parent)
+            if grandparent == parent:
+                break
+            ancestors.append(parent)
+            parent = grandparent
+
+        return ancestors
+
+    def invalidate(self, obj, prop=None):
+        """Discards the cached value of the given property of obj, or the
+        whole snapshot of obj if prop is None."""
+
+        if prop is None:
+            self._remove(obj)
+            return
+
+        snapshot = self._snapshots.get(obj)
+        if snapshot:
+            snapshot.pop(prop, None)
+
+    def _onNameChanged(self, event):
+        self.invalidate(event.source, NAME)
+
+    def _onDescriptionChanged(self, event):
+        self.invalidate(event.source, DESCRIPTION)
+
+    def _onAttributesChanged(self, event):
+        self.invalidate(event.source, ATTRIBUTES)
+
+    def _onObjectChanged(self, event):
+        self.invalidate(event.source)
+
+    def _onStateChanged(self, event):
+        if event.type.startswith("object:state-changed:defunct"):
+            self.invalidate(event.source)
+        else:
+            self.invalidate(event.source, STATE)
+
+    def _onChildrenChanged(self, event):
+        self.invalidate(event.source, CHILD_COUNT)
+
+        # The index of every sibling after the added or removed child may
+        # have changed.
+        for child in list(self._children.get(event.source, [])):
+            self.invalidate(child, INDEX_IN_PARENT)
+
+        if event.type.startswith("object:children-changed:remove") \
+           and event.any_data:
+            self.invalidate(event.any_data)
+
+        debug.println(debug.LEVEL_ALL,
+                      "SNAPSHOT CACHE: %s for %s", event.type, event.source)
+
+_cache = SnapshotCache()
+
+def getCache():
+    return _cache
@@ -0,0 +1,86 @@
+# Orca
+#
+# Copyright 2016 The Orca Team
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., Franklin Street, Fifth Floor,
+# Boston MA  02110-1301 USA.
+
+"""Remembers the application, toolkit, state set and role of the source of
+an event, so that the event manager, which asks for them when the event is
+queued, and the script, which asks again when it processes the event, only
+ask the application once. Each event carries its own snapshot, created the
+first time it is asked for and discarded along with the event."""
+
+__id__        = "$Id$"
+__version__   = "$Revision$"
+__date__      = "$Date$"
+__copyright__ = "Copyright (c) 2016 The Orca Team"
+__license__   = "LGPL"
+
+# NOTE: like orca_state, this module must not import other Orca modules:
+# the event manager and the scripts both use it.
+#
+
+class SourceSnapshot:
+    """The properties of the source of an event, each fetched the first
+    time it is asked for. If fetching a property raises an exception, the
+    exception is passed on and the property is fetched again next time."""
+
+    def __init__(self, obj):
+        self.obj = obj
+        self._values = {}
+
+    def _get(self, name, getter):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+
+        value = getter()
+        self._values[name] = value
+        return value
+
+    def getApplication(self):
+        return self._get('application', self.obj.getApplication)
+
+    def getToolkitName(self):
+        return self._get('toolkitName',
+                         lambda: self.getApplication().toolkitName)
+
+    def getState(self):
+        return self._get('state', self.obj.getState)
+
+    def getRole(self):
+        return self._get('role', self.obj.getRole)
+
+    def forgetState(self):
+        """Makes the next getState fetch the state again. Unlike the role,
+        application and toolkit, the state may change between when an event
+        is queued and when it is processed."""
+
+        self._values.pop('state', None)
+
+def getSnapshot(event):
+    """Returns the snapshot of the source of event."""
+
+    snapshot = getattr(event, 'sourceSnapshot', None)
+    if snapshot is None or snapshot.obj is not event.source:
+        snapshot = SourceSnapshot(event.source)
+        try:
+            event.sourceSnapshot = snapshot
+        except AttributeError:
+            pass
+
+    return snapshot
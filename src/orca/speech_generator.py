@@ -36,6 +36,7 @@ from . import messages
 from . import object_properties
 from . import settings
 from . import settings_manager
+from . import snapshot_cache
 from . import text_attribute_names
 from . import acss
 
@@ -1561,8 +1562,9 @@ class SpeechGenerator(generator.Generator):
         result = []
         priorObj = args.get('priorObj', None)
         commonAncestor = self._script.utilities.commonAncestor(priorObj, obj)
+        cache = snapshot_cache.getCache()
         try:
-            role = commonAncestor.getRole()
+            role = cache.getRole(commonAncestor)
         except:
             pass
         else:
@@ -1573,15 +1575,15 @@ class SpeechGenerator(generator.Generator):
         stopAtRoles = args.get('stopAtRoles', [])
         stopAtRoles.append(pyatspi.ROLE_APPLICATION)
         if obj != commonAncestor:
-            parent = obj.parent
-            while parent and not parent in [commonAncestor, parent.parent]:
-                parentRole = parent.getRole()
+            for parent in cache.getAncestors(obj):
+                if parent == commonAncestor:
+                    break
+                parentRole = cache.getRole(parent)
                 if parentRole in stopAtRoles:
                     break
                 if parentRole not in skipRoles \
                    and not self._script.utilities.isLayoutOnly(parent):
                     result.append(self.generate(parent, formatType='focused'))
-                parent = parent.parent
         result.reverse()
         return result
 
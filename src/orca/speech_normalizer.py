@@ -0,0 +1,155 @@
+# Orca
+#
+# Copyright 2016 The Orca Team
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., Franklin Street, Fifth Floor,
+# Boston MA  02110-1301 USA.
+
+"""Adjusts text before it is given to a speech synthesizer: ellipses and
+the punctuation which the synthesizer would not speak at any punctuation
+level are replaced by their spoken names, subscript and superscript digits
+by digits, and the active script makes its pronunciation adjustments. The
+punctuation is replaced in a single scan of the text with a pattern built
+once from the punctuation settings, and the adjusted text of recently
+spoken strings, such as role names and labels, is remembered."""
+
+__id__        = "$Id$"
+__version__   = "$Revision$"
+__date__      = "$Date$"
+__copyright__ = "Copyright (c) 2016 The Orca Team"
+__license__   = "LGPL"
+
+import collections
+import re
+
+from . import chnames
+from . import latency
+from . import mathsymbols
+from . import messages
+from . import orca_state
+from . import pronunciation_dict
+from . import punctuation_settings
+from . import settings
+
+PUNCTUATION = re.compile('[^\w\s]', re.UNICODE)
+ELLIPSIS = re.compile('(\342\200\246|\.\.\.\s*)')
+
+class Normalizer:
+    """Adjusts text for speech, remembering the results for the last
+    maxSize strings. A result is only reused if nothing it depends upon
+    (the active script, whether it speaks math symbol names and the
+    settings its pronunciation adjustments use) has changed."""
+
+    def __init__(self, maxSize=500):
+        self._results = collections.OrderedDict()
+        self._maxSize = maxSize
+        self._hits = 0
+        self._misses = 0
+        self._punctuationRE = None
+        self._punctuationNames = {}
+        latency.registerStatsProvider('speechNormalizer', self.getStats)
+
+    def getStats(self):
+        return {'size': len(self._results),
+                'maxSize': self._maxSize,
+                'hits': self._hits,
+                'misses': self._misses}
+
+    def clear(self):
+        self._results.clear()
+
+    def _compilePunctuation(self):
+        """Builds the pattern which matches an ellipsis or any of the
+        punctuation symbols which have to be spoken at every punctuation
+        level, and the spoken names of those symbols."""
+
+        names = {}
+        for symbol, info in punctuation_settings.punctuation.items():
+            level, action = info
+            if level != punctuation_settings.LEVEL_NONE \
+               or not PUNCTUATION.match(symbol):
+                continue
+
+            name = " %s " % chnames.getCharacterName(symbol)
+            if action == punctuation_settings.PUNCTUATION_INSERT:
+                name += symbol
+            names[symbol] = name
+
+        pattern = ELLIPSIS.pattern
+        if names:
+            symbols = sorted(names, key=len, reverse=True)
+            pattern += "|%s" % "|".join(map(re.escape, symbols))
+
+        self._punctuationNames = names
+        self._punctuationRE = re.compile(pattern, re.UNICODE)
+
+    def _replacePunctuation(self, match):
+        if match.group(1) is not None:
+            return messages.SPOKEN_ELLIPSIS + " "
+
+        return self._punctuationNames[match.group(0)]
+
+    def addVerbalizedPunctuation(self, text):
+        """Replaces ellipses and the punctuation symbols which would not
+        otherwise be spoken with their spoken names, and subscript and
+        superscript digits with digits."""
+
+        if self._punctuationRE is None:
+            self._compilePunctuation()
+
+        text = self._punctuationRE.sub(self._replacePunctuation, text)
+        if orca_state.activeScript:
+            text = orca_state.activeScript.utilities.adjustForDigits(text)
+
+        return text
+
+    def _getKey(self, text, script):
+        if not script:
+            return text, None
+
+        return (text,
+                script,
+                script.utilities.speakMathSymbolNames(),
+                mathsymbols.speakStyle,
+                settings.speakMultiCaseStringsAsWords,
+                settings.usePronunciationDictionary,
+                pronunciation_dict.getGeneration())
+
+    def normalize(self, text):
+        """Returns text adjusted for speech."""
+
+        script = orca_state.activeScript
+        key = self._getKey(text, script)
+        result = self._results.get(key)
+        if result is not None:
+            self._hits += 1
+            self._results.move_to_end(key)
+            return result
+
+        self._misses += 1
+        result = self.addVerbalizedPunctuation(text)
+        if script:
+            result = script.utilities.adjustForPronunciation(result)
+
+        self._results[key] = result
+        if len(self._results) > self._maxSize:
+            self._results.popitem(last=False)
+
+        return result
+
+_normalizer = Normalizer()
+
+def getNormalizer():
+    return _normalizer
@@ -36,17 +36,16 @@ __copyright__ = "Copyright (c) 2006-2008 Brailcom, o.p.s."
 __license__   = "LGPL"
 
 from gi.repository import GLib
-import re
 import time
 
 from . import chnames
 from . import debug
 from . import guilabels
 from . import messages
+from . import speech_normalizer
 from . import speechserver
 from . import settings
 from . import orca_state
-from . import punctuation_settings
 from .acss import ACSS
 
 try:
@@ -62,8 +61,6 @@ else:
     else:
         _speechd_version_ok = True
 
-PUNCTUATION = re.compile('[^\w\s]', re.UNICODE)
-ELLIPSIS = re.compile('(\342\200\246|\.\.\.\s*)')
 
 class SpeechServer(speechserver.SpeechServer):
     # See the parent class for documentation.
@@ -120,6 +117,7 @@ class SpeechServer(speechserver.SpeechServer):
         super(SpeechServer, self).__init__()
         self._id = serverId
         self._client = None
+        self._say_all_pipeline = None
         self._current_voice_properties = {}
         self._acss_manipulators = (
             (ACSS.RATE, self._set_rate),
@@ -249,50 +247,10 @@ class SpeechServer(speechserver.SpeechServer):
                 method({})
                 current[acss_property] = {}
 
-    def __addVerbalizedPunctuation(self, oldText):
-        """Depending upon the users verbalized punctuation setting,
-        adjust punctuation symbols in the given text to their pronounced
-        equivalents. The pronounced text will either replace the
-        punctuation symbol or be inserted before it. In the latter case,
-        this is to retain spoken prosity.
-
-        Arguments:
-        - oldText: text to be parsed for punctuation.
-
-        Returns a text string with the punctuation symbols adjusted accordingly.
-        """
-
-        spokenEllipsis = messages.SPOKEN_ELLIPSIS + " "
-        newText = re.sub(ELLIPSIS, spokenEllipsis, oldText)
-        symbols = set(re.findall(PUNCTUATION, newText))
-        for symbol in symbols:
-            try:
-                level, action = punctuation_settings.getPunctuationInfo(symbol)
-            except:
-                continue
-
-            if level != punctuation_settings.LEVEL_NONE:
-                # Speech Dispatcher should handle it.
-                #
-                continue
-
-            charName = " %s " % chnames.getCharacterName(symbol)
-            if action == punctuation_settings.PUNCTUATION_INSERT:
-                charName += symbol
-            newText = re.sub(symbol, charName, newText)
-
-        if orca_state.activeScript:
-            newText = orca_state.activeScript.utilities.adjustForDigits(newText)
-
-        return newText
-
     def _speak(self, text, acss, **kwargs):
         if isinstance(text, ACSS):
             text = ''
-        text = self.__addVerbalizedPunctuation(text)
-        if orca_state.activeScript:
-            text = orca_state.activeScript.\
-                utilities.adjustForPronunciation(text)
+        text = speech_normalizer.getNormalizer().normalize(text)
 
         # Replace no break space characters with plain spaces since some
         # synthesizers cannot handle them.  See bug #591734.
@@ -308,36 +266,38 @@ class SpeechServer(speechserver.SpeechServer):
         self._send_command(self._client.speak, text, **kwargs)
 
     def _say_all(self, iterator, orca_callback):
-        """Process another sayAll chunk.
+        """Start speaking the sayAll chunks, keeping settings.sayAllLookahead
+        of them queued after the one being spoken.
 
         Called by the gidle thread.
 
         """
-        try:
-            context, acss = next(iterator)
-        except StopIteration:
-            pass
-        else:
-            def callback(callbackType, index_mark=None):
-                # This callback is called in Speech Dispatcher listener thread.
-                # No subsequent Speech Dispatcher interaction is allowed here,
-                # so we pass the calls to the gidle thread.
-                t = self._CALLBACK_TYPE_MAP[callbackType]
-                if t == speechserver.SayAllContext.PROGRESS:
-                    if index_mark:
-                        context.currentOffset = int(index_mark)
-                    else:
-                        context.currentOffset = context.startOffset
-                elif t == speechserver.SayAllContext.COMPLETED:
-                    context.currentOffset = context.endOffset
-                GLib.idle_add(orca_callback, context, t)
-                if t == speechserver.SayAllContext.COMPLETED:
-                    GLib.idle_add(self._say_all, iterator, orca_callback)
-            self._speak(context.utterance, acss, callback=callback,
-                        event_types=list(self._CALLBACK_TYPE_MAP.keys()))
+        if self._say_all_pipeline:
+            self._say_all_pipeline.stop()
+        pipeline = speechserver.SayAllPipeline(
+            iterator, orca_callback,
+            lambda context, acss: self._queue_say_all(pipeline, context, acss),
+            settings.sayAllLookahead)
+        self._say_all_pipeline = pipeline
+        pipeline.start()
         return False # to indicate, that we don't want to be called again.
 
+    def _queue_say_all(self, pipeline, context, acss):
+        def callback(callbackType, index_mark=None):
+            # This callback is called in Speech Dispatcher listener thread.
+            # No subsequent Speech Dispatcher interaction is allowed here,
+            # so we pass the calls to the gidle thread.
+            t = self._CALLBACK_TYPE_MAP[callbackType]
+            offset = None
+            if t == speechserver.SayAllContext.PROGRESS and index_mark:
+                offset = int(index_mark)
+            GLib.idle_add(pipeline.progress, context, t, offset)
+        self._speak(context.utterance, acss, callback=callback,
+                    event_types=list(self._CALLBACK_TYPE_MAP.keys()))
+
     def _cancel(self):
+        if self._say_all_pipeline:
+            self._say_all_pipeline.cancel()
         self._send_command(self._client.cancel)
 
     def _change_default_speech_rate(self, step, decrease=False):
@@ -30,6 +30,10 @@ __date__      = "$Date$"
 __copyright__ = "Copyright (c) 2005-2008 Sun Microsystems Inc."
 __license__   = "LGPL"
 
+import collections
+
+from gi.repository import GLib
+
 class VoiceFamily(dict):
     """Holds the family description for a voice."""
 
@@ -84,6 +88,139 @@ class SayAllContext:
         self.endOffset     = endOffset
 
 
+class SayAllPipeline:
+    """Feeds the utterances of a say all to a speech server, keeping up to
+    lookahead of them queued to the synthesizer after the one being spoken
+    so that the time taken to generate the next utterance is not heard as
+    a pause.  Events about the queued utterances, which the speech server
+    must pass on in the main thread, are turned into the progress updates
+    which the script expects: one utterance at a time, in order, and at
+    most one INTERRUPTED.
+    """
+
+    def __init__(self, iterator, progressCallback, speak, lookahead=0):
+        """Creates a new SayAllPipeline.
+
+        Arguments:
+        - iterator:         the script's generator of [SayAllContext, acss]
+        - progressCallback: the script's progress callback
+        - speak:            a function of a SayAllContext and an ACSS which
+                            queues the context's utterance to the synthesizer
+        - lookahead:        the number of utterances to queue after the one
+                            being spoken
+        """
+
+        self._iterator = iterator
+        self._progressCallback = progressCallback
+        self._speak = speak
+        self._lookahead = max(0, lookahead)
+        self._queued = collections.deque()
+        self._exhausted = False
+        self._cancelled = False
+        self._finished = False
+        self._fillId = None
+
+    def start(self):
+        """Starts pulling utterances from the iterator."""
+
+        self._scheduleFill()
+
+    def current(self):
+        """Returns the SayAllContext being spoken, or None."""
+
+        if self._queued:
+            return self._queued[0]
+
+        return None
+
+    def cancel(self):
+        """Stops pulling utterances from the iterator, e.g. because the
+        synthesizer has been told to stop. The events about the utterances
+        already queued are still passed on to the script."""
+
+        self._cancelled = True
+        if self._fillId:
+            GLib.source_remove(self._fillId)
+            self._fillId = None
+
+    def stop(self):
+        """Stops the pipeline: no more utterances are pulled and no events
+        are passed on to the script."""
+
+        self.cancel()
+        self._finished = True
+        self._queued.clear()
+
+    def _scheduleFill(self):
+        if self._fillId or self._cancelled or self._exhausted \
+           or len(self._queued) > self._lookahead:
+            return
+
+        self._fillId = GLib.idle_add(self._fill)
+
+    def _fill(self):
+        """Queues the next utterance. Only one utterance is generated per
+        call so that input (e.g. the key which interrupts the say all) is
+        not held up behind the generation of several."""
+
+        if self._cancelled or self._exhausted \
+           or len(self._queued) > self._lookahead:
+            self._fillId = None
+            return False
+
+        try:
+            context, acss = next(self._iterator)
+        except StopIteration:
+            self._exhausted = True
+            self._fillId = None
+            return False
+
+        self._queued.append(context)
+        self._speak(context, acss)
+
+        if len(self._queued) > self._lookahead:
+            self._fillId = None
+            return False
+
+        return True
+
+    def progress(self, context, progressType, offset=None):
+        """Handles a synthesizer event about the utterance of context. For
+        PROGRESS, offset is where in the text the synthesizer is, if known.
+        Returns False so that it can be called as an idle callback."""
+
+        if self._finished or context not in self._queued:
+            return False
+
+        if progressType == SayAllContext.INTERRUPTED:
+            # Only the utterance being spoken was interrupted; the others
+            # were never heard and must not look like they were.
+            #
+            context = self._queued[0]
+            self.stop()
+            self._progressCallback(context, progressType)
+            return False
+
+        if progressType == SayAllContext.PROGRESS:
+            if offset is not None:
+                context.currentOffset = offset
+            else:
+                context.currentOffset = context.startOffset
+        elif progressType == SayAllContext.COMPLETED:
+            context.currentOffset = context.endOffset
+            while self._queued and self._queued.popleft() != context:
+                pass
+
+        self._progressCallback(context, progressType)
+        if progressType == SayAllContext.COMPLETED:
+            if self._exhausted and not self._queued:
+                self._finished = True
+            else:
+                self._scheduleFill()
+
+        return False
+
+
 class SpeechServer(object):
 
     """Provides speech server abstraction."""
@@ -190,7 +327,7 @@ class SpeechServer(object):
         """Iterates through the given utteranceIterator, speaking
         each utterance one at a time.  Subclasses may postpone
         getting a new element until the current element has been
-        spoken.
+        spoken, or use a SayAllPipeline to get a few elements ahead.
 
         Arguments:
         - utteranceIterator: iterator/generator whose next() function
@@ -34,15 +34,17 @@ from . import debug
 from . import guilabels
 from . import input_event
 from . import keybindings
+from . import lazy_import
 from . import messages
 from . import object_properties
 from . import orca
-from . import orca_gui_navlist
 from . import orca_state
 from . import settings
 from . import settings_manager
 from . import speech
 
+orca_gui_navlist = lazy_import.LazyModule('orca.orca_gui_navlist')
+
 _settingsManager = settings_manager.getManager()
 #############################################################################
 #                                                                           #
@@ -514,6 +516,64 @@ class StructuralNavigationObject:
              and direction == "Last":
             return goLastLiveRegion
 
+#############################################################################
+#                                                                           #
+# MatchIndex                                                                #
+#                                                                           #
+#############################################################################
+
+class MatchIndex:
+    """The matches for a StructuralNavigationObject, which Collection gives
+    us in document order, indexed so that the position of a match is a
+    dictionary lookup and the position of any other object is a binary
+    search over the paths of the matches.  The paths are only obtained,
+    once, for the matches the searches actually look at."""
+
+    def __init__(self, matches, criteria):
+        self.matches = matches
+        self.criteria = criteria
+        self._positions = dict((obj, i) for i, obj in enumerate(matches))
+        self._paths = {}
+
+    def __len__(self):
+        return len(self.matches)
+
+    def positionOf(self, obj):
+        """Returns the position of obj in the matches, or -1."""
+
+        return self._positions.get(obj, -1)
+
+    def pathAt(self, position):
+        """Returns the path of the match at position."""
+
+        path = self._paths.get(position)
+        if path is None:
+            path = self._paths[position] = \
+                pyatspi.utils.getPath(self.matches[position])
+
+        return path
+
+    def bisect(self, path, after=False):
+        """Returns the position of the first match whose path comes after
+        path, or if after is False, which does not come before path."""
+
+        low, high = 0, len(self.matches)
+        while low < high:
+            middle = (low + high) // 2
+            middlePath = self.pathAt(middle)
+            if middlePath < path or (after and middlePath == path):
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def endOfDescendants(self, path):
+        """Returns the position after the last match which is a descendant
+        of the object whose path is path."""
+
+        return self.bisect(path + [float('inf')])
+
 #############################################################################
 #                                                                           #
 # StructuralNavigation                                                      #
@@ -826,15 +886,23 @@ class StructuralNavigation:
 
     def _getAll(self, structuralNavigationObject, arg=None):
         """Returns all the instances of structuralNavigationObject."""
+
+        index = self._getMatchIndex(structuralNavigationObject, arg)
+        return index.matches.copy(), index.criteria
+
+    def _getMatchIndex(self, structuralNavigationObject, arg=None):
+        """Returns the MatchIndex of all the instances of
+        structuralNavigationObject."""
+
         if not structuralNavigationObject.criteria:
-            return [], None
+            return MatchIndex([], None)
 
         document = self._script.utilities.documentFrame()
         cache = self._objectCache.get(hash(document), {})
         key = "%s:%s" % (structuralNavigationObject.objType, arg)
-        matches, criteria = cache.get(key, ([], None))
-        if matches:
-            return matches.copy(), criteria
+        index = cache.get(key)
+        if index:
+            return index
 
         col = document.queryCollection()
         criteria = structuralNavigationObject.criteria(col, arg)
@@ -850,10 +918,11 @@ class StructuralNavigation:
         matches = col.getMatches(rule, col.SORT_ORDER_CANONICAL, 0, True)
         col.freeMatchRule(rule)
 
-        rv = matches.copy(), criteria
-        cache[key] = matches, criteria
-        self._objectCache[hash(document)] = cache
-        return rv
+        index = MatchIndex(matches, criteria)
+        if index:
+            cache[key] = index
+            self._objectCache[hash(document)] = cache
+        return index
 
     def goObject(self, structuralNavigationObject, isNext, obj=None, arg=None):
         """The method used for navigation among StructuralNavigationObjects
@@ -872,13 +941,12 @@ class StructuralNavigation:
           is needed and passed in as arg.
         """
 
-        matches, criteria = list(self._getAll(structuralNavigationObject, arg))
-        if not matches:
+        index = self._getMatchIndex(structuralNavigationObject, arg)
+        if not index:
             structuralNavigationObject.present(None, arg)
             return
 
-        if not isNext:
-            matches.reverse()
+        matches, criteria = index.matches, index.criteria
 
         def _isValidMatch(obj):
             if self._script.utilities.isHidden(obj) or self._script.utilities.isEmpty(obj):
@@ -887,34 +955,64 @@ class StructuralNavigation:
                 return True
             return structuralNavigationObject.predicate(obj)
 
-        def _getMatchingObjAndIndex(obj):
-            while obj:
-                if obj in matches:
-                    return obj, matches.index(obj)
-                obj = obj.parent
-
-            return None, -1
-
+        offset = None
         if not obj:
             obj, offset = self._script.utilities.getCaretContext()
-        thisObj, index = _getMatchingObjAndIndex(obj)
-        if thisObj:
-            matches = matches[index:]
-            obj = thisObj
 
-        currentPath = pyatspi.utils.getPath(obj)
-        for i, match in enumerate(matches):
-            if not _isValidMatch(match):
-                continue
+        # If we are in (or on) a match, the matches before and after it in
+        # the document are those before and after it in the list.
+        #
+        thisObj = obj
+        position = -1
+        while thisObj:
+            position = index.positionOf(thisObj)
+            if position >= 0:
+                obj = thisObj
+                break
+            thisObj = thisObj.parent
 
-            if match.parent == obj:
-                comparison = self._script.utilities.characterOffsetInParent(match) - offset
-            else:
-                path = pyatspi.utils.getPath(match)
-                comparison = self._script.utilities.pathComparison(path, currentPath)
-            if (comparison > 0 and isNext) or (comparison < 0 and not isNext):
-                structuralNavigationObject.present(match, arg)
+        # Matches which are children of obj are before or after the caret
+        # depending on their offset in obj. Other descendants of obj are
+        # treated as being after it.
+        #
+        currentPath = pyatspi.utils.getPath(obj)
+        if position >= 0:
+            start = position + 1
+        else:
+            start = index.bisect(currentPath, after=True)
+        end = start
+        if offset is not None:
+            end = index.endOfDescendants(currentPath)
+
+        def _isChild(i):
+            return len(index.pathAt(i)) == len(currentPath) + 1
+
+        def _comparison(i):
+            match = matches[i]
+            return self._script.utilities.characterOffsetInParent(match) \
+                - offset
+
+        if isNext:
+            for i in range(start, len(matches)):
+                if not _isValidMatch(matches[i]):
+                    continue
+                if i < end and _isChild(i) and _comparison(i) <= 0:
+                    continue
+                structuralNavigationObject.present(matches[i], arg)
                 return
+        else:
+            if position < 0:
+                for i in range(end - 1, start - 1, -1):
+                    if _isChild(i) and _comparison(i) < 0 \
+                       and _isValidMatch(matches[i]):
+                        structuralNavigationObject.present(matches[i], arg)
+                        return
+                position = start
+
+            for i in range(position - 1, -1, -1):
+                if _isValidMatch(matches[i]):
+                    structuralNavigationObject.present(matches[i], arg)
+                    return
 
         if not settings.wrappedStructuralNavigation:
             structuralNavigationObject.present(None, arg)
@@ -0,0 +1,145 @@
+"""Checks that Utilities.adjustForRepeats gives the same result as the
+original implementation, which built the new line a character and a
+segment at a time, for synthetic lines and for each line of a 1 MB log
+full of separators, indentation and ASCII art, at every punctuation
+level. Times both on each line of the log, as say all and flat review
+do, and on the log as a single string."""
+
+import random
+import sys
+import time
+
+from orca import chnames
+from orca import messages
+from orca import punctuation_settings
+from orca import settings
+from orca.script_utilities import Utilities
+
+LOG_SIZE = 1024 * 1024
+
+class FakeScript:
+
+    whitespace = ' \t\n\r\v\f'
+
+def referenceAdjustForRepeats(self, line):
+    """The original implementation."""
+
+    if (len(line) < 4) or (settings.repeatCharacterLimit < 4):
+        return line
+
+    newLine = ''
+    segment = lastChar = line[0]
+
+    multipleChars = False
+    for i in range(1, len(line)):
+        if line[i] == lastChar:
+            segment += line[i]
+        else:
+            multipleChars = True
+            newLine = referenceAddRepeatSegment(self, segment, newLine)
+            segment = line[i]
+
+        lastChar = line[i]
+
+    return referenceAddRepeatSegment(self, segment, newLine, multipleChars)
+
+def referenceAddRepeatSegment(self, segment, line, respectPunctuation=True):
+    style = settings.verbalizePunctuationStyle
+    isPunctChar = True
+    try:
+        level, action = punctuation_settings.getPunctuationInfo(segment[0])
+    except:
+        isPunctChar = False
+    count = len(segment)
+    if (count >= settings.repeatCharacterLimit) \
+       and (not segment[0] in self._script.whitespace):
+        if (not respectPunctuation) \
+           or (isPunctChar and (style <= level)):
+            repeatChar = chnames.getCharacterName(segment[0])
+            repeatSegment = messages.repeatedCharCount(repeatChar, count)
+            line = "%s %s" % (line, repeatSegment)
+        else:
+            line += segment
+    else:
+        line += segment
+
+    return line
+
+def makeLog(rand):
+    lines = []
+    size = 0
+    while size < LOG_SIZE:
+        choice = rand.random()
+        if choice < 0.1:
+            line = rand.choice("=-*#~_") * rand.randint(10, 120)
+        elif choice < 0.2:
+            line = "|%s|%s|" % (" " * rand.randint(0, 40),
+                                "-" * rand.randint(0, 40))
+        elif choice < 0.3:
+            line = "".join(rand.choice(["/\\", "  ", "||", "..", "__"])
+                           * rand.randint(1, 8) for i in range(10))
+        else:
+            line = "2016-03-%02d 12:%02d:%02d INFO %s%s" % (
+                rand.randint(1, 31), rand.randint(0, 59), rand.randint(0, 59),
+                " " * rand.randint(0, 12),
+                " ".join(rand.choice(["request", "served", "in", "msec",
+                                      "aaaa", "!!!!!", "...."])
+                         for i in range(rand.randint(2, 12))))
+        lines.append(line)
+        size += len(line) + 1
+
+    return lines
+
+def makeLines(rand):
+    lines = ["", "a", "aaaa", "====", "    ", "abc", "aaab", "abbbb",
+             "!!!!", "!!!!a", "a!!!!", "a!!!!b", "\n\n\n\n", "xxxxxxxxxx"]
+    for i in range(1000):
+        lines.append("".join(rand.choice("ab =!.-\n") * rand.randint(1, 6)
+                             for j in range(rand.randint(0, 10))))
+    return lines
+
+def timeIt(func, utilities, lines):
+    startTime = time.time()
+    for line in lines:
+        func(utilities, line)
+    return time.time() - startTime
+
+def main():
+    rand = random.Random(0)
+    utilities = Utilities(FakeScript())
+    log = makeLog(rand)
+    lines = makeLines(rand) + log
+
+    ok = True
+    styles = [settings.PUNCTUATION_STYLE_NONE, settings.PUNCTUATION_STYLE_SOME,
+              settings.PUNCTUATION_STYLE_MOST, settings.PUNCTUATION_STYLE_ALL]
+    for style in styles:
+        settings.verbalizePunctuationStyle = style
+        for limit in [0, 4, 5, 10]:
+            settings.repeatCharacterLimit = limit
+            for line in lines:
+                expected = referenceAdjustForRepeats(utilities, line)
+                if utilities.adjustForRepeats(line) != expected:
+                    print("MISMATCH for %r (style %d, limit %d)"
+                          % (line, style, limit))
+                    ok = False
+                    break
+    print("Equivalence: %s" % ("OK" if ok else "FAILED"))
+
+    settings.verbalizePunctuationStyle = settings.PUNCTUATION_STYLE_MOST
+    settings.repeatCharacterLimit = 4
+    before = timeIt(referenceAdjustForRepeats, utilities, log)
+    after = timeIt(Utilities.adjustForRepeats, utilities, log)
+    print("%d lines: before: %.3f sec after: %.3f sec"
+          % (len(log), before, after))
+
+    text = ["\n".join(log)]
+    before = timeIt(referenceAdjustForRepeats, utilities, text)
+    after = timeIt(Utilities.adjustForRepeats, utilities, text)
+    print("%d characters in one string: before: %.3f sec after: %.3f sec"
+          % (len(text[0]), before, after))
+
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
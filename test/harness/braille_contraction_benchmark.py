@@ -0,0 +1,130 @@
+"""Times contracting braille regions with the default contraction table
+while working in an editor: moving the caret through lines of text, which
+contracts the line again with the word under the caret expanded,
+repainting the same regions, as happens on most events, and typing a
+line. Compares the time and the number of louis.translate calls against
+calling liblouis for each contraction, as the original implementation
+did, and checks that each contraction is the same. Needs liblouis and
+its tables."""
+
+import sys
+import time
+
+from orca import braille
+from orca import settings
+
+LINES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "    def getAttributeMask(self, getLinkMask=True):",
+    "Please find attached the minutes of the meeting and the agenda.",
+    "for (i = 0; i < count; i++) { total += values[i]; }",
+    "It was the best of times, it was the worst of times.",
+    "Would you like to have lunch together tomorrow afternoon?",
+    "# Orca is a free, open source screen reader for the GNOME desktop",
+    "        return self.string, settings.brailleLinkIndicator",
+]
+
+LABELS = ["frame", "Text Editor", "scroll pane", "text", "menu bar",
+          "status bar", "Line 12, Column 4"]
+
+REPAINTS = 20
+
+calls = 0
+
+def countCalls(translate):
+    def countingTranslate(*args, **kwargs):
+        global calls
+        calls += 1
+        return translate(*args, **kwargs)
+    return countingTranslate
+
+def moveCaret():
+    """Moves the caret through each line, one character at a time."""
+
+    results = []
+    for line in LINES:
+        for offset in range(len(line) + 1):
+            region = braille.Region(line, offset, expandOnCursor=True)
+            results.append((region.string, region.inPos, region.outPos,
+                            region.cursorOffset))
+    return results
+
+def repaint():
+    """Builds the regions of an editor window over and over."""
+
+    results = []
+    for i in range(REPAINTS):
+        for label in LABELS:
+            region = braille.Component(None, label)
+            results.append((region.string, region.inPos, region.outPos,
+                            region.cursorOffset))
+        region = braille.Region(LINES[i % len(LINES)], 10,
+                                expandOnCursor=True)
+        results.append((region.string, region.inPos, region.outPos,
+                        region.cursorOffset))
+    return results
+
+def typeLines():
+    """Types each line, one character at a time."""
+
+    results = []
+    for line in LINES:
+        for length in range(1, len(line) + 1):
+            region = braille.Region(line[:length], length,
+                                    expandOnCursor=True)
+            results.append((region.string, region.inPos, region.outPos,
+                            region.cursorOffset))
+    return results
+
+def run(scenario):
+    global calls
+    braille._contractionCache.clear()
+    calls = 0
+    startTime = time.time()
+    results = scenario()
+    return results, time.time() - startTime, calls
+
+def referenceTranslate(table, line, cursorOffset, mode):
+    """The original implementation: a call to liblouis for each
+    contraction."""
+
+    return braille.louis.translate([table], line, cursorPos=cursorOffset,
+                                   mode=mode)
+
+def main():
+    if not braille.louis or not braille._defaultContractionTable:
+        print("liblouis or its tables are not available")
+        print("Result: SKIPPED")
+        return 0
+
+    settings.enableContractedBraille = True
+    settings.brailleContractionTable = braille._defaultContractionTable
+    braille.louis.translate = countCalls(braille.louis.translate)
+    print("Contraction table: %s" % braille._defaultContractionTable)
+
+    ok = True
+    translate = braille._translate
+    for name, scenario in [("caret moves", moveCaret),
+                           ("repaints", repaint),
+                           ("typing", typeLines)]:
+        braille._translate = referenceTranslate
+        expected, before, beforeCalls = run(scenario)
+        braille._translate = translate
+        actual, after, afterCalls = run(scenario)
+
+        print("%s: %d contractions" % (name, len(expected)))
+        print("  before: %.2f msec, %d louis.translate calls"
+              % (before * 1000, beforeCalls))
+        print("  after:  %.2f msec, %d louis.translate calls"
+              % (after * 1000, afterCalls))
+        for i, (old, new) in enumerate(zip(expected, actual)):
+            if old != new:
+                print("DIFFERENT CONTRACTION %d: %r, %r" % (i, old, new))
+                ok = False
+                break
+
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
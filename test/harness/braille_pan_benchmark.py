@@ -0,0 +1,196 @@
+"""Times panning across a long line of text on an 80 cell display, which
+repaints the display after each pan, against the original implementation
+of braille.Line.getLineInfo, which asked the application for the links,
+text attributes and selections of the text each time. Checks that the
+line and its attribute mask are the same for each pan, after the caret
+moves and after the text attributes change. The text object and the
+script are fakes which count the requests made to the application."""
+
+import sys
+import time
+
+from orca import braille
+from orca import orca_state
+from orca import settings
+from orca.script_utilities import Utilities
+
+PANS = 2000
+DISPLAY_SIZE = 80
+LINE_LENGTH = 640
+
+roundTrips = 0
+
+def referenceGetLineInfo(self, getLinkMask=True):
+    """The original implementation."""
+
+    string = ""
+    focusOffset = -1
+    attributeMask = ""
+    for region in self.regions:
+        if region == braille._regionWithFocus:
+            focusOffset = len(string)
+        if region.string:
+            string += region.string.replace('…', "...")
+        mask = region.getAttributeMask(getLinkMask)
+        attributeMask += mask
+
+    return [string, focusOffset, attributeMask]
+
+class FakeLink:
+
+    def __init__(self, startIndex, endIndex):
+        self.startIndex = startIndex
+        self.endIndex = endIndex
+
+class FakeText:
+    """A text object with a long line with a link every 100 characters,
+    which changes its text attributes every 20 characters and has a
+    selection."""
+
+    def __init__(self):
+        self.text = "".join("word%03d " % i for i in range(LINE_LENGTH // 8))
+        self.caretOffset = 5
+        self.misspelled = set()
+        self.selections = [(30, 60)]
+
+    def queryText(self):
+        global roundTrips
+        roundTrips += 1
+        return self
+
+    def queryHypertext(self):
+        global roundTrips
+        roundTrips += 1
+        return self
+
+    def getNLinks(self):
+        global roundTrips
+        roundTrips += 1
+        return LINE_LENGTH // 100
+
+    def getLink(self, n):
+        global roundTrips
+        roundTrips += 1
+        return FakeLink(n * 100, n * 100 + 10)
+
+class FakeUtilities:
+
+    stringToKeysAndDict = staticmethod(Utilities.stringToKeysAndDict)
+
+    def __init__(self, text):
+        self._text = text
+
+    def textAttributes(self, acc, offset, get_defaults=False):
+        global roundTrips
+        roundTrips += 1
+        start = offset - offset % 20
+        attributes = {'weight': '400', 'invalid': 'none'}
+        if (start // 20) % 3 == 0:
+            attributes['weight'] = '700'
+        if start in self._text.misspelled:
+            attributes['invalid'] = 'spelling'
+        return attributes, start, min(start + 20, len(self._text.text))
+
+    def allTextSelections(self, obj):
+        global roundTrips
+        roundTrips += 1
+        return self._text.selections
+
+class FakeScript:
+
+    def __init__(self, text):
+        self.utilities = FakeUtilities(text)
+
+    def getTextLineAtCaret(self, obj, offset=None, startOffset=None,
+                           endOffset=None):
+        global roundTrips
+        roundTrips += 1
+        return [obj.text, obj.caretOffset, 0]
+
+def makeLine(text):
+    region = braille.Text(text, "Editor", " $l")
+    line = braille.Line()
+    line.addRegion(braille.Component(None, "frame"))
+    line.addRegion(region)
+    braille.clear()
+    braille.addLine(line)
+    braille._regionWithFocus = region
+    return line, region
+
+def pan(line, pans):
+    """Pans right to the end of the line and back to its beginning, over
+    and over, repainting the display after each pan. Returns the line
+    information painted after each pan."""
+
+    painted = []
+    right = True
+    for i in range(pans):
+        if right:
+            right = braille.panRight()
+        else:
+            right = not braille.panLeft()
+        braille.refresh(panToCursor=False)
+        painted.append(line.getLineInfo())
+    return painted
+
+def run(getLineInfo, text):
+    global roundTrips
+    braille.Line.getLineInfo = getLineInfo
+    line, region = makeLine(text)
+    roundTrips = 0
+    startTime = time.time()
+    painted = pan(line, PANS)
+    elapsed = (time.time() - startTime) / PANS
+    trips = roundTrips
+
+    # Move the caret on the line, then change the text attributes.
+    #
+    text.caretOffset = 300
+    region.repositionCursor()
+    braille.refresh(panToCursor=True)
+    painted.append(line.getLineInfo())
+    text.misspelled.add(400)
+    text.selections = [(320, 330)]
+    braille.invalidateAttributeMasks()
+    braille.refresh(panToCursor=True)
+    painted.append(line.getLineInfo())
+
+    text.caretOffset = 5
+    text.misspelled.clear()
+    text.selections = [(30, 60)]
+    return painted, elapsed, trips
+
+def main():
+    settings.enableBraille = False
+    settings.enableBrailleMonitor = False
+    settings.enableContractedBraille = False
+    settings.enabledBrailledTextAttributes = "weight:400;invalid:none;"
+    braille._displaySize = [DISPLAY_SIZE, 1]
+
+    text = FakeText()
+    orca_state.activeScript = FakeScript(text)
+
+    getLineInfo = braille.Line.getLineInfo
+    expected, before, beforeTrips = run(referenceGetLineInfo, text)
+    actual, after, afterTrips = run(getLineInfo, text)
+    braille.Line.getLineInfo = getLineInfo
+
+    print("%d pans across a line of %d cells on a %d cell display"
+          % (PANS, len(expected[0][0]), DISPLAY_SIZE))
+    print("  before: %.1f usec per pan, %d round trips"
+          % (before * 1000000, beforeTrips))
+    print("  after:  %.1f usec per pan, %d round trips"
+          % (after * 1000000, afterTrips))
+
+    ok = actual == expected
+    if not ok:
+        print("DIFFERENT LINES")
+    if expected[-1][2] == expected[-2][2]:
+        print("ATTRIBUTES NOT CHANGED")
+        ok = False
+
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
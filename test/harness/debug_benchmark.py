@@ -0,0 +1,66 @@
+"""Measures the per-event overhead of debug messages when logging is off,
+formatting the message before calling debug.println (the old way) and
+passing the values to debug.println to be formatted only if the level is
+enabled (the new way).  Converting an accessible to a string can require
+round trips to the application; FakeAccessible simulates that cost."""
+
+import sys
+import time
+
+from orca import debug
+
+EVENTS = 100000
+
+# Simulated cost, in seconds, of converting an accessible to a string.
+ROUND_TRIP = 0.00002
+
+class FakeAccessible:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        endTime = time.time() + ROUND_TRIP
+        while time.time() < endTime:
+            pass
+        return "[%s]" % self.name
+
+class FakeEvent:
+
+    def __init__(self, i):
+        self.type = "object:state-changed:showing"
+        self.source = FakeAccessible("source %d" % i)
+        self.host_application = FakeAccessible("app")
+        self.detail1 = 1
+        self.detail2 = 0
+        self.any_data = None
+
+def old(event):
+    msg = 'ERROR: %s from defunct source %s in app %s (%s, %s, %s)' % \
+          (event.type, event.source, event.host_application, event.detail1,
+           event.detail2, event.any_data)
+    debug.println(debug.LEVEL_INFO, msg)
+
+def new(event):
+    msg = 'ERROR: %s from defunct source %s in app %s (%s, %s, %s)'
+    debug.println(debug.LEVEL_INFO, msg, event.type, event.source,
+                  event.host_application, event.detail1, event.detail2,
+                  event.any_data)
+
+def timeIt(func, events):
+    startTime = time.time()
+    for event in events:
+        func(event)
+    return (time.time() - startTime) / len(events)
+
+def main():
+    debug.debugLevel = debug.LEVEL_OFF
+    events = [FakeEvent(i) for i in range(EVENTS)]
+    before = timeIt(old, events)
+    after = timeIt(new, events)
+    print("Per-event overhead with logging off:")
+    print("  before: %.3f usec" % (before * 1000000))
+    print("  after:  %.3f usec" % (after * 1000000))
+
+if __name__ == "__main__":
+    sys.exit(main())
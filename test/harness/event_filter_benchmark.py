@@ -0,0 +1,196 @@
+"""Replays a stream of 100000 synthetic AT-SPI events, with the mix of
+types and the bursts from a few sources seen while a chat page loads and
+updates, through EventManager._ignore, and checks that it ignores the same
+events as the original implementation, which tried every ignored type and
+test on each event and asked every source for its state. Each state and
+role request on the fake objects is counted as a round trip to the
+application."""
+
+import random
+import sys
+import time
+
+import pyatspi
+
+from orca import debug
+from orca import event_manager
+
+EVENTS = 100000
+SOURCES = 200
+
+EVENT_TYPES = [
+    ("object:bounds-changed", 10),
+    ("object:children-changed:add", 15),
+    ("object:children-changed:remove", 10),
+    ("object:text-changed:insert", 15),
+    ("object:text-changed:insert:system", 10),
+    ("object:text-changed:delete:system", 5),
+    ("object:state-changed:showing", 10),
+    ("object:state-changed:focused", 3),
+    ("object:state-changed:defunct", 2),
+    ("object:property-change:accessible-name", 10),
+    ("object:property-change:accessible-parent", 3),
+    ("object:text-caret-moved", 5),
+    ("window:activate", 1),
+    ("focus:", 1),
+]
+
+ROLES = [pyatspi.ROLE_PARAGRAPH, pyatspi.ROLE_IMAGE, pyatspi.ROLE_LINK,
+         pyatspi.ROLE_SECTION, pyatspi.ROLE_MENU_ITEM, pyatspi.ROLE_LIST_ITEM]
+
+roundTrips = 0
+
+class FakeStateSet:
+
+    def __init__(self, defunct):
+        self._defunct = defunct
+
+    def contains(self, state):
+        return state == pyatspi.STATE_DEFUNCT and self._defunct
+
+class FakeAccessible:
+
+    def __init__(self, name, role, defunct=False):
+        self.name = name
+        self._role = role
+        self._defunct = defunct
+
+    def getState(self):
+        global roundTrips
+        roundTrips += 1
+        return FakeStateSet(self._defunct)
+
+    def getRole(self):
+        global roundTrips
+        roundTrips += 1
+        return self._role
+
+    def __repr__(self):
+        return self.name
+
+class FakeRegistry:
+
+    desktop = FakeAccessible("desktop", pyatspi.ROLE_DESKTOP_FRAME)
+
+    def getDesktop(self, i):
+        return self.desktop
+
+class FakeEvent:
+
+    def __init__(self, eventType, source, detail1=0, anyData=None):
+        self.type = eventType
+        self.source = source
+        self.detail1 = detail1
+        self.detail2 = 0
+        self.any_data = anyData
+        self.host_application = None
+
+def makeEvents(rand):
+    """Returns the events, in bursts of up to 20 from the same source. A
+    few sources are defunct and announce it."""
+
+    sources = [FakeAccessible("object %d" % i, rand.choice(ROLES),
+                              i % 50 == 0)
+               for i in range(SOURCES)]
+    sources.append(FakeRegistry.desktop)
+    types = [eventType for eventType, weight in EVENT_TYPES
+             for i in range(weight)]
+
+    events = []
+    while len(events) < EVENTS:
+        source = rand.choice(sources)
+        for i in range(rand.randint(1, 20)):
+            eventType = rand.choice(types)
+            anyData = None
+            detail1 = 0
+            if eventType.startswith("object:children-changed"):
+                anyData = rand.choice(sources + [None])
+            elif eventType.startswith("object:text-changed"):
+                anyData = rand.choice(["hello", "￼"])
+            elif eventType == "object:state-changed:defunct":
+                if not source._defunct:
+                    continue
+                detail1 = 1
+            events.append(FakeEvent(eventType, source, detail1, anyData))
+
+    return events[:EVENTS]
+
+def referenceIgnore(self, event):
+    """The original implementation, without the debug output."""
+
+    if not self._active:
+        return True
+
+    if list(filter(event.type.startswith, self._ignoredEvents)):
+        return True
+
+    if event.type.startswith('window'):
+        return False
+
+    if event.type.startswith('object:children-changed:remove') \
+       and event.source != self.registry.getDesktop(0):
+        return True
+
+    if event.type.startswith('object:text-changed') and event.type.endswith('system'):
+        if event.any_data == self.EMBEDDED_OBJECT_CHARACTER:
+            return True
+
+    try:
+        state = event.source.getState()
+    except:
+        return True
+    if state.contains(pyatspi.STATE_DEFUNCT):
+        return True
+
+    if event.type.startswith('object:state-changed:showing'):
+        try:
+            role = event.source.getRole()
+        except:
+            role = None
+        if role in [pyatspi.ROLE_IMAGE, pyatspi.ROLE_MENU_ITEM, pyatspi.ROLE_PARAGRAPH]:
+            return True
+
+    if event.type.startswith('object:children-changed:add'):
+        if not event.any_data:
+            return True
+        try:
+            state = event.any_data.getState()
+            role = event.any_data.getRole()
+        except:
+            return True
+        if state.contains(pyatspi.STATE_DEFUNCT):
+            return True
+        if role == pyatspi.ROLE_IMAGE:
+            return True
+
+    return False
+
+def run(ignore, manager, events):
+    global roundTrips
+    roundTrips = 0
+    startTime = time.time()
+    results = [ignore(manager, event) for event in events]
+    return results, time.time() - startTime, roundTrips
+
+def main():
+    debug.debugLevel = debug.LEVEL_SEVERE
+    events = makeEvents(random.Random(0))
+
+    manager = event_manager.EventManager()
+    manager.registry = FakeRegistry()
+    manager._active = True
+
+    expected, before, beforeTrips = run(referenceIgnore, manager, events)
+    actual, after, afterTrips = run(
+        event_manager.EventManager._ignore, manager, events)
+
+    print("%d events, %d ignored" % (len(events), expected.count(True)))
+    print("  before: %.3f sec, %d round trips" % (before, beforeTrips))
+    print("  after:  %.3f sec, %d round trips" % (after, afterTrips))
+
+    ok = actual == expected
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
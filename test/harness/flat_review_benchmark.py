@@ -0,0 +1,122 @@
+"""Checks that flat_review.Context.clusterZonesByLine groups synthetic zones
+into the same lines, in the same order, as the original bubble sort and
+all-pairs clustering did, and times both over 100, 1000 and 10000 zones.
+The zones are laid out like a page of text or a spreadsheet, with some
+jitter in position and height so that lines do not line up perfectly."""
+
+import random
+import sys
+import time
+
+from orca import flat_review
+
+SIZES = [100, 1000, 10000]
+
+# The reference is quadratic (or worse); don't wait for it on huge sets.
+#
+MAX_REFERENCE_SIZE = 10000
+
+def referenceClusterZonesByLine(zones):
+    """The original implementation, returning lists of zones."""
+
+    numZones = len(zones)
+    for i in range(0, numZones):
+        for j in range(0, numZones - 1 - i):
+            a = zones[j]
+            b = zones[j + 1]
+            if b.y < a.y:
+                zones[j] = b
+                zones[j + 1] = a
+
+    lineClusters = []
+    for clusterCandidate in zones:
+        addedToCluster = False
+        for lineCluster in lineClusters:
+            inCluster = True
+            for zone in lineCluster:
+                if not zone.onSameLine(clusterCandidate):
+                    inCluster = False
+                    break
+            if inCluster:
+                i = 0
+                while i < len(lineCluster):
+                    zone = lineCluster[i]
+                    if clusterCandidate.x < zone.x:
+                        break
+                    else:
+                        i += 1
+                lineCluster.insert(i, clusterCandidate)
+                addedToCluster = True
+                break
+        if not addedToCluster:
+            lineClusters.append([clusterCandidate])
+
+    return lineClusters
+
+def makeZones(count, seed):
+    rand = random.Random(seed)
+    zones = []
+    columns = max(1, int(count ** 0.5))
+    y = 0
+    while len(zones) < count:
+        lineHeight = rand.choice([12, 16, 20, 24])
+        for column in range(columns):
+            if len(zones) == count:
+                break
+            x = column * 80 + rand.randint(-5, 5)
+            height = max(0, lineHeight + rand.randint(-8, 8))
+            top = y + rand.randint(-lineHeight // 2, lineHeight // 2)
+            zones.append(flat_review.Zone(None, "z%d" % len(zones),
+                                          x, top, 70, height, role=1))
+        y += lineHeight + rand.randint(-4, 4)
+
+    rand.shuffle(zones)
+    return zones
+
+def checkEquivalence(count, seed):
+    zones = makeZones(count, seed)
+    expected = referenceClusterZonesByLine(list(zones))
+    context = flat_review.Context.__new__(flat_review.Context)
+    lines = context.clusterZonesByLine(list(zones))
+    actual = [line.zones for line in lines]
+    if actual != expected:
+        print("MISMATCH for %d zones (seed %d)" % (count, seed))
+        return False
+
+    for lineIndex, line in enumerate(lines):
+        for zoneIndex, zone in enumerate(line.zones):
+            if zone.line is not line or zone.index != zoneIndex:
+                print("BAD INDICES for %d zones (seed %d)" % (count, seed))
+                return False
+
+    return True
+
+def timeIt(func, zones):
+    startTime = time.time()
+    func(list(zones))
+    return time.time() - startTime
+
+def main():
+    ok = True
+    for seed in range(50):
+        ok = checkEquivalence(random.Random(seed).randint(0, 300), seed) \
+             and ok
+    for count in SIZES:
+        ok = checkEquivalence(count, count) and ok
+    print("Equivalence: %s" % ("OK" if ok else "FAILED"))
+
+    context = flat_review.Context.__new__(flat_review.Context)
+    for count in SIZES:
+        zones = makeZones(count, count)
+        after = timeIt(context.clusterZonesByLine, zones)
+        if count <= MAX_REFERENCE_SIZE:
+            before = "%.3f sec" % timeIt(referenceClusterZonesByLine, zones)
+        else:
+            before = "skipped"
+        print("%6d zones: before: %s after: %.3f sec"
+              % (count, before, after))
+
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
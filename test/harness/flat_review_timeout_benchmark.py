@@ -0,0 +1,185 @@
+"""Times building a flat review context for a fake window whose accessible
+objects take LATENCY seconds to answer each call, as if each call were a
+round trip to the application.  Checks that settings.flatReviewTimeout
+gives partial results in about the time allowed, and that a context built
+afterwards without a timeout has all of the lines."""
+
+import sys
+import time
+
+import pyatspi
+
+from orca import flat_review
+from orca import orca_state
+from orca import settings
+
+LATENCY = 0.0005
+
+class FakeExtents:
+
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+class FakeStateSet:
+
+    def contains(self, state):
+        return False
+
+class FakeAccessible:
+
+    def __init__(self, name, role, extents, children=()):
+        self._name = name
+        self._role = role
+        self._extents = extents
+        self._children = list(children)
+        self._parent = None
+        for child in self._children:
+            child._parent = self
+
+    def _roundTrip(self):
+        time.sleep(LATENCY)
+
+    @property
+    def name(self):
+        self._roundTrip()
+        return self._name
+
+    @property
+    def description(self):
+        self._roundTrip()
+        return ""
+
+    @property
+    def parent(self):
+        self._roundTrip()
+        return self._parent
+
+    @property
+    def childCount(self):
+        self._roundTrip()
+        return len(self._children)
+
+    def getChildAtIndex(self, i):
+        self._roundTrip()
+        return self._children[i]
+
+    def getApplication(self):
+        return "app"
+
+    def getRole(self):
+        self._roundTrip()
+        return self._role
+
+    def getRoleName(self):
+        return "fake"
+
+    def getLocalizedRoleName(self):
+        return "fake"
+
+    def getState(self):
+        self._roundTrip()
+        return FakeStateSet()
+
+    def queryComponent(self):
+        return self
+
+    def getExtents(self, coordType):
+        self._roundTrip()
+        return self._extents
+
+    def queryText(self):
+        self._roundTrip()
+        raise NotImplementedError
+
+    def queryImage(self):
+        self._roundTrip()
+        raise NotImplementedError
+
+class FakeUtilities:
+
+    def containsRegion(self, ax, ay, awidth, aheight,
+                       bx, by, bwidth, bheight):
+        return ax < bx + bwidth and bx < ax + awidth \
+            and ay < by + bheight and by < ay + aheight
+
+    def showingDescendants(self, root):
+        return []
+
+    def pursueForFlatReview(self, obj):
+        return True
+
+    def isSameObject(self, a, b):
+        return a is b
+
+    def topLevelObject(self, obj):
+        while obj._parent:
+            obj = obj._parent
+        return obj
+
+class FakeScript:
+
+    app = "app"
+    utilities = FakeUtilities()
+
+def makeWindow(panels, rows, columns):
+    panelList = []
+    for p in range(panels):
+        top = p * rows * 20
+        cells = []
+        for r in range(rows):
+            for c in range(columns):
+                cells.append(FakeAccessible(
+                    "cell %d.%d.%d" % (p, r, c), pyatspi.ROLE_LABEL,
+                    FakeExtents(c * 60, top + r * 20, 50, 16)))
+        panelList.append(FakeAccessible(
+            "panel %d" % p, pyatspi.ROLE_PANEL,
+            FakeExtents(0, top, columns * 60, rows * 20), cells))
+
+    return FakeAccessible("window", pyatspi.ROLE_FRAME,
+                          FakeExtents(0, 0, columns * 60, panels * rows * 20),
+                          panelList)
+
+def buildContext(window, timeout=0):
+    flat_review.clearZoneCaches()
+    settings.flatReviewTimeout = timeout
+    orca_state.locusOfFocus = window._children[0]._children[0]
+    startTime = time.time()
+    context = flat_review.Context(FakeScript())
+    return context, time.time() - startTime
+
+def linesOf(context):
+    return [[zone.string for zone in line.zones] for line in context.lines]
+
+def main():
+    window = makeWindow(8, 10, 5)
+    ok = True
+
+    context, serial = buildContext(window)
+    expected = linesOf(context)
+    print("No timeout: %.3f sec" % serial)
+
+    timeout = serial / 4
+    context, elapsed = buildContext(window, timeout)
+    zones = sum(len(line) for line in linesOf(context))
+    print("%.3f sec timeout: %.3f sec, timed out: %s, %d of %d zones"
+          % (timeout, elapsed, context.timedOut, zones,
+             sum(len(line) for line in expected)))
+    if not context.timedOut or elapsed > timeout * 2:
+        ok = False
+
+    context, elapsed = buildContext(window)
+    if context.timedOut or linesOf(context) != expected:
+        print("INCOMPLETE LINES after a timeout")
+        ok = False
+
+    settings.flatReviewTimeout = 0
+    flat_review.clearZoneCaches()
+
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Compares the time it takes to evaluate each formatting string in
+formatting.Formatting using the old approach (re-evaluating the string
+every time a generator name is missing) and the compiled approach used
+by generator.Generator.generate.  The generator methods are replaced by
+stubs so only the cost of the formatting engine itself is measured."""
+
+import builtins
+import sys
+import time
+
+from orca import formatting
+from orca import generator
+
+ITERATIONS = 200
+
+def stub(*args, **kwargs):
+    return ['x']
+
+def getGlobals(mode):
+    globalsDict = {'obj': None, 'role': None, 'pyatspi': None}
+    if mode == 'speech':
+        globalsDict['voice'] = lambda *args, **kwargs: []
+    else:
+        for name in ['space', 'Component', 'Region', 'Text', 'Link']:
+            globalsDict[name] = stub
+        globalsDict['asString'] = lambda *args, **kwargs: 'x'
+    return globalsDict
+
+def oldGenerate(evalString, globalsDict, methods):
+    globalsDict = dict(globalsDict)
+    while True:
+        try:
+            return eval(evalString, globalsDict)
+        except NameError as error:
+            arg = error.args[0]
+            arg = arg.replace("name '", "")
+            arg = arg.split("' is not defined")[0]
+            globalsDict[arg] = methods[arg](None)
+
+def newGenerate(evalString, globalsDict, methods):
+    code, names = generator._compileFormatting(evalString)
+    names = frozenset([x for x in names if x not in globalsDict])
+    generated = generator._GeneratedResults(methods, names, None, {})
+    return eval(code, globalsDict, generated)
+
+def timeIt(func, evalString, globalsDict, methods):
+    startTime = time.time()
+    for i in range(ITERATIONS):
+        func(evalString, globalsDict, methods)
+    return (time.time() - startTime) / ITERATIONS
+
+def main():
+    formats = formatting.Formatting(None)
+    totals = {'old': 0.0, 'new': 0.0}
+    for mode in ['speech', 'braille']:
+        globalsDict = getGlobals(mode)
+        for role, formatTypes in sorted(formats[mode].items(),
+                                         key=lambda x: str(x[0])):
+            if role in ['prefix', 'suffix']:
+                continue
+            for formatType in sorted(formatTypes):
+                args = {'mode': mode, 'role': role, 'formatType': formatType}
+                try:
+                    prefix = formats.getPrefix(**args)
+                    suffix = formats.getSuffix(**args)
+                except KeyError:
+                    prefix = suffix = '[]'
+                evalString = '%s + %s + %s' \
+                    % (prefix, formats.getFormat(**args), suffix)
+
+                code, names = generator._compileFormatting(evalString)
+                methods = dict([(x, stub) for x in names
+                                if x not in globalsDict
+                                and x not in vars(builtins)])
+
+                if oldGenerate(evalString, globalsDict, methods) \
+                   != newGenerate(evalString, globalsDict, methods):
+                    print("MISMATCH: %s %s %s" % (mode, role, formatType))
+
+                old = timeIt(oldGenerate, evalString, globalsDict, methods)
+                new = timeIt(newGenerate, evalString, globalsDict, methods)
+                totals['old'] += old
+                totals['new'] += new
+                print("%-8s %-30s %-20s old: %.6fs new: %.6fs (%.1fx)" \
+                      % (mode, role, formatType, old, new, old / new))
+
+    print("\nTOTAL old: %.4fs new: %.4fs (%.1fx)" \
+          % (totals['old'], totals['new'], totals['old'] / totals['new']))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Times KeyBindings.getInputHandler for a stream of keystrokes against a
+set of key bindings the size of the default script's with structural and
+caret navigation: the desktop and laptop keymaps plus bindings for the
+letters, digits and arrows with and without Shift, Control and Alt, each
+for one to three clicks. Checks that it finds the same handlers as the
+original implementation, which tried every key binding for each
+keystroke, and that hasKeyBinding gives the same answers. Keycodes are
+assigned to the keysyms in place of the keyboard's own keymap."""
+
+import functools
+import random
+import sys
+import time
+
+import pyatspi
+
+from orca import desktop_keyboardmap
+from orca import keybindings
+from orca import laptop_keyboardmap
+from orca.keybindings import KeyBinding, KeyBindings
+
+KEYSTROKES = 100000
+
+class FakeHandler:
+
+    def __init__(self, description):
+        self.description = description
+
+    def __repr__(self):
+        return self.description
+
+class FakeKeyboardEvent:
+
+    def __init__(self, hw_code, modifiers, keyval_name, clickCount):
+        self.hw_code = hw_code
+        self.modifiers = modifiers
+        self.keyval_name = keyval_name
+        self._clickCount = clickCount
+
+    def getClickCount(self):
+        return self._clickCount
+
+def referenceGetInputHandler(self, keyboardEvent):
+    """The original implementation."""
+
+    candidates = []
+    clickCount = keyboardEvent.getClickCount()
+    for keyBinding in self.keyBindings:
+        if keyBinding.matches(keyboardEvent.hw_code,
+                              keyboardEvent.modifiers):
+            if keyBinding.modifier_mask == keyboardEvent.modifiers and \
+               keyBinding.click_count == clickCount:
+                return keyBinding.handler
+            if keyBinding.keysymstring:
+                candidates.append(keyBinding)
+
+    if keyboardEvent.modifiers & (1 << pyatspi.MODIFIER_NUMLOCK) \
+        and keyboardEvent.keyval_name.startswith("KP"):
+        return None
+
+    comparison = lambda x, y: y.click_count - x.click_count
+    candidates.sort(key=functools.cmp_to_key(comparison))
+    for candidate in candidates:
+        if candidate.click_count <= clickCount:
+            return candidate.handler
+
+    return None
+
+def referenceHasKeyBinding(self, newKeyBinding, typeOfSearch):
+    """The original implementation, in short."""
+
+    for kb in self.keyBindings:
+        if typeOfSearch == "description":
+            if kb.handler.description == newKeyBinding.handler.description:
+                return True
+        else:
+            attrs = ["keysymstring", "modifiers", "click_count"]
+            if typeOfSearch != "keysNoMask":
+                attrs.append("modifier_mask")
+            if typeOfSearch == "strict" and kb.handler.description \
+               != newKeyBinding.handler.description:
+                continue
+            if all(getattr(kb, attr) == getattr(newKeyBinding, attr)
+                   for attr in attrs):
+                return True
+    return False
+
+MODIFIERS = [keybindings.NO_MODIFIER_MASK,
+             keybindings.SHIFT_MODIFIER_MASK,
+             keybindings.CTRL_MODIFIER_MASK,
+             keybindings.ALT_MODIFIER_MASK,
+             keybindings.ORCA_MODIFIER_MASK,
+             keybindings.ORCA_SHIFT_MODIFIER_MASK,
+             keybindings.ORCA_CTRL_MODIFIER_MASK,
+             1 << pyatspi.MODIFIER_NUMLOCK,
+             keybindings.SHIFT_MODIFIER_MASK | 1 << pyatspi.MODIFIER_NUMLOCK]
+
+KEYSYMS = list("abcdefghijklmnopqrstuvwxyz0123456789") \
+    + ["Up", "Down", "Left", "Right", "Home", "End", "Page_Up", "Page_Down"]
+
+def makeBindings():
+    handlers = {}
+    bindings = KeyBindings()
+    for keymap in [desktop_keyboardmap.keymap, laptop_keyboardmap.keymap]:
+        for entry in keymap:
+            handler = handlers.setdefault(entry[3], FakeHandler(entry[3]))
+            clickCount = entry[4] if len(entry) > 4 else 1
+            bindings.add(KeyBinding(entry[0], entry[1], entry[2], handler,
+                                    clickCount))
+
+    for keysym in KEYSYMS:
+        for modifiers in MODIFIERS[:4]:
+            for clickCount in [1, 2, 3]:
+                if keysym.isdigit() and clickCount > 1:
+                    continue
+                name = "%s-%d-%d" % (keysym, modifiers, clickCount)
+                bindings.add(KeyBinding(
+                    keysym, keybindings.defaultModifierMask, modifiers,
+                    FakeHandler(name), clickCount))
+
+    return bindings
+
+def assignKeycodes(bindings):
+    keysyms = sorted(set(kb.keysymstring for kb in bindings.keyBindings
+                         if kb.keysymstring))
+    for i, keysym in enumerate(keysyms):
+        keybindings._keycodeCache[keysym] = 10 + i
+    return keysyms
+
+def run(getInputHandler, bindings, events):
+    startTime = time.time()
+    results = [getInputHandler(bindings, event) for event in events]
+    return results, (time.time() - startTime) / len(events)
+
+def main():
+    bindings = makeBindings()
+    keysyms = assignKeycodes(bindings)
+    rand = random.Random(0)
+    events = []
+    for i in range(KEYSTROKES):
+        keysym = rand.choice(keysyms)
+        events.append(FakeKeyboardEvent(
+            keybindings._keycodeCache[keysym], rand.choice(MODIFIERS),
+            keysym, rand.choice([1, 1, 1, 2, 3])))
+
+    expected, before = run(referenceGetInputHandler, bindings, events)
+    actual, after = run(KeyBindings.getInputHandler, bindings, events)
+
+    print("%d key bindings, %d keystrokes"
+          % (len(bindings.keyBindings), len(events)))
+    print("  before: %.2f usec per keystroke" % (before * 1000000))
+    print("  after:  %.2f usec per keystroke" % (after * 1000000))
+
+    ok = actual == expected
+    if not ok:
+        print("WRONG HANDLERS")
+
+    probes = [KeyBinding(rand.choice(keysyms), rand.choice(MODIFIERS),
+                         rand.choice(MODIFIERS), rand.choice(
+                             bindings.keyBindings).handler,
+                         rand.choice([1, 2, 3]))
+              for i in range(2000)]
+    probes.extend(rand.sample(bindings.keyBindings, 200))
+    for typeOfSearch in ["strict", "description", "keys", "keysNoMask"]:
+        for probe in probes:
+            if bindings.hasKeyBinding(probe, typeOfSearch) \
+               != referenceHasKeyBinding(bindings, probe, typeOfSearch):
+                print("WRONG hasKeyBinding (%s)" % typeOfSearch)
+                ok = False
+                break
+
+    bindings.removeByHandler(expected[0])
+    expected, before = run(referenceGetInputHandler, bindings, events[:1000])
+    actual, after = run(KeyBindings.getInputHandler, bindings, events[:1000])
+    if actual != expected:
+        print("WRONG HANDLERS after removing a handler")
+        ok = False
+
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
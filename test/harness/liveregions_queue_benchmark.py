@@ -0,0 +1,188 @@
+"""Floods the live region message queue with updates from a few busy
+regions, as a chat, a stock ticker and a build log would, presenting one
+message every PUMP_INTERVAL seconds of simulated time, and reports how
+long the queue grows, how old the presented messages are and how long
+the queue operations take, for the original sorted list and for the heap.
+Also checks the order of the messages, combining, superseding, purging
+and rate limits."""
+
+import bisect
+import sys
+import time
+
+from orca import liveregions
+from orca.liveregions import LIVE_POLITE, LIVE_ASSERTIVE, LIVE_RUDE
+
+REGIONS = ["chat", "ticker", "log"]
+UPDATES_PER_SECOND = 50
+SECONDS = 60
+PUMP_INTERVAL = 0.1
+
+class ReferenceQueue:
+    """The original implementation."""
+
+    def __init__(self):
+        self.queue = []
+
+    def enqueue(self, data, priority, obj, combine=False):
+        bisect.insort_left(self.queue, (priority, now(), data, obj))
+
+    def dequeue(self):
+        return self.queue.pop(0)
+
+    def clear(self):
+        self.queue = []
+
+    def purgeByKeepAlive(self):
+        currenttime = now()
+        myfilter = lambda x: x[1] + liveregions.MSG_KEEPALIVE_TIME > currenttime
+        self.queue = list(filter(myfilter, self.queue))
+
+    def purgeByPriority(self, priority):
+        myfilter = lambda x: x[0] > priority
+        self.queue = list(filter(myfilter, self.queue))
+
+    def __len__(self):
+        return len(self.queue)
+
+class Clock:
+    """Simulated time, so the flood does not take SECONDS to run."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+clock = Clock()
+now = clock.time
+
+def message(text):
+    return {'content': [text], 'labels': [""]}
+
+def flood(queue):
+    """Returns the largest length of the queue, the mean and largest age
+    of the presented messages and the time spent in the queue."""
+
+    maxLength = 0
+    ages = []
+    elapsed = 0.0
+    step = 1.0 / UPDATES_PER_SECOND
+    nextPump = clock.now + PUMP_INTERVAL
+    count = 0
+    end = clock.now + SECONDS
+    while clock.now < end:
+        region = REGIONS[count % len(REGIONS)]
+        startTime = time.time()
+        queue.enqueue(message("%s %d" % (region, count)), LIVE_POLITE, region,
+                      True)
+        elapsed += time.time() - startTime
+        count += 1
+        clock.now += step
+        maxLength = max(maxLength, len(queue))
+        if clock.now >= nextPump:
+            nextPump += PUMP_INTERVAL
+            startTime = time.time()
+            queue.purgeByKeepAlive()
+            queued = queue.dequeue() if len(queue) else None
+            elapsed += time.time() - startTime
+            if queued:
+                ages.append(clock.now - queued[1])
+
+    return maxLength, sum(ages) / len(ages), max(ages), elapsed
+
+def check():
+    """Returns a list of the problems found."""
+
+    problems = []
+    queue = liveregions.PriorityQueue()
+
+    queue.enqueue(message("polite 1"), LIVE_POLITE, "a")
+    queue.enqueue(message("rude"), LIVE_RUDE, "b")
+    queue.enqueue(message("polite 2"), LIVE_POLITE, "c")
+    queue.enqueue(message("assertive"), LIVE_ASSERTIVE, "d")
+    order = [queue.dequeue()[2]['content'][0] for i in range(len(queue))]
+    if order != ["rude", "assertive", "polite 1", "polite 2"]:
+        problems.append("wrong order: %s" % order)
+    if queue.dequeue() is not None:
+        problems.append("dequeue from an empty queue")
+
+    queue.enqueue(message("one"), LIVE_POLITE, "a", True)
+    queue.enqueue(message("other"), LIVE_POLITE, "b", True)
+    queue.enqueue(message("two"), LIVE_POLITE, "a", True)
+    if len(queue) != 2 or queue.dequeue()[2]['content'] != ["one", "two"] \
+       or queue.dequeue()[2]['content'] != ["other"]:
+        problems.append("updates not combined in place")
+
+    for i in range(liveregions.MSG_COMBINE_LIMIT + 5):
+        queue.enqueue(message("update %d" % i), LIVE_POLITE, "a", True)
+    expected = ["update %d" % i
+                for i in range(5, liveregions.MSG_COMBINE_LIMIT + 5)]
+    if len(queue) != 1 or queue.dequeue()[2]['content'] != expected:
+        problems.append("combined updates not limited")
+
+    queue.enqueue(message("stale"), LIVE_POLITE, "a", True)
+    clock.now += liveregions.MSG_KEEPALIVE_TIME + 1
+    queue.enqueue(message("staler"), LIVE_POLITE, "a", True)
+    queue.purgeByKeepAlive()
+    if len(queue):
+        problems.append("combined message not purged")
+
+    queue.enqueue(message("old"), LIVE_POLITE, "a")
+    queue.enqueue(message("new"), LIVE_POLITE, "a")
+    if len(queue) != 1 or queue.dequeue()[2]['content'] != ["new"]:
+        problems.append("update not superseded")
+
+    queue.enqueue(message("stale"), LIVE_POLITE, "a")
+    clock.now += liveregions.MSG_KEEPALIVE_TIME + 1
+    queue.enqueue(message("fresh"), LIVE_POLITE, "b")
+    queue.purgeByKeepAlive()
+    if len(queue) != 1 or queue.dequeue()[2]['content'] != ["fresh"]:
+        problems.append("stale message not purged")
+
+    queue.enqueue(message("polite"), LIVE_POLITE, "a")
+    queue.enqueue(message("assertive"), LIVE_ASSERTIVE, "b")
+    queue.enqueue(message("rude"), LIVE_RUDE, "c")
+    queue.purgeByPriority(LIVE_ASSERTIVE)
+    if len(queue) != 1 or queue.dequeue()[2]['content'] != ["rude"]:
+        problems.append("wrong messages purged by priority")
+
+    queue.setRateLimit("a", 2)
+    queue.enqueue(message("first"), LIVE_POLITE, "a", True)
+    queue.dequeue()
+    queue.enqueue(message("second"), LIVE_POLITE, "a", True)
+    queue.enqueue(message("third"), LIVE_POLITE, "a", True)
+    queue.enqueue(message("other"), LIVE_POLITE, "b", True)
+    if queue.dequeue()[2]['content'] != ["other"] \
+       or queue.dequeue() is not None:
+        problems.append("rate limit not respected")
+    clock.now += 2
+    queued = queue.dequeue()
+    if not queued or queued[2]['content'] != ["second", "third"]:
+        problems.append("rate limited updates not combined")
+    queue.setRateLimit("a", None)
+
+    return problems
+
+def main():
+    liveregions.time = clock
+
+    problems = check()
+    for problem in problems:
+        print(problem.upper())
+
+    print("%d updates per second from %d regions for %d seconds, "
+          "one message presented every %.1f seconds"
+          % (UPDATES_PER_SECOND, len(REGIONS), SECONDS, PUMP_INTERVAL))
+    for name, queue in [("before", ReferenceQueue()),
+                        ("after", liveregions.PriorityQueue())]:
+        maxLength, meanAge, maxAge, elapsed = flood(queue)
+        print("  %s: longest queue %d, age of messages: mean %.1f sec, "
+              "max %.1f sec, %.3f sec in the queue"
+              % (name, maxLength, meanAge, maxAge, elapsed))
+
+    print("Result: %s" % ("FAILED" if problems else "OK"))
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
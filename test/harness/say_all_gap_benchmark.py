@@ -0,0 +1,199 @@
+"""Measures the silence between the utterances of a say all spoken by a
+fake speech server, whose synthesizer speaks each utterance for
+SPEAKING_TIME seconds in its own thread, when each utterance takes
+GENERATION_TIME seconds to generate, for several values of
+settings.sayAllLookahead.  Checks that every utterance is spoken once and
+in order, with a PROGRESS and a COMPLETED update for each, and that
+stopping speech in the middle of the say all gives a single INTERRUPTED
+update, for the utterance being spoken, after which nothing is spoken."""
+
+import collections
+import sys
+import threading
+import time
+
+from gi.repository import GLib
+
+from orca import speechserver
+
+UTTERANCES = 20
+SPEAKING_TIME = 0.1
+GENERATION_TIME = 0.03
+LOOKAHEADS = [0, 1, 2, 4]
+
+BEGIN = "begin"
+END = "end"
+CANCEL = "cancel"
+
+class FakeSynthesizer:
+    """Speaks the queued utterances one after another in a thread, calling
+    the callback of each one from that thread, like Speech Dispatcher."""
+
+    def __init__(self):
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._cancelled = False
+        self.spoken = []
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def speak(self, text, callback):
+        with self._condition:
+            self._queue.append((text, callback))
+            self._condition.notify()
+
+    def cancel(self):
+        with self._condition:
+            discarded = list(self._queue)
+            self._queue.clear()
+            self._cancelled = True
+            self._condition.notify()
+
+        for text, callback in discarded:
+            callback(CANCEL)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue)
+                text, callback = self._queue.popleft()
+                self._cancelled = False
+
+            start = time.time()
+            callback(BEGIN)
+            with self._condition:
+                cancelled = self._condition.wait_for(
+                    lambda: self._cancelled, SPEAKING_TIME)
+            self.spoken.append((text, start, time.time()))
+            callback(CANCEL if cancelled else END)
+
+class FakeSpeechServer(speechserver.SpeechServer):
+
+    _CALLBACK_TYPE_MAP = {
+        BEGIN: speechserver.SayAllContext.PROGRESS,
+        CANCEL: speechserver.SayAllContext.INTERRUPTED,
+        END: speechserver.SayAllContext.COMPLETED,
+    }
+
+    def __init__(self, lookahead):
+        self._synthesizer = FakeSynthesizer()
+        self._lookahead = lookahead
+        self._pipeline = None
+
+    def _say_all(self, iterator, orca_callback):
+        if self._pipeline:
+            self._pipeline.stop()
+        pipeline = speechserver.SayAllPipeline(
+            iterator, orca_callback,
+            lambda context, acss: self._queue_say_all(pipeline, context),
+            self._lookahead)
+        self._pipeline = pipeline
+        pipeline.start()
+        return False
+
+    def _queue_say_all(self, pipeline, context):
+        def callback(callbackType):
+            t = self._CALLBACK_TYPE_MAP[callbackType]
+            GLib.idle_add(pipeline.progress, context, t)
+        self._synthesizer.speak(context.utterance, callback)
+
+    def sayAll(self, utteranceIterator, progressCallback):
+        GLib.idle_add(self._say_all, utteranceIterator, progressCallback)
+
+    def stop(self):
+        if self._pipeline:
+            self._pipeline.cancel()
+        self._synthesizer.cancel()
+
+def textLines(generated):
+    for i in range(UTTERANCES):
+        time.sleep(GENERATION_TIME)
+        context = speechserver.SayAllContext(
+            None, "line %d" % i, i * 10, i * 10 + 9)
+        generated.append(context)
+        yield [context, None]
+
+def sayAll(lookahead, stopAfter=None):
+    """Runs a say all to the end, or until stopAfter seconds, and returns
+    the contexts generated, the progress updates and what was spoken."""
+
+    server = FakeSpeechServer(lookahead)
+    loop = GLib.MainLoop()
+    generated = []
+    updates = []
+
+    def progressCallback(context, progressType):
+        updates.append((context, progressType))
+        if progressType == speechserver.SayAllContext.INTERRUPTED \
+           or (progressType == speechserver.SayAllContext.COMPLETED
+               and context.utterance == "line %d" % (UTTERANCES - 1)):
+            # Wait a little for anything which should not happen.
+            GLib.timeout_add(int(SPEAKING_TIME * 3000), loop.quit)
+
+    def stop():
+        server.stop()
+        return False
+
+    if stopAfter:
+        GLib.timeout_add(int(stopAfter * 1000), stop)
+    server.sayAll(textLines(generated), progressCallback)
+    loop.run()
+    return generated, updates, server._synthesizer.spoken
+
+def checkCompleted(generated, updates, spoken):
+    expected = ["line %d" % i for i in range(UTTERANCES)]
+    if [context.utterance for context in generated] != expected \
+       or [text for text, start, end in spoken] != expected:
+        return False
+
+    expected = []
+    for context in generated:
+        expected.append((context, speechserver.SayAllContext.PROGRESS))
+        expected.append((context, speechserver.SayAllContext.COMPLETED))
+    return updates == expected
+
+def checkInterrupted(generated, updates, spoken, lookahead):
+    interrupted = [context for context, progressType in updates
+                   if progressType == speechserver.SayAllContext.INTERRUPTED]
+    if len(interrupted) != 1 or updates[-1][0] is not interrupted[0]:
+        return False
+
+    # The interrupted utterance is the last one heard, and no more than
+    # lookahead utterances were generated after it.
+    #
+    if spoken[-1][0] != interrupted[0].utterance:
+        return False
+
+    return len(generated) <= len(spoken) + lookahead
+
+def main():
+    ok = True
+    print("%d utterances, %.3f sec to speak, %.3f sec to generate each"
+          % (UTTERANCES, SPEAKING_TIME, GENERATION_TIME))
+
+    for lookahead in LOOKAHEADS:
+        startTime = time.time()
+        generated, updates, spoken = sayAll(lookahead)
+        if not checkCompleted(generated, updates, spoken):
+            print("WRONG UTTERANCES OR UPDATES with lookahead %d" % lookahead)
+            ok = False
+            continue
+
+        gaps = [spoken[i + 1][1] - spoken[i][2]
+                for i in range(len(spoken) - 1)]
+        print("lookahead %d: gaps: mean %.1f msec, max %.1f msec"
+              % (lookahead, 1000 * sum(gaps) / len(gaps), 1000 * max(gaps)))
+
+    for lookahead in LOOKAHEADS:
+        stopAfter = (SPEAKING_TIME + GENERATION_TIME) * UTTERANCES / 3
+        generated, updates, spoken = sayAll(lookahead, stopAfter)
+        if not checkInterrupted(generated, updates, spoken, lookahead):
+            print("WRONG INTERRUPTION with lookahead %d" % lookahead)
+            ok = False
+
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
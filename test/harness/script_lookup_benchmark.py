@@ -0,0 +1,176 @@
+"""Checks that ScriptManager.getModuleName maps application names to the
+same script modules as the original implementation, which lowercased and
+scanned the alternative names, app modules and toolkit modules for each
+application, and times ScriptManager.getScript for a stream of events
+from the objects of a few applications, some of which use a different
+toolkit than their application. Each attributes request on the fake
+objects is counted as a round trip to the application."""
+
+import random
+import sys
+import time
+
+from orca import script_manager
+
+EVENTS = 100000
+OBJECTS = 300
+
+roundTrips = 0
+
+def referenceGetModuleName(self, app):
+    """The original implementation, without the debug output."""
+
+    try:
+        appAndNameExist = app != None and app.name != ''
+    except (LookupError, RuntimeError):
+        appAndNameExist = False
+
+    if not appAndNameExist:
+        return None
+
+    name = app.name.split('.')[0]
+    altNames = list(self._appNames.keys())
+
+    names = [n for n in altNames if n.lower() == name.lower()]
+    if names:
+        name = self._appNames.get(names[0])
+    else:
+        for nameList in (self._appModules, self._toolkitModules):
+            names = [n for n in nameList if n.lower() == name.lower()]
+            if names:
+                name = names[0]
+                break
+
+    return name
+
+def referenceToolkitForObject(obj):
+    """The original implementation of _toolkitForObject."""
+
+    name = ''
+    if obj:
+        try:
+            attributes = obj.getAttributes()
+        except (LookupError, RuntimeError):
+            pass
+        else:
+            attrs = dict([attr.split(':', 1) for attr in attributes])
+            name = attrs.get('toolkit', '')
+
+    return name
+
+def referenceGetScript(self, app, obj=None):
+    """The original implementation of getScript, which asked for the
+    toolkit of obj for each event."""
+
+    toolkitScript = None
+    objToolkit = referenceToolkitForObject(obj)
+    if objToolkit:
+        toolkitScripts = self.toolkitScripts.get(app, {})
+        toolkitScript = toolkitScripts.get(objToolkit)
+        if not toolkitScript:
+            toolkitScript = self._createScript(app, obj)
+            toolkitScripts[objToolkit] = toolkitScript
+        self.toolkitScripts[app] = toolkitScripts
+
+    if app in self.appScripts:
+        appScript = self.appScripts[app]
+    else:
+        appScript = self._createScript(app, None)
+        self.appScripts[app] = appScript
+
+    if toolkitScript \
+       and not issubclass(appScript.__class__, toolkitScript.__class__):
+        return toolkitScript
+
+    return appScript
+
+class FakeApp:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+class FakeAccessible:
+
+    def __init__(self, toolkit):
+        self._toolkit = toolkit
+
+    def getAttributes(self):
+        global roundTrips
+        roundTrips += 1
+        if self._toolkit:
+            return ["toolkit:%s" % self._toolkit, "tag:div"]
+        return []
+
+class FakeScript:
+
+    def __init__(self, app, name):
+        self.app = app
+        self.name = name
+
+class FakeScriptManager(script_manager.ScriptManager):
+    """Creates a FakeScript instead of importing the script module."""
+
+    def _createScript(self, app, obj=None):
+        name = self.getModuleName(app) or referenceToolkitForObject(obj) \
+            or 'default'
+        return FakeScript(app, name)
+
+def makeNames(rand):
+    manager = script_manager.getManager()
+    names = list(manager._appNames.keys()) + list(manager._appModules) \
+        + list(manager._toolkitModules) + ["unknown-app", "soffice.bin",
+                                           "accerciser.py", ""]
+    variants = []
+    for name in names:
+        variants.append(name)
+        variants.append(name.lower())
+        variants.append(name.upper())
+        variants.append("".join(rand.choice([c.lower(), c.upper()])
+                                for c in name))
+    return variants
+
+def main():
+    global roundTrips
+    rand = random.Random(0)
+    manager = FakeScriptManager()
+
+    ok = True
+    for name in makeNames(rand):
+        app = FakeApp(name)
+        expected = referenceGetModuleName(manager, app)
+        if manager.getModuleName(app) != expected:
+            print("MISMATCH for %r: expected %r, got %r"
+                  % (name, expected, manager.getModuleName(app)))
+            ok = False
+
+    apps = [FakeApp(name) for name in ["Firefox", "gedit", "evolution"]]
+    objects = [(rand.choice(apps),
+                FakeAccessible(rand.choice(["", "", "Gecko", "WebKitGtk"])))
+               for i in range(OBJECTS)]
+    events = [rand.choice(objects) for i in range(EVENTS)]
+
+    print("%d events from %d objects in %d apps" % (EVENTS, OBJECTS, len(apps)))
+    results = {}
+    for name, getScript in [("before", referenceGetScript),
+                            ("after", script_manager.ScriptManager.getScript)]:
+        manager = FakeScriptManager()
+        roundTrips = 0
+        startTime = time.time()
+        results[name] = [getScript(manager, app, obj) for app, obj in events]
+        elapsed = time.time() - startTime
+        print("  %-7s %.3f sec, %d round trips"
+              % (name + ":", elapsed, roundTrips))
+
+    scripts = [(script.app, script.name) for script in results["before"]]
+    if [(script.app, script.name) for script in results["after"]] != scripts:
+        print("WRONG SCRIPTS")
+        ok = False
+
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
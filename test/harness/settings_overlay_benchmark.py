@@ -0,0 +1,174 @@
+"""Times SettingsManager.loadAppSettings, which is called whenever the
+user switches to another application, against the original
+implementation, which set every setting, rebuilt the pronunciation
+dictionary and rebuilt and overrode the key bindings of the script for
+each switch. A few of the applications have their own general settings,
+pronunciations and key bindings. Checks after each switch that the
+settings, the pronunciation dictionary and the key bindings of the
+script are the same as with the original implementation, including after
+the default voice is changed in place, as changing the speech rate does,
+after a setting is set with setSetting and after one is assigned to
+directly, as toggling contracted braille does."""
+
+import copy
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from orca import input_event
+from orca import keybindings
+from orca import pronunciation_dict
+from orca import settings
+from orca import settings_manager
+
+SWITCHES = 2000
+APPS = ["gedit", "Firefox", "gnome-terminal", "evolution", "pidgin",
+        "nautilus", "empathy", "libreoffice"]
+HANDLERS = 300
+
+class ReferenceSettingsManager(settings_manager.SettingsManager):
+
+    def loadAppSettings(self, script):
+        """The original implementation."""
+
+        if not (script and script.app):
+            return
+
+        for key in self._appPronunciations.keys():
+            self.pronunciations.pop(key)
+
+        prefs = self._backend.getAppSettings(script.app.name)
+        profiles = prefs.get('profiles', {})
+        profilePrefs = profiles.get(self.profile, {})
+
+        self._appGeneral = profilePrefs.get('general', {})
+        self._appKeybindings = profilePrefs.get('keybindings', {})
+        self._appPronunciations = profilePrefs.get('pronunciations', {})
+        self._activeApp = script.app.name
+
+        self._loadProfileSettings()
+        self._mergeSettings()
+        self._setSettingsRuntime(self.general)
+        self._setPronunciationsRuntime(self.pronunciations)
+        script.keyBindings = self.overrideKeyBindings(script, script.getKeyBindings())
+
+class FakeApp:
+
+    def __init__(self, name):
+        self.name = name
+
+class FakeScript:
+    """Has bindings for HANDLERS input event handlers, which it builds and
+    lets the settings manager override each time they are asked for, as
+    the default script does."""
+
+    def __init__(self, app, manager):
+        self.app = app
+        self.manager = manager
+        self.inputEventHandlers = {}
+        for i in range(HANDLERS):
+            name = "handler%d" % i
+            self.inputEventHandlers[name] = \
+                input_event.InputEventHandler(None, name)
+        self.keyBindings = None
+
+    def getKeyBindings(self):
+        bindings = keybindings.KeyBindings()
+        for i in range(HANDLERS):
+            handler = self.inputEventHandlers["handler%d" % i]
+            bindings.add(keybindings.KeyBinding(
+                "F%d" % (i % 12 + 1), keybindings.defaultModifierMask,
+                i % 5, handler, i % 3 + 1))
+        return self.manager.overrideKeyBindings(self, bindings)
+
+def makePrefsDir(rand):
+    prefsDir = tempfile.mkdtemp()
+    voices = settings.voices
+    manager = settings_manager.SettingsManager()
+    manager.activate(prefsDir)
+    settings.voices = voices
+    manager._backend.saveProfileSettings(
+        'default',
+        {'profile': ['Default', 'default'], 'enableEchoByWord': True,
+         'voices': {settings.DEFAULT_VOICE: {'rate': 70},
+                    settings.UPPERCASE_VOICE: {'average-pitch': 7},
+                    settings.HYPERLINK_VOICE: {}}},
+        {'GNOME': ['GNOME', 'guh nome'], 'SQL': ['SQL', 'sequel']},
+        {'handler1': [['F1', '0', '0', '1']]})
+
+    for appName in APPS[:4]:
+        general = {'enableKeyEcho': rand.choice([True, False]),
+                   'verbalizePunctuationStyle': rand.choice([0, 1, 2, 3]),
+                   'speakNumbersAsDigits': rand.choice([True, False])}
+        pronunciations = {appName.lower(): [appName.lower(), "the app"]}
+        bindings = {"handler%d" % rand.randrange(HANDLERS):
+                    [["F%d" % rand.randrange(1, 13), '0', '0', '1']]
+                    for i in range(3)}
+        manager._backend.saveAppSettings(appName, 'default', general,
+                                         pronunciations, bindings)
+    return prefsDir
+
+def snapshot(script):
+    values = {key: copy.deepcopy(getattr(settings, key, None))
+              for key in settings.userCustomizableSettings}
+    bindings = [(kb.keysymstring, kb.modifier_mask, kb.modifiers,
+                 kb.click_count, kb.handler.description)
+                for kb in script.keyBindings.keyBindings]
+    return values, dict(pronunciation_dict.pronunciation_dict), bindings
+
+def run(manager, sequence):
+    scripts = {appName: FakeScript(FakeApp(appName), manager)
+               for appName in APPS}
+    results = []
+    elapsed = 0.0
+    for i, appName in enumerate(sequence):
+        if i % 100 == 50:
+            settings.voices[settings.DEFAULT_VOICE]['rate'] = 99
+        if i % 100 == 75:
+            manager.setSetting('enableKeyEcho', None)
+        if i % 100 == 90:
+            settings.enableContractedBraille = \
+                not settings.enableContractedBraille
+        startTime = time.time()
+        manager.loadAppSettings(scripts[appName])
+        elapsed += time.time() - startTime
+        results.append(snapshot(scripts[appName]))
+    return results, elapsed / len(sequence)
+
+def main():
+    rand = random.Random(0)
+    prefsDir = makePrefsDir(rand)
+    sequence = [rand.choice(APPS) for i in range(SWITCHES)]
+    try:
+        reference = ReferenceSettingsManager()
+        reference.activate(prefsDir)
+        expected, before = run(reference, sequence)
+
+        manager = settings_manager.SettingsManager()
+        manager.activate(prefsDir)
+        actual, after = run(manager, sequence)
+    finally:
+        shutil.rmtree(prefsDir)
+
+    print("%d switches between %d apps" % (SWITCHES, len(APPS)))
+    print("  before: %.3f msec per switch" % (before * 1000))
+    print("  after:  %.3f msec per switch" % (after * 1000))
+
+    ok = True
+    for i, (old, new) in enumerate(zip(expected, actual)):
+        for name, oldPart, newPart in zip(
+                ["settings", "pronunciations", "key bindings"], old, new):
+            if oldPart != newPart:
+                print("DIFFERENT %s after switch %d to %s"
+                      % (name, i, sequence[i]))
+                ok = False
+        if not ok:
+            break
+
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
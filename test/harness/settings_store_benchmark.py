@@ -0,0 +1,182 @@
+"""Times the settings reads made when switching to an application (its
+app settings, the general settings, pronunciations and key bindings of
+the profile, and an app setting) with the JSON backend, against the
+original backend, which opened and parsed the settings files for each of
+them, and checks that both return the same settings. Also checks that
+changing the settings returned does not change those read later, that a
+settings file changed by someone else is read again, that settings are
+written atomically, and that changes made while the main loop is running
+are written once they stop coming."""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from gi.repository import GLib
+
+from orca import settings
+from orca.backends import json_backend
+
+SWITCHES = 2000
+APPS = ["gedit", "Firefox", "gnome-terminal", "evolution", "pidgin"]
+
+class ReferenceBackend(json_backend.Backend):
+    """The original implementation of the methods used when switching to
+    an application."""
+
+    def getAppSettings(self, appName):
+        fileName = os.path.join(self.appPrefsDir, "%s.conf" % appName)
+        if os.path.exists(fileName):
+            settingsFile = open(fileName, 'r')
+            prefs = json.load(settingsFile)
+            settingsFile.close()
+        else:
+            prefs = {}
+
+        return prefs
+
+    def _getSettings(self):
+        settingsFile = open(self.settingsFile)
+        try:
+            prefs = json.load(settingsFile)
+        except ValueError:
+            return
+        self.general = prefs['general'].copy()
+        self.pronunciations = prefs['pronunciations']
+        self.keybindings = prefs['keybindings']
+        self.profiles = prefs['profiles'].copy()
+
+def makePrefsDir():
+    """Returns a preferences directory with default settings, a profile
+    which changes some of them and settings for some of the apps."""
+
+    prefsDir = tempfile.mkdtemp()
+    os.mkdir(os.path.join(prefsDir, "app-settings"))
+    general = {}
+    for key in settings.userCustomizableSettings:
+        general[key] = getattr(settings, key, None)
+    general = json.loads(json.dumps(general))
+
+    backend = json_backend.Backend(prefsDir)
+    backend.saveDefaultSettings(general, {}, {})
+    backend.saveProfileSettings(
+        'default',
+        {'profile': ['Default', 'default'], 'enableEchoByWord': True,
+         'voices': {'default': {'rate': 70, 'family': {'name': 'english'}}}},
+        {'GNOME': ['GNOME', 'guh nome']},
+        {'sayAllHandler': [['KP_Add', '0', '0', '1']]})
+    for appName in APPS[:3]:
+        backend.saveAppSettings(appName, 'default',
+                                {'enableKeyEcho': False, 'verbalizePunctuationStyle': 1},
+                                {}, {})
+    return prefsDir
+
+def switchToApp(backend, appName):
+    """Makes the reads settings_manager makes when the user switches to
+    appName, and returns what they returned."""
+
+    return [backend.getAppSettings(appName),
+            backend.getGeneral('default'),
+            backend.getPronunciations('default'),
+            backend.getKeybindings('default'),
+            backend.getGeneral('default').get('enableKeyEcho')]
+
+def run(backend):
+    startTime = time.time()
+    results = [switchToApp(backend, APPS[i % len(APPS)])
+               for i in range(SWITCHES)]
+    return results, (time.time() - startTime) / SWITCHES
+
+def checkCopies(backend, prefsDir):
+    """Returns True if changing the settings returned by one read does
+    not change what later reads return."""
+
+    expected = switchToApp(backend, APPS[0])
+    for result in switchToApp(backend, APPS[0])[:4]:
+        for value in result.values():
+            if isinstance(value, dict):
+                value.clear()
+            elif isinstance(value, list):
+                value.append(None)
+    return switchToApp(backend, APPS[0]) == expected
+
+def checkExternalChange(backend, prefsDir):
+    backend.getGeneral('default')
+    fileName = os.path.join(prefsDir, "user-settings.conf")
+    with open(fileName) as settingsFile:
+        prefs = json.load(settingsFile)
+    prefs['general']['enableSpeech'] = False
+    with open(fileName, 'w') as settingsFile:
+        json.dump(prefs, settingsFile)
+    return backend.getGeneral('default')['enableSpeech'] is False
+
+def checkAtomicWrite(backend, prefsDir):
+    backend._setProfileKey('startingProfile', ['Other', 'other'])
+    fileName = os.path.join(prefsDir, "user-settings.conf")
+    with open(fileName) as settingsFile:
+        prefs = json.load(settingsFile)
+    return prefs['general']['startingProfile'] == ['Other', 'other'] \
+        and sorted(os.listdir(prefsDir)) == ["app-settings", "user-settings.conf"]
+
+def checkDebouncedWrites(backend, prefsDir):
+    """Changes a setting five times while the main loop runs. Returns True
+    if each change can be read at once and the file is written once."""
+
+    writes = []
+    replace = os.replace
+    def countingReplace(src, dst):
+        writes.append(dst)
+        replace(src, dst)
+    os.replace = countingReplace
+
+    loop = GLib.MainLoop()
+    readBack = []
+    def change():
+        for i in range(5):
+            backend._setProfileKey('sayAllStyle', i)
+            readBack.append(backend.getGeneral('default')['sayAllStyle'])
+        GLib.timeout_add(json_backend.WRITE_DELAY * 3, loop.quit)
+        return False
+
+    GLib.idle_add(change)
+    loop.run()
+    os.replace = replace
+
+    fileName = os.path.join(prefsDir, "user-settings.conf")
+    with open(fileName) as settingsFile:
+        prefs = json.load(settingsFile)
+    return readBack == list(range(5)) and len(writes) == 1 \
+        and prefs['general']['sayAllStyle'] == 4
+
+def main():
+    prefsDir = makePrefsDir()
+    ok = True
+    try:
+        expected, before = run(ReferenceBackend(prefsDir))
+        actual, after = run(json_backend.Backend(prefsDir))
+        print("%d app switches" % SWITCHES)
+        print("  before: %.3f msec per switch" % (before * 1000))
+        print("  after:  %.3f msec per switch" % (after * 1000))
+        if actual != expected:
+            print("DIFFERENT SETTINGS")
+            ok = False
+
+        backend = json_backend.Backend(prefsDir)
+        for name, check in [("copies", checkCopies),
+                            ("external change", checkExternalChange),
+                            ("atomic write", checkAtomicWrite),
+                            ("debounced writes", checkDebouncedWrites)]:
+            if not check(backend, prefsDir):
+                print("FAILED: %s" % name)
+                ok = False
+    finally:
+        shutil.rmtree(prefsDir)
+
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
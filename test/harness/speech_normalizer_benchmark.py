@@ -0,0 +1,210 @@
+"""Checks that speech_normalizer adjusts synthetic lines of text (words,
+punctuation, math symbols, combining characters, subscripts and
+superscripts, and words in the pronunciation dictionary) for speech the
+same way as the original chain of passes, which made one re.sub per
+distinct symbol or run found, and times both over a long document, cold
+and with the role names and labels of a typical page repeated."""
+
+import random
+import re
+import sys
+import time
+
+from orca import chnames
+from orca import mathsymbols
+from orca import messages
+from orca import orca_state
+from orca import pronunciation_dict
+from orca import punctuation_settings
+from orca import settings
+from orca import speech_normalizer
+from orca.script_utilities import Utilities
+
+LINES = 5000
+
+PUNCTUATION = re.compile('[^\w\s]', re.UNICODE)
+ELLIPSIS = re.compile('(\342\200\246|\.\.\.\s*)')
+
+WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog",
+         "Orca", "GNOME", "accessible", "x", "y", "n"]
+SYMBOLS = [",", ".", "!", "?", ";", ":", "(", ")", "←", "→",
+           "•", "½", "✓", "⁺", "₋", "..."]
+MATH = ["∀", "∃", "∈", "∑", "√", "≤", "<", "^",
+        "⋅", "⨯", "△", "ℂ", "ℝ", "↛",
+        "x̸", "=⃒"]
+ROLE_NAMES = ["push button", "link", "heading level 2", "list item",
+              "check box not checked", "Search", "Home", "Sign in"]
+
+class MathUtilities(Utilities):
+
+    def speakMathSymbolNames(self, obj=None):
+        return True
+
+class FakeScript:
+
+    def __init__(self):
+        self.utilities = MathUtilities(self)
+
+def referenceAddVerbalizedPunctuation(oldText):
+    spokenEllipsis = messages.SPOKEN_ELLIPSIS + " "
+    newText = re.sub(ELLIPSIS, spokenEllipsis, oldText)
+    symbols = set(re.findall(PUNCTUATION, newText))
+    for symbol in symbols:
+        try:
+            level, action = punctuation_settings.getPunctuationInfo(symbol)
+        except:
+            continue
+
+        if level != punctuation_settings.LEVEL_NONE:
+            continue
+
+        charName = " %s " % chnames.getCharacterName(symbol)
+        if action == punctuation_settings.PUNCTUATION_INSERT:
+            charName += symbol
+        newText = re.sub(symbol, charName, newText)
+
+    return referenceAdjustForDigits(newText)
+
+def referenceAdjustForDigits(string):
+    subscripted = set(re.findall(Utilities.SUBSCRIPTS_RE, string))
+    superscripted = set(re.findall(Utilities.SUPERSCRIPTS_RE, string))
+
+    for number in superscripted:
+        new = [str(Utilities.SUPERSCRIPT_DIGITS.index(d)) for d in number]
+        newString = messages.DIGITS_SUPERSCRIPT % "".join(new)
+        string = re.sub(number, newString, string)
+
+    for number in subscripted:
+        new = [str(Utilities.SUBSCRIPT_DIGITS.index(d)) for d in number]
+        newString = messages.DIGITS_SUBSCRIPT % "".join(new)
+        string = re.sub(number, newString, string)
+
+    return string
+
+# The original did not escape the math symbols. Since they include '-', '^'
+# and '<', the pattern for single symbols failed to compile and they were
+# never spoken; the reference escapes them to show what was meant. The
+# test lines leave out '-': the original would also have replaced it in
+# the names it had already inserted (e.g. "double-struck R").
+#
+MATH_COMBINING_RE = re.compile(
+    '.[%s]' % ''.join(mathsymbols._combining.keys()))
+MATH_SYMBOLS_RE = re.compile(
+    '[%s]' % ''.join(map(re.escape, mathsymbols._all.keys())))
+
+def referenceMathAdjustForSpeech(string):
+    combiningPairs = set(re.findall(MATH_COMBINING_RE, string))
+    for pair in combiningPairs:
+        name = mathsymbols._combining.get(pair[1])
+        if name:
+            string = re.sub(re.escape(pair), " %s " % (name % pair[0]), string)
+
+    chars = set(re.findall(MATH_SYMBOLS_RE, string))
+    includeStyle = mathsymbols.speakStyle == mathsymbols.SPEAK_ALWAYS
+    for char in chars:
+        name = mathsymbols._getSpokenName(char, includeStyle)
+        if name:
+            string = re.sub(re.escape(char), " %s " % name, string)
+
+    return string
+
+def referenceAdjustForPronunciation(line):
+    if settings.speakMultiCaseStringsAsWords:
+        line = Utilities._processMultiCaseString(line)
+
+    line = referenceMathAdjustForSpeech(line)
+    if not settings.usePronunciationDictionary:
+        return line
+
+    words = Utilities.WORDS_RE.split(line)
+    newLine = ''.join(map(pronunciation_dict.getPronunciation, words))
+    if settings.speakMultiCaseStringsAsWords:
+        newLine = Utilities._processMultiCaseString(newLine)
+
+    return newLine
+
+def referenceNormalize(text):
+    text = referenceAddVerbalizedPunctuation(text)
+    return referenceAdjustForPronunciation(text)
+
+def makeLine(rand):
+    """Returns a line of words, symbols and math, with at most one run of
+    subscript and one of superscript digits: the original code replaced
+    runs one at a time, so a run which is part of a longer one was
+    adjusted differently depending on the order of a set."""
+
+    parts = []
+    for i in range(rand.randint(1, 15)):
+        choice = rand.random()
+        if choice < 0.6:
+            parts.append(rand.choice(WORDS))
+        elif choice < 0.8:
+            parts.append(rand.choice(SYMBOLS))
+        else:
+            parts.append(rand.choice(MATH))
+    if rand.random() < 0.2:
+        parts.append("x" + "".join(rand.sample(Utilities.SUPERSCRIPT_DIGITS,
+                                               rand.randint(1, 3))))
+    if rand.random() < 0.2:
+        parts.append("H" + "".join(rand.sample(Utilities.SUBSCRIPT_DIGITS,
+                                               rand.randint(1, 3))))
+
+    separator = rand.choice([" ", "", " "])
+    return separator.join(parts)
+
+def timeIt(func, lines):
+    startTime = time.time()
+    for line in lines:
+        func(line)
+    return time.time() - startTime
+
+def main():
+    orca_state.activeScript = FakeScript()
+    settings.usePronunciationDictionary = True
+    pronunciation_dict.setPronunciation("GNOME", "guh nome")
+    pronunciation_dict.setPronunciation("Orca", "orka")
+    normalizer = speech_normalizer.getNormalizer()
+
+    rand = random.Random(0)
+    lines = [makeLine(rand) for i in range(LINES)]
+
+    ok = True
+    for multiCase in [False, True]:
+        settings.speakMultiCaseStringsAsWords = multiCase
+        for line in lines:
+            expected = referenceNormalize(line)
+            actual = normalizer.normalize(line)
+            if actual != expected:
+                print("MISMATCH: %r\n  expected: %r\n  actual:   %r"
+                      % (line, expected, actual))
+                ok = False
+                break
+    settings.speakMultiCaseStringsAsWords = False
+
+    # Changing the pronunciation dictionary must not give stale results.
+    #
+    pronunciation_dict.setPronunciation("fox", "focks")
+    if normalizer.normalize("fox") != "focks":
+        print("STALE RESULT after changing the pronunciation dictionary")
+        ok = False
+
+    print("Equivalence: %s" % ("OK" if ok else "FAILED"))
+
+    normalizer.clear()
+    before = timeIt(referenceNormalize, lines)
+    after = timeIt(normalizer.normalize, lines)
+    print("%d lines, cold: before: %.3f sec after: %.3f sec"
+          % (LINES, before, after))
+
+    names = ROLE_NAMES * (LINES // len(ROLE_NAMES))
+    normalizer.clear()
+    before = timeIt(referenceNormalize, names)
+    after = timeIt(normalizer.normalize, names)
+    print("%d role names and labels: before: %.3f sec after: %.3f sec"
+          % (len(names), before, after))
+    print("Cache: %s" % normalizer.getStats())
+
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Reports how long each module takes to import when Orca starts, the way
+"python -X importtime" does: the time spent in the module itself and the
+time including the modules it imports, nested as they were imported.
+Imports orca.orca and the default script, as starting Orca does, then
+lists the slowest modules and checks that the modules which are only
+imported when their feature is first used were not imported."""
+
+import importlib.machinery
+import sys
+import time
+
+MODULES = ["orca.orca", "orca.scripts.default"]
+SHOW = 25
+
+DEFERRED = ["orca.find",
+            "orca.mouse_review",
+            "orca.orca_gui_commandlist",
+            "orca.orca_gui_navlist",
+            "orca.phonnames",
+            "orca.sound_utils"]
+
+class TimingLoader:
+    """Wraps the loader of a module, timing its creation and execution."""
+
+    def __init__(self, loader, finder):
+        self._loader = loader
+        self._finder = finder
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        startTime = time.perf_counter()
+        self._finder.enter()
+        try:
+            return self._loader.create_module(spec)
+        finally:
+            self._finder.leave(spec.name, time.perf_counter() - startTime)
+
+    def exec_module(self, module):
+        startTime = time.perf_counter()
+        self._finder.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._finder.leave(module.__name__, time.perf_counter() - startTime)
+
+class TimingFinder:
+    """Finds modules as the path finder does, wrapping their loaders in a
+    TimingLoader. Records, in import order, the nesting depth, name, self
+    time and cumulative time of each module."""
+
+    def __init__(self):
+        self.records = []
+        self._children = []
+
+    def find_spec(self, name, path=None, target=None):
+        spec = importlib.machinery.PathFinder.find_spec(name, path, target)
+        if spec and spec.loader:
+            spec.loader = TimingLoader(spec.loader, self)
+        return spec
+
+    def enter(self):
+        self._children.append(0.0)
+
+    def leave(self, name, elapsed):
+        children = self._children.pop()
+        if self._children:
+            self._children[-1] += elapsed
+        self.records.append(
+            [len(self._children), name, elapsed - children, elapsed])
+
+    def getTimes(self):
+        """Returns a list of (depth, name, self time, cumulative time), in
+        which the creation and execution of each module are combined."""
+
+        times = {}
+        order = []
+        for depth, name, selfTime, cumulative in self.records:
+            if name not in times:
+                order.append(name)
+                times[name] = [depth, name, 0.0, 0.0]
+            times[name][0] = min(times[name][0], depth)
+            times[name][2] += selfTime
+            times[name][3] += cumulative
+        return [times[name] for name in order]
+
+def main():
+    finder = TimingFinder()
+    sys.meta_path.insert(0, finder)
+
+    startTime = time.perf_counter()
+    for name in MODULES:
+        importlib.import_module(name)
+    total = time.perf_counter() - startTime
+
+    sys.meta_path.remove(finder)
+    times = finder.getTimes()
+
+    print("Imported %d modules in %.3f sec" % (len(times), total))
+    print("%10s | %10s | module" % ("self [ms]", "cumul [ms]"))
+    for depth, name, selfTime, cumulative in times:
+        if name.startswith("orca") or depth == 0:
+            print("%10.1f | %10.1f | %s%s"
+                  % (selfTime * 1000, cumulative * 1000, "  " * depth, name))
+
+    print("Slowest modules by self time:")
+    for depth, name, selfTime, cumulative in \
+            sorted(times, key=lambda t: t[2], reverse=True)[:SHOW]:
+        print("%10.1f ms  %s" % (selfTime * 1000, name))
+
+    imported = [name for name in DEFERRED if name in sys.modules]
+    for name in imported:
+        print("IMPORTED AT STARTUP: %s" % name)
+
+    print("Result: %s" % ("FAILED" if imported else "OK"))
+    return 1 if imported else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Times StructuralNavigation.goObject moving to the next and previous
+match in a fake document with 11000 matches, from many caret positions,
+and checks that it finds the same matches as the original implementation,
+which compared the path of each candidate with the path of the caret.
+Each parent and index-in-parent request on the fake objects is counted as
+a round trip to the application."""
+
+import random
+import sys
+import time
+
+import pyatspi
+
+from orca import messages
+from orca import settings
+from orca import structural_navigation
+from orca.script_utilities import Utilities
+
+SECTIONS = 200
+MATCHES_PER_SECTION = 50
+POSITIONS = 200
+
+roundTrips = 0
+
+class FakeAccessible:
+
+    def __init__(self, name, children=()):
+        self.name = name
+        self.children = list(children)
+        self._parent = None
+        self._index = -1
+        for i, child in enumerate(self.children):
+            child._parent = self
+            child._index = i
+
+    @property
+    def parent(self):
+        global roundTrips
+        roundTrips += 1
+        return self._parent
+
+    def getIndexInParent(self):
+        global roundTrips
+        roundTrips += 1
+        return self._index
+
+    def __repr__(self):
+        return self.name
+
+class FakeCollection:
+
+    SORT_ORDER_CANONICAL = 0
+
+    def __init__(self, matches):
+        self._matches = matches
+
+    def createMatchRule(self, *args):
+        return None
+
+    def freeMatchRule(self, rule):
+        pass
+
+    def getMatches(self, rule, sortOrder, count, traverse):
+        return list(self._matches)
+
+class FakeDocument(FakeAccessible):
+
+    def __init__(self, children, matches):
+        FakeAccessible.__init__(self, "document", children)
+        self._collection = FakeCollection(matches)
+
+    def queryCollection(self):
+        return self._collection
+
+class FakeStates:
+
+    def raw(self):
+        return None
+
+class FakeCriteria:
+
+    states = FakeStates()
+    matchStates = objAttrs = matchObjAttrs = roles = matchRoles = None
+    interfaces = matchInterfaces = invert = None
+    applyPredicate = False
+
+class FakeNavigationObject:
+
+    objType = "heading"
+
+    def __init__(self):
+        self.presented = None
+
+    def criteria(self, collection, arg=None):
+        return FakeCriteria()
+
+    def present(self, obj, arg=None):
+        self.presented = obj
+
+class FakeUtilities:
+
+    def __init__(self, document):
+        self.document = document
+        self.caretContext = None, 0
+
+    def documentFrame(self):
+        return self.document
+
+    def getCaretContext(self):
+        return self.caretContext
+
+    def isHidden(self, obj):
+        return False
+
+    def isEmpty(self, obj):
+        return False
+
+    def characterOffsetInParent(self, obj):
+        return obj._index * 10
+
+    pathComparison = staticmethod(Utilities.pathComparison)
+
+class FakeScript:
+
+    def __init__(self, document):
+        self.utilities = FakeUtilities(document)
+
+    def presentMessage(self, message):
+        pass
+
+def makeDocument():
+    """Returns a document of sections, each containing paragraphs and
+    headings (the matches), where some headings contain links which are
+    also headings, and a list of the objects a caret could be in."""
+
+    matches = []
+    carets = []
+    sections = []
+    for s in range(SECTIONS):
+        children = []
+        for m in range(MATCHES_PER_SECTION):
+            paragraph = FakeAccessible("paragraph %d.%d" % (s, m))
+            carets.append(paragraph)
+            children.append(paragraph)
+            inner = []
+            if m % 10 == 0:
+                inner = [FakeAccessible("link %d.%d" % (s, m))]
+            heading = FakeAccessible("heading %d.%d" % (s, m), inner)
+            matches.append(heading)
+            matches.extend(inner)
+            carets.append(heading)
+            children.append(heading)
+        sections.append(FakeAccessible("section %d" % s, children))
+
+    return FakeDocument(sections, matches), carets
+
+def referenceGoObject(self, structuralNavigationObject, isNext, obj=None,
+                      arg=None):
+    """The original implementation of goObject."""
+
+    matches, criteria = list(self._getAll(structuralNavigationObject, arg))
+    if not matches:
+        structuralNavigationObject.present(None, arg)
+        return
+
+    if not isNext:
+        matches.reverse()
+
+    def _isValidMatch(obj):
+        if self._script.utilities.isHidden(obj) or self._script.utilities.isEmpty(obj):
+            return False
+        if not criteria.applyPredicate:
+            return True
+        return structuralNavigationObject.predicate(obj)
+
+    def _getMatchingObjAndIndex(obj):
+        while obj:
+            if obj in matches:
+                return obj, matches.index(obj)
+            obj = obj.parent
+
+        return None, -1
+
+    if not obj:
+        obj, offset = self._script.utilities.getCaretContext()
+    thisObj, index = _getMatchingObjAndIndex(obj)
+    if thisObj:
+        matches = matches[index:]
+        obj = thisObj
+
+    currentPath = pyatspi.utils.getPath(obj)
+    for i, match in enumerate(matches):
+        if not _isValidMatch(match):
+            continue
+
+        if match.parent == obj:
+            comparison = self._script.utilities.characterOffsetInParent(match) - offset
+        else:
+            path = pyatspi.utils.getPath(match)
+            comparison = self._script.utilities.pathComparison(path, currentPath)
+        if (comparison > 0 and isNext) or (comparison < 0 and not isNext):
+            structuralNavigationObject.present(match, arg)
+            return
+
+    if not settings.wrappedStructuralNavigation:
+        structuralNavigationObject.present(None, arg)
+        return
+
+    if not isNext:
+        self._script.presentMessage(messages.WRAPPING_TO_BOTTOM)
+    else:
+        self._script.presentMessage(messages.WRAPPING_TO_TOP)
+
+    matches, criteria = list(self._getAll(structuralNavigationObject, arg))
+    if not isNext:
+        matches.reverse()
+
+    for match in matches:
+        if _isValidMatch(match):
+            structuralNavigationObject.present(match, arg)
+            return
+
+    structuralNavigationObject.present(None, arg)
+
+def run(goObject, navigation, carets):
+    global roundTrips
+    navigationObject = FakeNavigationObject()
+    results = []
+    roundTrips = 0
+    startTime = time.time()
+    for obj, offset in carets:
+        navigation._script.utilities.caretContext = obj, offset
+        for isNext in [True, False]:
+            goObject(navigation, navigationObject, isNext)
+            results.append(navigationObject.presented)
+
+    elapsed = time.time() - startTime
+    return results, elapsed / len(results), roundTrips / len(results)
+
+def main():
+    document, objects = makeDocument()
+    rand = random.Random(0)
+    carets = [(rand.choice(objects), rand.choice([0, 5, 100]))
+              for i in range(POSITIONS)]
+    carets.extend([(objects[0], 0), (objects[-1], 0), (document, 0)])
+
+    navigation = structural_navigation.StructuralNavigation.__new__(
+        structural_navigation.StructuralNavigation)
+    navigation._script = FakeScript(document)
+    navigation._objectCache = {}
+
+    # Fill the cache of matches, which both implementations use.
+    #
+    navigation._getAll(FakeNavigationObject())
+
+    expected, before, beforeTrips = run(referenceGoObject, navigation, carets)
+    actual, after, afterTrips = run(
+        structural_navigation.StructuralNavigation.goObject,
+        navigation, carets)
+
+    print("%d matches, %d moves" % (len(navigation._getAll(
+        FakeNavigationObject())[0]), len(expected)))
+    print("  before: %.3f msec, %.1f round trips per move"
+          % (before * 1000, beforeTrips))
+    print("  after:  %.3f msec, %.1f round trips per move"
+          % (after * 1000, afterTrips))
+
+    ok = actual == expected
+    print("Result: %s" % ("OK" if ok else "FAILED"))
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())